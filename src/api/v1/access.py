@@ -55,7 +55,9 @@ async def remove_user_role(
     status_code=HTTPStatus.OK,
 )
 async def verify_user_has_role(
-    session: Annotated[AsyncSession, Depends(session_handler.create_session)],
+    session: Annotated[
+        AsyncSession, Depends(session_handler.create_read_session)
+    ],
     access_service: Annotated[AccessService, Depends(get_access_service)],
     user_login: Annotated[str, Query(pattern=get_settings().LOGIN_PATTERN)],
     role_title: Annotated[
@@ -75,7 +77,9 @@ async def verify_user_has_role(
     status_code=HTTPStatus.OK,
 )
 async def list_user_roles(
-    session: Annotated[AsyncSession, Depends(session_handler.create_session)],
+    session: Annotated[
+        AsyncSession, Depends(session_handler.create_read_session)
+    ],
     access_service: Annotated[AccessService, Depends(get_access_service)],
     user_login: Annotated[str, Path(pattern=get_settings().LOGIN_PATTERN)],
 ) -> ShowUserAccessSchema:
@@ -1,16 +1,18 @@
 from http import HTTPStatus
 from typing import Annotated
 
-from fastapi import APIRouter, Body, Depends, Header, Query
+from fastapi import APIRouter, Body, Depends, Header, Query, Response
 from fastapi.params import Security
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.postgres.session_handler import session_handler
-from schemas.token import TokenCheckResponse, UserTokenPair
+from schemas.token import (JWKSResponse, TokenCheckResponse, UserTokenPair,
+                           VerifyBatchRequest, VerifyBatchResponse)
 from schemas.user import UserBase
 from services.auth_service import AuthService, get_auth_service
-from util.JWT_helper import token_check
+from services.revocation_service import active_token_check
+from util.JWT_helper import JWTHelper, get_jwt_helper
 
 router = APIRouter()
 
@@ -27,14 +29,13 @@ async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     user_agent: Annotated[str | None, Header()] = None,
 ) -> UserTokenPair:
-    user_agent_hash = str(hash(user_agent))
     credentials = UserBase(
         login=form_data.username, password=form_data.password
     )
     tokens = await auth_service.login(
         session=session,
         user=credentials,
-        fingerprint=user_agent_hash,
+        fingerprint=auth_service.make_fingerprint(user_agent),
     )
     return tokens
 
@@ -65,7 +66,9 @@ async def refresh(
 async def logout(
     session: Annotated[AsyncSession, Depends(session_handler.create_session)],
     auth_service: Annotated[AuthService, Depends(get_auth_service)],
-    token_check_data: Annotated[TokenCheckResponse, Security(token_check)],
+    token_check_data: Annotated[
+        TokenCheckResponse, Security(active_token_check)
+    ],
     logout_everywhere: Annotated[bool, Query()] = False,
 ) -> dict[str, str]:
     """Logout the user from from service."""
@@ -75,3 +78,49 @@ async def logout(
         logout_everywhere=logout_everywhere,
     )
     return {"status": "User has been successfully logouted."}
+
+
+@router.post(
+    "/verify_batch",
+    response_model=VerifyBatchResponse,
+    status_code=HTTPStatus.OK,
+    description="Verify several access tokens in one request.",
+)
+async def verify_batch(
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+    batch: VerifyBatchRequest,
+) -> VerifyBatchResponse:
+    """Returns validity, claims and remaining ttl of every token."""
+    results = await auth_service.verify_batch(tokens=batch.tokens)
+    return VerifyBatchResponse(results=results)
+
+
+@router.get(
+    "/introspect",
+    status_code=HTTPStatus.NO_CONTENT,
+    description="Check the access token for the nginx auth_request.",
+)
+async def introspect(
+    auth_service: Annotated[AuthService, Depends(get_auth_service)],
+    token_check_data: Annotated[
+        TokenCheckResponse, Security(active_token_check)
+    ],
+) -> Response:
+    """Returns 204 with the user sub and roles in the headers."""
+    headers = await auth_service.introspect(token_check_data=token_check_data)
+    return Response(status_code=HTTPStatus.NO_CONTENT, headers=headers)
+
+
+@router.get(
+    "/.well-known/jwks.json",
+    response_model=JWKSResponse,
+    status_code=HTTPStatus.OK,
+    description="Public keys to verify the tokens without the auth service.",
+)
+async def jwks(
+    response: Response,
+    jwthelper: Annotated[JWTHelper, Depends(get_jwt_helper)],
+) -> JWKSResponse:
+    """Returns the JSON Web Key Set of the token sign keys."""
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return JWKSResponse(**jwthelper.get_jwks())
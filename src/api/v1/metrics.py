@@ -0,0 +1,28 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter
+
+from db.postgres.session_handler import session_handler
+from services.revocation_service import get_revocation_service
+from services.session_service import get_session_service
+from util.hash_helper import get_hash_executor
+from util.JWT_helper import get_jwt_helper
+
+router = APIRouter()
+
+
+@router.get(
+    "/",
+    status_code=HTTPStatus.OK,
+    description="Get the runtime metrics of the service worker.",
+)
+async def get_metrics() -> dict[str, dict]:
+    """Get the runtime metrics of the service worker."""
+    return {
+        "hasher": get_hash_executor().get_metrics(),
+        "admission": get_hash_executor().admission.get_metrics(),
+        "token_cache": get_jwt_helper().cache.get_metrics(),
+        "revocation": get_revocation_service().get_metrics(),
+        "sessions": get_session_service().get_metrics(),
+        "postgres_pool": session_handler.get_metrics(),
+    }
@@ -7,8 +7,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from db.postgres.session_handler import session_handler
 from schemas.token import TokenCheckResponse
 from schemas.user import UserLoginSchema, UserSelf, UserSelfResponse
+from services.revocation_service import active_token_check
 from services.user_service import UserService, get_user_service
-from util.JWT_helper import token_check
 
 router = APIRouter()
 
@@ -37,8 +37,12 @@ async def create_user(
 )
 async def get_current_user_data(
     user_service: Annotated[UserService, Depends(get_user_service)],
-    session: Annotated[AsyncSession, Depends(session_handler.create_session)],
-    token_check_data: Annotated[TokenCheckResponse, Security(token_check)],
+    session: Annotated[
+        AsyncSession, Depends(session_handler.create_read_session)
+    ],
+    token_check_data: Annotated[
+        TokenCheckResponse, Security(active_token_check)
+    ],
 ) -> UserSelfResponse:
     """Get data about current user."""
     user_login = UserLoginSchema(login=token_check_data.sub)
@@ -54,7 +58,9 @@ async def get_current_user_data(
 async def update_user_data(
     user_service: Annotated[UserService, Depends(get_user_service)],
     session: Annotated[AsyncSession, Depends(session_handler.create_session)],
-    token_check_data: Annotated[TokenCheckResponse, Security(token_check)],
+    token_check_data: Annotated[
+        TokenCheckResponse, Security(active_token_check)
+    ],
     update_user_data: UserSelf,
 ) -> UserSelfResponse:
     """Change personal user information."""
@@ -69,7 +75,9 @@ async def update_user_data(
 async def delete_user_data(
     user_service: Annotated[UserService, Depends(get_user_service)],
     session: Annotated[AsyncSession, Depends(session_handler.create_session)],
-    token_check_data: Annotated[TokenCheckResponse, Security(token_check)],
+    token_check_data: Annotated[
+        TokenCheckResponse, Security(active_token_check)
+    ],
 ) -> dict[str, str]:
     """Delete personal information."""
     user_login = UserLoginSchema(login=token_check_data.sub)
@@ -1,7 +1,8 @@
 from http import HTTPStatus
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from fastapi import APIRouter, Body, Depends, Path
+from fastapi import APIRouter, Body, Depends, Path, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.config import get_settings
@@ -20,13 +21,44 @@ router = APIRouter()
     status_code=HTTPStatus.OK,
 )
 async def get_all_roles(
-    session: Annotated[AsyncSession, Depends(session_handler.create_session)],
+    response: Response,
     role_service: Annotated[RoleService, Depends(get_role_service)],
+    limit: int | None = Query(
+        default=None,
+        ge=1,
+        le=get_settings().LIST_PAGE_MAX_SIZE,
+        description="Page size. All roles are streamed if not set.",
+    ),
+    cursor: str | None = Query(
+        default=None, description="X-Next-Cursor of the previous page."
+    ),
 ) -> list[RoleResponseSchema]:
-    roles = await role_service.list(session=session)
+    """Get a page of the roles or stream all of them.
+
+    The session is opened here, not by a dependency, so the stream holds
+    a single connection."""
+    if limit is None and cursor is None:
+        return StreamingResponse(
+            stream_roles(role_service), media_type="application/json"
+        )
+    async with session_handler.read_session_factory()() as session:
+        roles, next_cursor = await role_service.list(
+            session=session,
+            limit=limit or get_settings().LIST_PAGE_SIZE,
+            cursor=cursor,
+        )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return roles
 
 
+async def stream_roles(role_service: RoleService) -> AsyncIterator[bytes]:
+    """Reads the roles in a session that lives as long as the response."""
+    async with session_handler.read_session_factory()() as session:
+        async for chunk in role_service.stream(session=session):
+            yield chunk
+
+
 @router.post(
     "/",
     response_model=RoleResponseSchema,
@@ -52,7 +84,9 @@ async def create_role(
     status_code=HTTPStatus.OK,
 )
 async def get_role(
-    session: Annotated[AsyncSession, Depends(session_handler.create_session)],
+    session: Annotated[
+        AsyncSession, Depends(session_handler.create_read_session)
+    ],
     role_service: Annotated[RoleService, Depends(get_role_service)],
     role_title: str = Path(
         description="Role title. Letters and digits only. 3-50 characters long.",
@@ -0,0 +1,117 @@
+"""Microbenchmark of the JWTHelper token codec.
+
+Compares the current codec with the previous one, that created a fresh
+HMAC object per call, serialized models with repr and signed with a hex
+digest.
+
+Usage:
+    python -m benchmarks.jwt_helper_bench --number 20000
+"""
+
+import argparse
+import base64
+import json
+import time
+import timeit
+
+from Cryptodome.Hash import HMAC, SHA256
+from pydantic import BaseModel
+
+from core.config import get_settings
+from schemas.token import AccessTokenPayload, TokenHeader
+from util.JWT_helper import JWTHelper
+
+
+class LegacyJWTHelper:
+    """The codec as it was before the rework."""
+
+    def __init__(self, key: bytes):
+        self.encoding = "utf-8"
+        self.key = key
+
+    def encode(self, header: BaseModel, payload: BaseModel) -> str:
+        hasher = HMAC.new(self.key, digestmod=SHA256)
+        encode_header = self.encode_basemodel(header)
+        encode_payload = self.encode_basemodel(payload)
+        combined_str = (
+            f"{encode_header.decode(self.encoding)}."
+            f"{encode_payload.decode(self.encoding)}"
+        )
+        hasher.update(combined_str.encode(self.encoding))
+        return f"{combined_str}.{hasher.hexdigest()}"
+
+    def decode_payload(self, token: str, token_schema) -> BaseModel:
+        token_parts = token.split(".")
+        decoded_str = base64.b64decode(token_parts[1]).decode(self.encoding)
+        return token_schema(**(json.loads(decoded_str.replace("'", '"'))))
+
+    def verify_token(self, token: str) -> None:
+        hasher = HMAC.new(self.key, digestmod=SHA256)
+        token_parts = token.split(".")
+        if len(token_parts) != 3:
+            raise ValueError
+        payload = f"{token_parts[0]}.{token_parts[1]}"
+        hasher.update(payload.encode(self.encoding))
+        hasher.hexverify(token_parts[2])
+
+    def encode_basemodel(self, model: BaseModel) -> bytes:
+        return base64.b64encode(str(model.model_dump()).encode(self.encoding))
+
+
+def report(name: str, legacy: float, current: float, number: int) -> None:
+    print(
+        f"{name:<8} legacy {number / legacy:>10.0f} ops/s  "
+        f"current {number / current:>10.0f} ops/s  "
+        f"x{legacy / current:.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    current_helper = JWTHelper()
+    legacy_helper = LegacyJWTHelper(
+        key=get_settings().JWT_SECRET.encode(get_settings().JWT_CODE)
+    )
+    payload = AccessTokenPayload(
+        sub="superuser",
+        fingerprint="1969592216488832520",
+        roles=["auth_admin", "subscriber"],
+        exp=str(time.time() + 3600),
+    )
+    legacy_token = legacy_helper.encode(TokenHeader(), payload)
+    current_token = current_helper.encode(payload)
+
+    def legacy_decode():
+        legacy_helper.verify_token(legacy_token)
+        legacy_helper.decode_payload(legacy_token, AccessTokenPayload)
+
+    def current_decode():
+        current_helper.decode(current_token, AccessTokenPayload)
+
+    report(
+        "encode",
+        timeit.timeit(
+            lambda: legacy_helper.encode(TokenHeader(), payload),
+            number=args.number,
+        ),
+        timeit.timeit(
+            lambda: current_helper.encode(payload), number=args.number
+        ),
+        args.number,
+    )
+    report(
+        "decode",
+        timeit.timeit(legacy_decode, number=args.number),
+        timeit.timeit(current_decode, number=args.number),
+        args.number,
+    )
+    print(
+        f"token length: legacy {len(legacy_token)}, current {len(current_token)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
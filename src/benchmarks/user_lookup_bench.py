@@ -0,0 +1,194 @@
+"""Benchmark of the user lookup done on login and refresh.
+
+Compares the previous ORM query, that joinedloaded the roles and the
+fingerprints with their refresh tokens, with the role titles projection.
+Seeds a user with the given amount of sessions and roles into the
+configured database and removes it afterwards.
+
+Usage:
+    python -m benchmarks.user_lookup_bench --sessions 20 --roles 5
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import joinedload
+
+from db.postgres.postgres import get_postgers_storage
+from db.postgres.session_handler import session_handler
+from models.fingerprint import Fingerprint
+from models.role import Role
+from models.token import RefreshToken
+from models.user import User
+from models.user_role import UserRoleModel
+from services.auth_service import AuthService
+from util.JWT_keys import token_digest
+
+
+async def seed(login: str, sessions: int, roles: int) -> uuid.UUID:
+    user_id = uuid.uuid4()
+    now = datetime.utcnow()
+    fingerprint_ids = [uuid.uuid4() for _ in range(sessions)]
+    role_ids = [uuid.uuid4() for _ in range(roles)]
+    async with session_handler.session_factory() as session:
+        await session.execute(
+            insert(User).values(
+                id=user_id,
+                login=login,
+                email=f"{login}@example.com",
+                hashed_password="bench",
+                created_at=now,
+                modified_at=now,
+                is_active=True,
+            )
+        )
+        if roles:
+            await session.execute(
+                insert(Role),
+                [
+                    {
+                        "id": role_id,
+                        "title": f"{login}_{index}",
+                        "created_at": now,
+                        "modified_at": now,
+                    }
+                    for index, role_id in enumerate(role_ids)
+                ],
+            )
+            await session.execute(
+                insert(UserRoleModel),
+                [
+                    {
+                        "id": uuid.uuid4(),
+                        "user_id": user_id,
+                        "role_id": role_id,
+                        "created_at": now,
+                    }
+                    for role_id in role_ids
+                ],
+            )
+        if sessions:
+            await session.execute(
+                insert(Fingerprint),
+                [
+                    {
+                        "id": fingerprint_id,
+                        "user_id": user_id,
+                        "fingerprint": f"bench{index}",
+                        "created_at": now,
+                        "modified_at": now,
+                    }
+                    for index, fingerprint_id in enumerate(fingerprint_ids)
+                ],
+            )
+            await session.execute(
+                insert(RefreshToken),
+                [
+                    {
+                        "id": uuid.uuid4(),
+                        "user_id": user_id,
+                        "fingerprint_id": fingerprint_id,
+                        "token_hash": token_digest(
+                            f"{login}.{fingerprint_id}"
+                        ),
+                        "created_at": now,
+                    }
+                    for fingerprint_id in fingerprint_ids
+                ],
+            )
+        await session.commit()
+    return user_id
+
+
+async def cleanup(user_id: uuid.UUID, login: str) -> None:
+    async with session_handler.session_factory() as session:
+        await session.execute(
+            delete(RefreshToken).where(RefreshToken.user_id == user_id)
+        )
+        await session.execute(
+            delete(Fingerprint).where(Fingerprint.user_id == user_id)
+        )
+        await session.execute(
+            delete(UserRoleModel).where(UserRoleModel.user_id == user_id)
+        )
+        await session.execute(
+            delete(Role).where(Role.title.like(f"{login}_%"))
+        )
+        await session.execute(delete(User).where(User.id == user_id))
+        await session.commit()
+
+
+async def legacy_lookup(login: str) -> list[str]:
+    """The query as it was before the rework."""
+    stmt = (
+        select(User)
+        .where(User.login == login)
+        .options(
+            joinedload(User.access).joinedload(UserRoleModel.role),
+            joinedload(User.fingerprints).joinedload(
+                Fingerprint.refresh_token
+            ),
+        )
+    )
+    async with session_handler.session_factory() as session:
+        result = await session.execute(stmt)
+        user = result.unique().scalars().one_or_none()
+        return [access.role.title for access in user.access]
+
+
+async def current_lookup(service: AuthService, login: str) -> list[str]:
+    async with session_handler.session_factory() as session:
+        user = await service._get_user_credentials_from_db(
+            session=session, user_login=login
+        )
+        return user.roles
+
+
+async def measure(lookup, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        await lookup()
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--roles", type=int, default=5)
+    parser.add_argument("--number", type=int, default=1000)
+    args = parser.parse_args()
+
+    session_handler.engine.echo = False
+    service = AuthService(cache=None, database=get_postgers_storage())
+    login = f"bench{uuid.uuid4().hex[:8]}"
+    user_id = await seed(login, args.sessions, args.roles)
+    try:
+        legacy_roles = await legacy_lookup(login)
+        current_roles = await current_lookup(service, login)
+        assert sorted(legacy_roles) == sorted(current_roles)
+
+        legacy = await measure(lambda: legacy_lookup(login), args.number)
+        current = await measure(
+            lambda: current_lookup(service, login), args.number
+        )
+    finally:
+        await cleanup(user_id, login)
+        await session_handler.engine.dispose()
+    print(
+        f"sessions {args.sessions}, roles {args.roles}, "
+        f"legacy rows {max(args.sessions, 1) * max(args.roles, 1)}, "
+        "current rows 1"
+    )
+    print(
+        f"legacy {args.number / legacy:>8.0f} lookups/s  "
+        f"current {args.number / current:>8.0f} lookups/s  "
+        f"x{legacy / current:.2f}"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,6 @@
 import os
 from functools import lru_cache
-from typing import ClassVar
+from typing import ClassVar, Literal
 
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import Field
@@ -21,6 +21,40 @@ class Settings(BaseSettings):
     PG_HOST: str = Field(default="Postgres_host")
     PG_PORT: int = Field(default="9999")
     PG_DB: str = Field(default="Auth_DB")
+    # Connection pool of a worker, a worker opens up to PG_POOL_SIZE +
+    # PG_MAX_OVERFLOW connections, keep it below max_connections / workers
+    PG_POOL_SIZE: int = Field(default=5)
+    PG_MAX_OVERFLOW: int = Field(default=10)
+    # Max time in seconds a request waits for a free connection
+    PG_POOL_TIMEOUT: float = Field(default=30.0)
+    # Connections older than this in seconds are reopened, -1 never
+    PG_POOL_RECYCLE: int = Field(default=-1)
+    # Checks a connection with a round trip before handing it out
+    PG_POOL_PRE_PING: bool = Field(default=False)
+    # Reuses the latest returned connection, so the idle ones get recycled
+    PG_POOL_USE_LIFO: bool = Field(default=False)
+    # asyncpg connection, timeouts in seconds
+    PG_CONNECT_TIMEOUT: float = Field(default=60.0)
+    PG_COMMAND_TIMEOUT: float | None = Field(default=None)
+    # Prepared statement caches of asyncpg and SQLAlchemy per connection,
+    # set both to 0 behind pgbouncer in transaction mode
+    PG_STATEMENT_CACHE_SIZE: int = Field(default=100)
+    PG_PREPARED_STATEMENT_CACHE_SIZE: int = Field(default=100)
+    PG_APPLICATION_NAME: str = Field(default="auth-service")
+    # Read replicas as a JSON list of DSNs, the read-only routes of the
+    # roles, access and profile are served by them
+    PG_REPLICA_DSNS: list[str] = Field(default=[])
+    # Replicas lagging behind more bytes of the primary WAL are skipped
+    PG_REPLICA_MAX_LAG_BYTES: int = Field(default=16 * 1024 * 1024)
+    # How often the replica lag is checked in seconds
+    PG_REPLICA_CHECK_INTERVAL: float = Field(default=5.0)
+    # SQL logging
+    # Logs every statement with the parameters, for the development only
+    SQL_ECHO: bool = Field(default=False)
+    # Statements running longer are logged as slow in seconds, none if not set
+    SQL_SLOW_QUERY_THRESHOLD: float | None = Field(default=0.5)
+    # Fraction of the other statements logged with their durations
+    SQL_SAMPLE_RATE: float = Field(default=0.0)
 
     # Redis
     AUTH_REDIS_HOST: str = Field(default="fastapi-auth")
@@ -38,14 +72,102 @@ class Settings(BaseSettings):
     AUTH_FASTAPI_HOST: str = Field(default="fastapi-auth")
     AUTH_FASTAPI_PORT: int = Field(default="8000")
 
+    # Device fingerprints
+    # Key of the user agent digest, changing it starts new fingerprints
+    FINGERPRINT_SECRET: str = Field(default="Secret fingerprint key")
+    # Length of the hex digest, FINGERPRINT_MAX_LENGTH at most
+    FINGERPRINT_LENGTH: int = Field(default=32)
+
     # JWT
-    REFRESH_TOKEN_MAX_LENGTH: int = 300
     JWT_SECRET: str = Field(default="Secret encode token")
     JWT_CODE: str = Field(default="utf-8")
+    # Token sign algorithm. HS256 uses JWT_SECRET, EdDSA and RS256 use
+    # the PEM private key and publish the public key via JWKS
+    JWT_ALGORITHM: Literal["HS256", "EdDSA", "RS256"] = Field(default="HS256")
+    JWT_PRIVATE_KEY_PATH: str | None = Field(default=None)
+    # Key id of the JWT_SECRET or JWT_PRIVATE_KEY_PATH key
+    JWT_KID: str = Field(default="default")
+    # JSON key ring with several keys, replaces the single key above
+    JWT_KEYRING_PATH: str | None = Field(default=None)
+    # How often the key ring file is checked for changes in seconds
+    JWT_KEYRING_RELOAD_INTERVAL: float = Field(default=10.0)
+    # Max amount of the verified access tokens cached by a worker
+    TOKEN_CACHE_SIZE: int = Field(default=10000)
+    # Max amount of tokens in a single verify_batch request
+    VERIFY_BATCH_MAX_SIZE: int = Field(default=100)
+    # Max seconds nginx caches an introspection result of a token
+    INTROSPECT_CACHE_TTL: int = Field(default=5)
     # Acess token lifetime in hours
     ACESS_TOKEN_LIFETIME: int = Field(default=2)
     # Acess token lifetime in days
     REFRESH_TOKEN_LIFETIME: int = Field(default=14)
+    # Password hasher
+    # Argon2 parameters, tune them with scripts/calibrate_hasher.py
+    ARGON2_TIME_COST: int = Field(default=3)
+    # Argon2 memory cost in KiB
+    ARGON2_MEMORY_COST: int = Field(default=65536)
+    ARGON2_PARALLELISM: int = Field(default=4)
+    # Executor to run Argon2 in: "thread" (argon2 releases the GIL) or "process"
+    HASHER_EXECUTOR: Literal["thread", "process"] = Field(default="thread")
+    HASHER_MAX_WORKERS: int = Field(default=4)
+    # Max amount of hashing jobs waiting for a free worker
+    HASHER_MAX_QUEUE: int = Field(default=64)
+    # Deadline of a single hashing job in seconds
+    HASHER_TIMEOUT: float = Field(default=2.0)
+    # Memory budget for the concurrent hashes in MiB
+    HASHER_MEMORY_BUDGET: int = Field(default=512)
+    # CPU cores budget for the concurrent hashes, all cores if not set
+    HASHER_CPU_BUDGET: int | None = Field(default=None)
+    # Max amount of requests waiting for the hashing budget
+    HASHER_ADMISSION_QUEUE: int = Field(default=128)
+    # Max time in seconds a request waits for the hashing budget
+    HASHER_ADMISSION_TIMEOUT: float = Field(default=1.0)
+    # Retry-After header value of the rejected requests in seconds
+    HASHER_RETRY_AFTER: int = Field(default=1)
+    # Token revocation
+    # Expected amount of revoked tokens per worker Bloom filter
+    REVOCATION_CAPACITY: int = Field(default=1_000_000)
+    # Bloom filter false positive rate, a false positive costs a Redis lookup
+    REVOCATION_ERROR_RATE: float = Field(default=0.001)
+    REVOCATION_CHANNEL: str = Field(default="revoked_tokens")
+    # Channel of the bumped token generations, kept apart from the ids
+    REVOCATION_GENERATION_CHANNEL: str = Field(default="revoked_generations")
+    REVOCATION_PREFIX: str = Field(default="revoked:")
+    # Deny list layout: "keys" stores a key per revoked token, "buckets"
+    # groups them into sets by the exp window
+    DENYLIST_LAYOUT: Literal["keys", "buckets"] = Field(default="keys")
+    # The former layout for ACESS_TOKEN_LIFETIME after switching, the
+    # revocations made in it are not seen otherwise
+    DENYLIST_PREVIOUS_LAYOUT: Literal["keys", "buckets"] | None = Field(
+        default=None
+    )
+    DENYLIST_BUCKET_PREFIX: str = Field(default="revoked_bucket:")
+    DENYLIST_BUCKET_SECONDS: int = Field(default=3600)
+    # Per-user token generations, tokens of older generations are
+    # rejected. They expire after REFRESH_TOKEN_LIFETIME with the tokens
+    TOKEN_GENERATION_PREFIX: str = Field(default="token_gen:")
+    # How often the Bloom filter is rebuilt to drop the expired ids in seconds
+    REVOCATION_REBUILD_INTERVAL: float = Field(default=600.0)
+    # Delay before resubscribing to the broken channel in seconds
+    REVOCATION_RETRY_DELAY: float = Field(default=1.0)
+    # Refresh sessions
+    # "redis" keeps the active refresh tokens in Redis, refresh runs no
+    # SQL and Postgres gets the rotations from a write-behind worker.
+    # Roles granted later are put into the tokens on the next login
+    SESSION_STORE: Literal["postgres", "redis"] = Field(default="postgres")
+    SESSION_PREFIX: str = Field(default="session:")
+    SESSION_STREAM: str = Field(default="session_writes")
+    SESSION_WRITE_GROUP: str = Field(default="session_writer")
+    # Max rotations written to Postgres in a transaction
+    SESSION_WRITE_BATCH_SIZE: int = Field(default=500)
+    # How long the worker waits for new rotations in seconds
+    SESSION_WRITE_INTERVAL: float = Field(default=1.0)
+    # Rotations left by a crashed worker are taken over after, in seconds
+    SESSION_WRITE_CLAIM_TIMEOUT: float = Field(default=60.0)
+    SESSION_WRITE_RETRY_DELAY: float = Field(default=1.0)
+    # Default and max page size of the paginated lists
+    LIST_PAGE_SIZE: int = Field(default=50)
+    LIST_PAGE_MAX_SIZE: int = Field(default=1000)
     # Validation config
     ROLE_TITLE_MIN_LENGTH: int = 3
     ROLE_TITLE_MAX_LENGTH: int = 50
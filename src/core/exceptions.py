@@ -110,3 +110,20 @@ class UnAuthorizedException(HTTPException):
             detail=f"{detail}",
             headers={"WWW-Authenticate": authenticate_value},
         )
+
+
+class ServiceOverloadedException(HTTPException):
+    def __init__(self, detail="Service is overloaded.", retry_after=1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class InvalidCursorException(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor is invalid.",
+        )
@@ -1,26 +1,44 @@
+import base64
+import binascii
+import json
+from datetime import datetime
 from functools import lru_cache
-from typing import Any, List, TypeVar
+from typing import Any, AsyncIterator, List, TypeVar
 
 from pydantic import BaseModel
-from sqlalchemy import and_, delete, update
+from sqlalchemy import and_, delete, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.sql import Select
 
 from db.postgres.session_handler import session_handler
 from db.postgres.storage import BaseStorage
 
 ModelType = TypeVar("ModelType", bound=session_handler.base)
 
+# Rows sent in a single statement and committed together
+BATCH_SIZE = 1000
+
 
 class PostgresStorage(BaseStorage):
     async def create(
-        self, session: AsyncSession, obj: BaseModel, table: Any
+        self,
+        session: AsyncSession,
+        obj: BaseModel,
+        table: Any,
+        returning: bool = True,
     ) -> ModelType | None:
+        """Inserts the row, the created object comes with RETURNING.
+
+        Skip returning if the caller doesn't need the object."""
         obj_dict = obj.model_dump()
-        db_obj = table(**obj_dict)
-        session.add(db_obj)
+        stmt = insert(table).values(**obj_dict)
+        if returning:
+            stmt = stmt.returning(table)
+        result = await session.execute(statement=stmt)
+        db_obj = result.scalar_one() if returning else None
         await session.commit()
-        await session.refresh(db_obj)
         return db_obj
 
     async def delete(
@@ -51,31 +69,239 @@ class PostgresStorage(BaseStorage):
         session: AsyncSession,
         table: Any,
         filters: dict | None = None,
-        offset: int = 0,
         limit: int | None = None,
-    ) -> List[ModelType] | None:
-        if not filters:
-            filters = {}
-        conditions = [getattr(table, k) == v for k, v in filters.items()]
-        stmt = select(table).where(and_(*conditions)).offset(offset)
+        cursor: str | None = None,
+        key: str = "id",
+    ) -> tuple[List[ModelType], str | None]:
+        """Returns a page of the rows ordered by the unique key column.
+
+        The page starts after the cursor, so it is found by the index
+        however deep it is. The cursor of the next page is None on the
+        last one. Raises ValueError on a malformed cursor."""
+        column = getattr(table, key)
+        stmt = self._list_statement(table, filters).order_by(column)
+        if cursor:
+            stmt = stmt.where(column > self._decode_cursor(column, cursor))
         if limit:
-            stmt = stmt.limit(limit)
+            stmt = stmt.limit(limit + 1)
         results = await session.execute(stmt)
-        return results.scalars().all()
+        objs = results.scalars().all()
+        if not limit or len(objs) <= limit:
+            return objs, None
+        objs = objs[:limit]
+        return objs, self._encode_cursor(getattr(objs[-1], key))
+
+    async def stream(
+        self,
+        session: AsyncSession,
+        table: Any,
+        filters: dict | None = None,
+        key: str = "id",
+        chunk_size: int = BATCH_SIZE,
+    ) -> AsyncIterator[List[ModelType]]:
+        """Yields the rows in chunks read from a server-side cursor."""
+        stmt = (
+            self._list_statement(table, filters)
+            .order_by(getattr(table, key))
+            .execution_options(yield_per=chunk_size)
+        )
+        results = await session.stream_scalars(stmt)
+        async for chunk in results.partitions():
+            yield chunk
 
     async def update(
-        self, session: AsyncSession, obj: BaseModel, table: Any
+        self,
+        session: AsyncSession,
+        obj: BaseModel,
+        table: Any,
+        returning: bool = True,
     ) -> ModelType | None:
+        """Updates the row by id, the updated object comes with RETURNING.
+
+        Skip returning if the caller doesn't need the object."""
         obj_dict = obj.model_dump()
         stmt = update(table).where(table.id == obj.id).values(**obj_dict)
-        await session.execute(stmt)
+        if returning:
+            stmt = stmt.returning(table)
+        result = await session.execute(statement=stmt)
+        db_obj = result.scalar_one_or_none() if returning else None
         await session.commit()
-        stmt = select(table).where(table.id == obj.id)
-        results = await session.execute(stmt)
-        db_obj = results.scalar_one()
-        await session.refresh(db_obj)
         return db_obj
 
+    async def bulk_create(
+        self,
+        session: AsyncSession,
+        objs: List[BaseModel],
+        table: Any,
+        copy: bool = False,
+        batch_size: int = BATCH_SIZE,
+    ) -> int:
+        """Inserts the rows with a multi-row INSERT per batch.
+
+        COPY is faster for the large imports, but the column defaults are
+        computed in Python and a conflict fails the whole batch."""
+        rows = [obj.model_dump() for obj in objs]
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            if copy:
+                await self._copy(session, table, batch)
+            else:
+                await session.execute(insert(table.__table__), batch)
+            await session.commit()
+        return len(rows)
+
+    async def bulk_upsert(
+        self,
+        session: AsyncSession,
+        objs: List[BaseModel],
+        table: Any,
+        conflict: List[str] | None = None,
+        update_columns: List[str] | None = None,
+        batch_size: int = BATCH_SIZE,
+    ) -> int:
+        """Inserts the rows or updates the ones conflicting on the columns.
+
+        The conflict columns default to id, all other given columns are
+        updated unless update_columns are set."""
+        rows = [obj.model_dump() for obj in objs]
+        if not rows:
+            return 0
+        conflict = conflict or ["id"]
+        if update_columns is None:
+            update_columns = [
+                column for column in rows[0] if column not in conflict
+            ]
+        stmt = pg_insert(table.__table__)
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict,
+                set_={
+                    column: stmt.excluded[column] for column in update_columns
+                },
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=conflict)
+        for start in range(0, len(rows), batch_size):
+            await session.execute(stmt, rows[start : start + batch_size])
+            await session.commit()
+        return len(rows)
+
+    async def bulk_delete(
+        self,
+        session: AsyncSession,
+        keys: List[Any],
+        table: Any,
+        key: str = "id",
+        batch_size: int = BATCH_SIZE,
+    ) -> int:
+        """Deletes the rows by the key values, returns the deleted amount."""
+        deleted = 0
+        column = getattr(table, key)
+        for start in range(0, len(keys), batch_size):
+            stmt = delete(table).where(
+                column.in_(keys[start : start + batch_size])
+            )
+            result = await session.execute(
+                statement=stmt,
+                execution_options={"synchronize_session": False},
+            )
+            deleted += result.rowcount
+            await session.commit()
+        return deleted
+
+    async def get_many(
+        self,
+        session: AsyncSession,
+        keys: List[Any],
+        table: Any,
+        key: str = "id",
+        batch_size: int = BATCH_SIZE,
+    ) -> List[ModelType]:
+        """Returns the rows by the key values, the missing are skipped.
+
+        A key repeated in another batch would return its row again, so
+        the keys are deduplicated first."""
+        objs = []
+        column = getattr(table, key)
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), batch_size):
+            stmt = select(table).where(
+                column.in_(keys[start : start + batch_size])
+            )
+            results = await session.execute(stmt)
+            objs.extend(results.scalars().all())
+        return objs
+
+    async def _copy(
+        self, session: AsyncSession, table: Any, rows: List[dict]
+    ) -> None:
+        """Helper copies the rows through the asyncpg connection."""
+        columns = [
+            column
+            for column in table.__table__.columns
+            if column.name in rows[0] or column.default is not None
+        ]
+        records = [
+            tuple(
+                (
+                    row[column.name]
+                    if column.name in row
+                    else self._default_value(column)
+                )
+                for column in columns
+            )
+            for row in rows
+        ]
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.__tablename__,
+            records=records,
+            columns=[column.name for column in columns],
+        )
+
+    @staticmethod
+    def _list_statement(table: Any, filters: dict | None) -> Select:
+        conditions = [
+            getattr(table, k) == v for k, v in (filters or {}).items()
+        ]
+        return select(table).where(and_(*conditions))
+
+    @staticmethod
+    def _encode_cursor(value: Any) -> str:
+        data = json.dumps(str(value)).encode()
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+    @staticmethod
+    def _decode_cursor(column: Any, cursor: str) -> Any:
+        python_type = column.type.python_type
+        try:
+            value = json.loads(
+                base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            )
+            if not isinstance(value, str):
+                raise ValueError
+            if python_type is datetime:
+                return datetime.fromisoformat(value)
+            return python_type(value)
+        except (binascii.Error, TypeError, ValueError):
+            raise ValueError("Malformed cursor.")
+
+    @staticmethod
+    def _default_value(column: Any) -> Any:
+        """Computes the Python default of the column, COPY skips them.
+
+        SQLAlchemy wraps the callable defaults to take the execution
+        context, there is none outside of a statement."""
+        default = column.default
+        if default.is_scalar:
+            return default.arg
+        if default.is_callable:
+            return default.arg(None)
+        raise ValueError(
+            f"Default of {column.name} is a SQL expression, COPY can't use it."
+        )
+
 
 @lru_cache()
 def get_postgers_storage() -> PostgresStorage:
@@ -0,0 +1,83 @@
+import hashlib
+import logging
+import random
+import re
+import time
+from functools import lru_cache
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Literals, parameter numbers and expanded IN lists differ between the
+# runs of a statement. asyncpg placeholders come with a cast, $1::UUID.
+LITERALS = re.compile(r"'(?:[^']|'')*'|(?<!\w)\d+(?:\.\d+)?\b")
+PARAMETERS = re.compile(
+    r"\$\d+(?:::\w+(?: WITH(?:OUT)? TIME ZONE| PRECISION| VARYING)?"
+    r"(?:\(\d+(?:, ?\d+)?\))?(?:\[\])*)?"
+)
+PARAMETER_LISTS = re.compile(r"\((?:\s*\?\s*,)*\s*\?\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint_statement(statement: str) -> tuple[str, str]:
+    """Returns the fingerprint and the normalized statement.
+
+    Runs of a statement with different literals, IN list lengths and
+    formatting get the same fingerprint."""
+    normalized = WHITESPACE.sub(" ", statement).strip()
+    normalized = PARAMETERS.sub("?", normalized)
+    normalized = LITERALS.sub("?", normalized)
+    normalized = PARAMETER_LISTS.sub("(?)", normalized)
+    fingerprint = hashlib.sha1(normalized.encode()).hexdigest()[:16]
+    return fingerprint, normalized
+
+
+class QueryLogger:
+    """QueryLogger logs the slow and a sample of the other statements.
+
+    Nothing but the start time is stored per statement, the statement is
+    fingerprinted and logged only if it's slow or sampled. Parameters are
+    never logged, they carry passwords and token digests."""
+
+    def __init__(self, slow_threshold: float | None, sample_rate: float):
+        self.slow_threshold = slow_threshold
+        self.sample_rate = sample_rate
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self.before_execute)
+        event.listen(engine, "after_cursor_execute", self.after_execute)
+
+    def before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        context._query_start = time.perf_counter()
+
+    def after_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        duration = time.perf_counter() - context._query_start
+        slow = (
+            self.slow_threshold is not None and duration >= self.slow_threshold
+        )
+        if not slow and (
+            not self.sample_rate or random.random() >= self.sample_rate
+        ):
+            return
+        fingerprint, normalized = fingerprint_statement(statement)
+        logger.log(
+            logging.WARNING if slow else logging.INFO,
+            "%s query %s took %.1f ms: %s",
+            "Slow" if slow else "Sampled",
+            fingerprint,
+            duration * 1000,
+            normalized,
+            extra={
+                "sql_fingerprint": fingerprint,
+                "sql_duration_ms": round(duration * 1000, 3),
+                "sql_slow": slow,
+                "sql_executemany": executemany,
+            },
+        )
@@ -1,22 +1,250 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import asyncio
+import logging
+import random
+import time
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import (AsyncEngine, AsyncSession,
+                                    create_async_engine)
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from core.config import get_settings
+from db.postgres.query_logger import QueryLogger
+
+logger = logging.getLogger(__name__)
+
+# Position of the primary WAL the replicas are compared with.
+PRIMARY_LSN_QUERY = text("SELECT pg_current_wal_lsn()::text")
+# Bytes of the primary WAL the replica hasn't replayed yet. Unlike the
+# time since the last replayed transaction it stays 0 while the primary
+# is idle, and grows if the replica has lost its WAL receiver.
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        ELSE GREATEST(
+            pg_wal_lsn_diff(
+                CAST(:primary_lsn AS pg_lsn), pg_last_wal_replay_lsn()
+            ),
+            0
+        )
+    END
+    """
+)
+
+
+@dataclass
+class PoolMetrics:
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that counts the checkouts and their waits.
+
+    The wait includes opening a new connection and the pre-ping."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        start = time.monotonic()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            wait = time.monotonic() - start
+            self.metrics.checkouts += 1
+            self.metrics.wait_seconds += wait
+            self.metrics.max_wait_seconds = max(
+                self.metrics.max_wait_seconds, wait
+            )
+
+
+class Replica:
+    """A read replica engine and its last known replication lag."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.session_factory = sessionmaker(
+            engine, class_=AsyncSession, expire_on_commit=False
+        )
+        # None until the first check and while the replica is unreachable.
+        self.lag: int | None = None
 
 
 class SessionHandler:
     def __init__(self):
+        settings = get_settings()
         self.base = declarative_base()
-        self.engine = create_async_engine(
-            get_settings().postgres_dsn, echo=True, future=True
-        )
+        self.engine = self._create_engine(settings.postgres_dsn)
         self.session_factory = sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
+        self.replicas = [
+            Replica(self._create_engine(dsn))
+            for dsn in settings.PG_REPLICA_DSNS
+        ]
+        self.max_lag = settings.PG_REPLICA_MAX_LAG_BYTES
+        self.check_interval = settings.PG_REPLICA_CHECK_INTERVAL
+        self.task: asyncio.Task | None = None
+        self.replica_fallbacks = 0
+
+    async def start(self) -> None:
+        """Checks the replicas before the first read and then periodically."""
+        if self.replicas:
+            await self._check_replicas()
+            self.task = asyncio.create_task(self._watch_replicas())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
 
     async def create_session(self):
         async with self.session_factory() as session:
             yield session
 
-session_handler = SessionHandler()
+    async def create_read_session(self):
+        """Yields a session of a replica for the read-only routes.
+
+        The reads may miss up to PG_REPLICA_MAX_LAG_BYTES of the primary
+        WAL, the primary is used if every replica lags more or is down."""
+        async with self.read_session_factory()() as session:
+            yield session
+
+    def read_session_factory(self) -> sessionmaker:
+        replicas = [
+            replica
+            for replica in self.replicas
+            if replica.lag is not None and replica.lag <= self.max_lag
+        ]
+        if replicas:
+            return random.choice(replicas).session_factory
+        if self.replicas:
+            self.replica_fallbacks += 1
+        return self.session_factory
+
+    def get_metrics(self) -> dict:
+        metrics = self._get_pool_metrics(self.engine)
+        metrics["replica_fallbacks"] = self.replica_fallbacks
+        metrics["replicas"] = [
+            {"lag": replica.lag, **self._get_pool_metrics(replica.engine)}
+            for replica in self.replicas
+        ]
+        return metrics
+
+    async def _watch_replicas(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self._check_replicas()
+
+    async def _check_replicas(self) -> None:
+        """Checks all replicas at once, a check takes check_interval at most.
+
+        The lags are kept while the primary is unreachable."""
+        try:
+            primary_lsn = await asyncio.wait_for(
+                self._get_primary_lsn(), timeout=self.check_interval
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.warning(
+                "Primary is unreachable, the replica lags are kept",
+                exc_info=True,
+            )
+            return
+        await asyncio.gather(
+            *[
+                self._check_replica(replica, primary_lsn)
+                for replica in self.replicas
+            ]
+        )
+
+    async def _check_replica(self, replica: Replica, primary_lsn: str) -> None:
+        try:
+            lag = await asyncio.wait_for(
+                self._get_lag(replica, primary_lsn),
+                timeout=self.check_interval,
+            )
+            replica.lag = None if lag is None else int(lag)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            replica.lag = None
+            logger.warning(
+                "Replica %s is unreachable",
+                replica.engine.url.render_as_string(hide_password=True),
+                exc_info=True,
+            )
+
+    async def _get_primary_lsn(self) -> str:
+        async with self.engine.connect() as connection:
+            return await connection.scalar(PRIMARY_LSN_QUERY)
 
+    @staticmethod
+    async def _get_lag(replica: Replica, primary_lsn: str) -> int | None:
+        async with replica.engine.connect() as connection:
+            return await connection.scalar(
+                REPLICA_LAG_QUERY, {"primary_lsn": primary_lsn}
+            )
+
+    @staticmethod
+    def _create_engine(dsn: str) -> AsyncEngine:
+        settings = get_settings()
+        engine = create_async_engine(
+            dsn,
+            echo=settings.SQL_ECHO,
+            future=True,
+            poolclass=InstrumentedPool,
+            pool_size=settings.PG_POOL_SIZE,
+            max_overflow=settings.PG_MAX_OVERFLOW,
+            pool_timeout=settings.PG_POOL_TIMEOUT,
+            pool_recycle=settings.PG_POOL_RECYCLE,
+            pool_pre_ping=settings.PG_POOL_PRE_PING,
+            pool_use_lifo=settings.PG_POOL_USE_LIFO,
+            connect_args={
+                "timeout": settings.PG_CONNECT_TIMEOUT,
+                "command_timeout": settings.PG_COMMAND_TIMEOUT,
+                "statement_cache_size": settings.PG_STATEMENT_CACHE_SIZE,
+                "prepared_statement_cache_size": (
+                    settings.PG_PREPARED_STATEMENT_CACHE_SIZE
+                ),
+                "server_settings": {
+                    "application_name": settings.PG_APPLICATION_NAME
+                },
+            },
+        )
+        if settings.SQL_SLOW_QUERY_THRESHOLD is not None or (
+            settings.SQL_SAMPLE_RATE
+        ):
+            QueryLogger(
+                slow_threshold=settings.SQL_SLOW_QUERY_THRESHOLD,
+                sample_rate=settings.SQL_SAMPLE_RATE,
+            ).attach(engine.sync_engine)
+        return engine
+
+    @staticmethod
+    def _get_pool_metrics(engine: AsyncEngine) -> dict:
+        pool = engine.pool
+        metrics = asdict(pool.metrics)
+        metrics["size"] = pool.size()
+        metrics["checked_out"] = pool.checkedout()
+        metrics["checked_in"] = pool.checkedin()
+        # Negative while the pool hasn't opened all of its connections.
+        metrics["overflow"] = pool.overflow()
+        return metrics
+
+
+session_handler = SessionHandler()
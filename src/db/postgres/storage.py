@@ -6,6 +6,18 @@ class BaseStorage(ABC):
     async def create(self, *args, **kwargs):
         raise NotImplementedError
 
+    @abstractmethod
+    async def bulk_create(self, *args, **kwargs):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def bulk_upsert(self, *args, **kwargs):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def bulk_delete(self, *args, **kwargs):
+        raise NotImplementedError
+
     @abstractmethod
     async def delete(self, *args, **kwargs):
         raise NotImplementedError
@@ -18,10 +30,18 @@ class BaseStorage(ABC):
     async def get(self, *args, **kwargs):
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_many(self, *args, **kwargs):
+        raise NotImplementedError
+
     @abstractmethod
     async def get_list(self, *args, **kwargs):
         raise NotImplementedError
 
+    @abstractmethod
+    async def stream(self, *args, **kwargs):
+        raise NotImplementedError
+
     @abstractmethod
     async def update(self, *args, **kwargs):
         raise NotImplementedError
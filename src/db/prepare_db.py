@@ -17,9 +17,13 @@ async def redis_startup():
     redis.redis = Redis(host=get_settings().AUTH_REDIS_HOST,
                         port=get_settings().AUTH_REDIS_PORT,
                         db=0, decode_responses=True)
+    redis.binary_redis = Redis(host=get_settings().AUTH_REDIS_HOST,
+                               port=get_settings().AUTH_REDIS_PORT,
+                               db=0)
 
 async def redis_shutdown():
     redis.redis.close()
+    await redis.binary_redis.aclose()
 
 
 async def purge_database() -> None:
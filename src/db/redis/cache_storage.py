@@ -9,3 +9,7 @@ class BaseCacheStorage(ABC):
     @abstractmethod
     async def get_from_cache(self, *args, **kwargs):
         raise NotImplementedError
+
+    @abstractmethod
+    async def get_many_from_cache(self, *args, **kwargs):
+        raise NotImplementedError
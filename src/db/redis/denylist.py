@@ -0,0 +1,157 @@
+import math
+import time
+from typing import AsyncIterator
+
+from redis.asyncio import Redis
+
+
+class RedisDenyList:
+    """Revoked token ids stored as Redis keys that expire with the token.
+
+    Keys are the prefix and the fixed width binary id, the client must
+    not decode the responses."""
+
+    def __init__(self, redis: Redis, prefix: bytes):
+        self.redis = redis
+        self.prefix = prefix
+
+    def key(self, token_id: bytes) -> bytes:
+        return self.prefix + token_id
+
+    async def add(self, token_id: bytes, exp: float) -> None:
+        lifetime = math.ceil(exp - time.time())
+        if lifetime > 0:
+            await self.redis.set(
+                name=self.key(token_id), value=b"", ex=lifetime
+            )
+
+    async def contains(self, token_id: bytes, exp: float) -> bool:
+        return bool(await self.redis.exists(self.key(token_id)))
+
+    async def contains_many(self, tokens: dict[bytes, float]) -> set[bytes]:
+        """Returns the revoked ids of the given ones in a single request.
+
+        Gets the token ids with their exp."""
+        if not tokens:
+            return set()
+        token_ids = list(tokens)
+        values = await self.redis.mget(
+            [self.key(token_id) for token_id in token_ids]
+        )
+        return {
+            token_id
+            for token_id, value in zip(token_ids, values)
+            if value is not None
+        }
+
+    async def scan(self) -> AsyncIterator[bytes]:
+        """Iterates over all revoked ids without blocking Redis."""
+        async for key in self.redis.scan_iter(
+            match=self.prefix + b"*", count=1000
+        ):
+            yield key[len(self.prefix) :]
+
+
+class BucketedRedisDenyList(RedisDenyList):
+    """Revoked token ids grouped into sets by the token exp window.
+
+    A bucket expires as a whole when its window closes, so Redis keeps
+    a few large keys instead of a key with a TTL per token, and the
+    snapshot is a bulk read of the sets."""
+
+    def __init__(self, redis: Redis, prefix: bytes, bucket_seconds: int):
+        super().__init__(redis, prefix)
+        self.bucket_seconds = bucket_seconds
+
+    def bucket_key(self, exp: float) -> tuple[bytes, int]:
+        """Returns the bucket key and the end of its window."""
+        bucket_end = math.ceil(exp / self.bucket_seconds) * self.bucket_seconds
+        return self.prefix + str(bucket_end).encode(), bucket_end
+
+    async def add(self, token_id: bytes, exp: float) -> None:
+        key, bucket_end = self.bucket_key(exp)
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.sadd(key, token_id)
+        pipeline.expireat(key, bucket_end)
+        await pipeline.execute()
+
+    async def contains(self, token_id: bytes, exp: float) -> bool:
+        key, _ = self.bucket_key(exp)
+        return bool(await self.redis.sismember(key, token_id))
+
+    async def contains_many(self, tokens: dict[bytes, float]) -> set[bytes]:
+        if not tokens:
+            return set()
+        pipeline = self.redis.pipeline(transaction=False)
+        for token_id, exp in tokens.items():
+            key, _ = self.bucket_key(exp)
+            pipeline.sismember(key, token_id)
+        members = await pipeline.execute()
+        return {
+            token_id
+            for token_id, is_member in zip(tokens, members)
+            if is_member
+        }
+
+    async def scan(self) -> AsyncIterator[bytes]:
+        async for key in self.redis.scan_iter(
+            match=self.prefix + b"*", count=100
+        ):
+            async for token_id in self.redis.sscan_iter(key, count=1000):
+                yield token_id
+
+
+class MigratingDenyList:
+    """Deny list being moved from one layout to another.
+
+    Revocations go to the current layout, the checks and the snapshot
+    read both, until the ids of the previous layout expire."""
+
+    def __init__(self, current: RedisDenyList, previous: RedisDenyList):
+        self.current = current
+        self.previous = previous
+
+    async def add(self, token_id: bytes, exp: float) -> None:
+        await self.current.add(token_id, exp)
+
+    async def contains(self, token_id: bytes, exp: float) -> bool:
+        if await self.current.contains(token_id, exp):
+            return True
+        return await self.previous.contains(token_id, exp)
+
+    async def contains_many(self, tokens: dict[bytes, float]) -> set[bytes]:
+        revoked = await self.current.contains_many(tokens)
+        return revoked | await self.previous.contains_many(
+            {
+                token_id: exp
+                for token_id, exp in tokens.items()
+                if token_id not in revoked
+            }
+        )
+
+    async def scan(self) -> AsyncIterator[bytes]:
+        for denylist in (self.current, self.previous):
+            async for token_id in denylist.scan():
+                yield token_id
+
+
+def build_denylist(
+    layout: str,
+    redis: Redis,
+    prefix: bytes,
+    bucket_seconds: int,
+    previous_layout: str | None = None,
+    previous_prefix: bytes | None = None,
+) -> RedisDenyList | MigratingDenyList:
+    if layout == "buckets":
+        denylist = BucketedRedisDenyList(redis, prefix, bucket_seconds)
+    else:
+        denylist = RedisDenyList(redis, prefix)
+    if previous_layout and previous_layout != layout:
+        return MigratingDenyList(
+            current=denylist,
+            previous=build_denylist(
+                previous_layout, redis, previous_prefix, bucket_seconds
+            ),
+        )
+    return denylist
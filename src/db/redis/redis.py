@@ -4,6 +4,8 @@ from typing import Optional
 from redis.asyncio import Redis
 
 redis: Optional[Redis] = None
+# Client without the response decoding for the binary keys and values
+binary_redis: Optional[Redis] = None
 
 async def get_redis() -> Redis:
     return redis
\ No newline at end of file
@@ -21,6 +21,12 @@ class RedisStorage(BaseCacheStorage):
         data = await self.redis.get(name=key)
         return data
 
+    async def get_many_from_cache(self, keys):
+        """Get the values of several keys in a single round trip."""
+        if not keys:
+            return []
+        return await self.redis.mget(keys)
+
 
 @lru_cache()
 def get_redis_storage(
@@ -0,0 +1,131 @@
+from redis.asyncio import Redis
+
+from util.JWT_keys import token_digest
+
+# Replaces the previous session of the fingerprint with the new one.
+# KEYS: session, fingerprint pointer. ARGV: lifetime, field, value, ...
+SAVE_SCRIPT = """
+local previous = redis.call('GET', KEYS[2])
+if previous and previous ~= KEYS[1] then
+    redis.call('DEL', previous)
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SET', KEYS[2], KEYS[1], 'EX', ARGV[1])
+"""
+
+# Moves the session to the new token and queues the Postgres write.
+# The old key is left as a tombstone until the write is done, so the
+# old token can't be used through Postgres in the meantime. The stream
+# isn't trimmed, the writer deletes the entries it has written.
+# KEYS: old session, new session, fingerprint pointer, stream.
+# ARGV: lifetime, created_at, new token digest.
+ROTATE_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'rotated') == 1 then
+    return 0
+end
+local fields = redis.call('HGETALL', KEYS[1])
+if #fields == 0 then
+    return 0
+end
+local session = {}
+for index = 1, #fields, 2 do
+    session[fields[index]] = fields[index + 1]
+end
+local ttl = redis.call('PTTL', KEYS[1])
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], 'rotated', '1')
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[1], ttl)
+end
+redis.call('HSET', KEYS[2], unpack(fields))
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('SET', KEYS[3], KEYS[2], 'EX', ARGV[1])
+redis.call(
+    'XADD', KEYS[4], '*',
+    'user_id', session['user_id'],
+    'fingerprint_id', session['fingerprint_id'],
+    'token_hash', ARGV[3],
+    'created_at', ARGV[2],
+    'previous', KEYS[1]
+)
+return 1
+"""
+
+# KEYS: fingerprint pointer.
+REVOKE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    redis.call('DEL', current)
+end
+redis.call('DEL', KEYS[1])
+"""
+
+
+class RedisSessionStore:
+    """Refresh sessions stored as Redis hashes keyed by the token digest.
+
+    A pointer per user fingerprint keeps the current session key, so a
+    new login or a logout drops the previous one. Rotations are appended
+    to a stream for the Postgres write-behind. The client must decode
+    the responses."""
+
+    def __init__(self, redis: Redis, prefix: str, stream: str):
+        self.redis = redis
+        self.prefix = prefix
+        self.stream = stream
+        self.save_script = redis.register_script(SAVE_SCRIPT)
+        self.rotate_script = redis.register_script(ROTATE_SCRIPT)
+        self.revoke_script = redis.register_script(REVOKE_SCRIPT)
+
+    def key(self, token: str) -> str:
+        return f"{self.prefix}{token_digest(token).hex()}"
+
+    def pointer_key(self, user_id: str, fingerprint_id: str) -> str:
+        return f"{self.prefix}fingerprint:{user_id}:{fingerprint_id}"
+
+    async def get(self, token: str) -> dict[str, str] | None:
+        """Returns the session fields, a rotated token has "rotated"."""
+        return await self.redis.hgetall(self.key(token)) or None
+
+    async def save(
+        self, token: str, session: dict[str, str], lifetime: int
+    ) -> None:
+        fields = [item for field in session.items() for item in field]
+        await self.save_script(
+            keys=[
+                self.key(token),
+                self.pointer_key(
+                    session["user_id"], session["fingerprint_id"]
+                ),
+            ],
+            args=[lifetime, *fields],
+        )
+
+    async def rotate(
+        self,
+        token: str,
+        new_token: str,
+        session: dict[str, str],
+        lifetime: int,
+        created_at: float,
+    ) -> bool:
+        """Returns False if the token has been rotated or removed."""
+        rotated = await self.rotate_script(
+            keys=[
+                self.key(token),
+                self.key(new_token),
+                self.pointer_key(
+                    session["user_id"], session["fingerprint_id"]
+                ),
+                self.stream,
+            ],
+            args=[lifetime, created_at, token_digest(new_token).hex()],
+        )
+        return bool(rotated)
+
+    async def revoke(self, user_id: str, fingerprint_id: str) -> None:
+        await self.revoke_script(
+            keys=[self.pointer_key(user_id, fingerprint_id)]
+        )
@@ -4,17 +4,29 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.params import Security
 
-from api.v1 import access, auth, personal, roles
+from api.v1 import access, auth, metrics, personal, roles
 from core.config import get_settings
+from db.postgres.session_handler import session_handler
 from db.prepare_db import redis_shutdown, redis_startup
-from util.JWT_helper import token_check
+from services.revocation_service import (active_token_check,
+                                         get_revocation_service)
+from services.session_service import get_session_service
+from util.hash_helper import get_hash_executor
 
 
 @contextlib.asynccontextmanager
 async def lifespan(app: FastAPI):
     await redis_startup()
+    await session_handler.start()
+    await get_revocation_service().start()
+    if get_settings().SESSION_STORE == "redis":
+        await get_session_service().start()
     yield
+    await get_session_service().stop()
+    await get_revocation_service().stop()
     await redis_shutdown()
+    await session_handler.stop()
+    get_hash_executor().shutdown()
 
 
 app = FastAPI(
@@ -40,13 +52,19 @@ app.include_router(
     roles.router,
     prefix=get_settings().URL_PREFIX + "/roles",
     tags=["Roles"],
-    dependencies=[Security(token_check, scopes=["auth_admin"])],
+    dependencies=[Security(active_token_check, scopes=["auth_admin"])],
 )
 app.include_router(
     access.router,
     prefix=get_settings().URL_PREFIX + "/access",
     tags=["Access"],
-    dependencies=[Security(token_check, scopes=["auth_admin"])],
+    dependencies=[Security(active_token_check, scopes=["auth_admin"])],
+)
+app.include_router(
+    metrics.router,
+    prefix=get_settings().URL_PREFIX + "/metrics",
+    tags=["Metrics"],
+    dependencies=[Security(active_token_check, scopes=["auth_admin"])],
 )
 
 if __name__ == "__main__":
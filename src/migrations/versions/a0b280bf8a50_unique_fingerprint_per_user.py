@@ -0,0 +1,57 @@
+"""unique fingerprint per user
+
+Revision ID: a0b280bf8a50
+Revises: 40380ebf41ac
+Create Date: 2024-07-02 12:14:08.311503
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a0b280bf8a50"
+down_revision: Union[str, None] = "40380ebf41ac"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keeps the latest fingerprint of the duplicates with its token.
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE duplicate_fingerprint ON COMMIT DROP AS
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY user_id, fingerprint
+                ORDER BY modified_at DESC, id
+            ) AS position
+            FROM fingerprint
+        ) AS ranked
+        WHERE position > 1
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM refresh_token
+        WHERE fingerprint_id IN (SELECT id FROM duplicate_fingerprint)
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM fingerprint
+        WHERE id IN (SELECT id FROM duplicate_fingerprint)
+        """
+    )
+    op.create_unique_constraint(
+        "unique_fingerprint_for_user",
+        "fingerprint",
+        ["user_id", "fingerprint"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        "unique_fingerprint_for_user", "fingerprint", type_="unique"
+    )
@@ -0,0 +1,53 @@
+"""refresh token digest
+
+Revision ID: aa60593ce728
+Revises: a0b280bf8a50
+Create Date: 2024-07-09 10:41:27.518260
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "aa60593ce728"
+down_revision: Union[str, None] = "a0b280bf8a50"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "refresh_token",
+        sa.Column("token_hash", sa.LargeBinary(), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE refresh_token
+        SET token_hash = sha256(convert_to(refresh_token, 'UTF8'))
+        """
+    )
+    op.alter_column("refresh_token", "token_hash", nullable=False)
+    op.create_unique_constraint(
+        "refresh_token_token_hash_key", "refresh_token", ["token_hash"]
+    )
+    # The unique constraint of the raw token goes with the column.
+    op.drop_column("refresh_token", "refresh_token")
+
+
+def downgrade() -> None:
+    # Raw tokens can't be restored from the digests, the sessions end.
+    op.execute("DELETE FROM refresh_token")
+    op.add_column(
+        "refresh_token",
+        sa.Column("refresh_token", sa.String(length=300), nullable=False),
+    )
+    op.create_unique_constraint(
+        "refresh_token_refresh_token_key", "refresh_token", ["refresh_token"]
+    )
+    op.drop_constraint(
+        "refresh_token_token_hash_key", "refresh_token", type_="unique"
+    )
+    op.drop_column("refresh_token", "token_hash")
@@ -0,0 +1,54 @@
+"""drop orphan fingerprints
+
+Revision ID: b80d74459e1d
+Revises: aa60593ce728
+Create Date: 2024-07-15 16:02:51.904377
+
+One-way: the deleted sessions and fingerprints can't be restored, the
+downgrade leaves the tables as they are.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+from core.config import get_settings
+
+# revision identifiers, used by Alembic.
+revision: str = "b80d74459e1d"
+down_revision: Union[str, None] = "aa60593ce728"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fingerprints came from the per-process hash() of the user agent, a
+    # decimal number. The refresh tokens bound to them are never matched
+    # by the keyed digests logins make now, and nothing else deletes
+    # them. The sessions end, their users log in again.
+    op.execute(
+        f"""
+        DELETE FROM refresh_token
+        USING fingerprint
+        WHERE refresh_token.fingerprint_id = fingerprint.id
+            AND fingerprint.fingerprint
+                !~ '^[0-9a-f]{{{get_settings().FINGERPRINT_LENGTH}}}$'
+        """
+    )
+    # Most logins left a new fingerprint behind. The ones without a
+    # refresh token can't be used by any session.
+    op.execute(
+        """
+        DELETE FROM fingerprint
+        WHERE NOT EXISTS (
+            SELECT 1 FROM refresh_token
+            WHERE refresh_token.fingerprint_id = fingerprint.id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    # The deleted rows are gone, nothing to restore.
+    pass
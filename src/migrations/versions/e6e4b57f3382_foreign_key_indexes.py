@@ -0,0 +1,52 @@
+"""foreign key indexes
+
+Revision ID: e6e4b57f3382
+Revises: b80d74459e1d
+Create Date: 2024-07-18 11:24:09.306814
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e6e4b57f3382"
+down_revision: Union[str, None] = "b80d74459e1d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# fingerprint.user_id and refresh_token.user_id lead the unique
+# (user_id, fingerprint) and (user_id, fingerprint_id) indexes already.
+INDEXES = [
+    ("ix_refresh_token_fingerprint_id", "refresh_token", ["fingerprint_id"]),
+    ("ix_user_role_role_id", "user_role", ["role_id"]),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY doesn't block the writes, but can't run in a
+    # transaction. A failed build leaves an invalid index, so a rerun
+    # drops it first.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+            op.create_index(
+                name, table, columns, postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
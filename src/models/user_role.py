@@ -29,6 +29,7 @@ class UserRoleModel(session_handler.base):
         UUID(as_uuid=True),
         ForeignKey(Role.id, ondelete="CASCADE"),
         nullable=False,
+        index=True,
     )
     role = relationship("Role", foreign_keys="UserRoleModel.role_id")
     user = relationship("User", foreign_keys="UserRoleModel.user_id")
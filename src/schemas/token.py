@@ -2,6 +2,8 @@ from uuid import UUID
 
 from pydantic import BaseModel, Field
 
+from core.config import get_settings
+
 
 class UserTokenPair(BaseModel):
     access_token: str
@@ -12,6 +14,7 @@ class UserTokenPair(BaseModel):
 class TokenHeader(BaseModel):
     typ: str = Field(default="JWT")
     alg: str = Field(default="HS256")
+    kid: str | None = None
 
 
 class AccessTokenPayload(BaseModel):
@@ -19,19 +22,25 @@ class AccessTokenPayload(BaseModel):
     fingerprint: str
     roles: list[str]
     exp: str
+    # Token generation of the user the token has been issued in
+    gen: int = 0
+    # Random token id, the tokens issued before it have none
+    jti: str | None = None
 
 
 class RefreshTokenPayload(BaseModel):
     sub: str
     fingerprint: str
     exp: str
+    gen: int = 0
+    jti: str | None = None
 
 
 class RefreshTokenInDB(BaseModel):
     id: UUID
     user_id: UUID
     fingerprint_id: UUID
-    refresh_token: str
+    token_hash: bytes
 
 
 class AccessToken(BaseModel):
@@ -41,3 +50,25 @@ class AccessToken(BaseModel):
 
 class TokenCheckResponse(AccessTokenPayload):
     token: str
+
+
+class JWKSResponse(BaseModel):
+    keys: list[dict]
+
+
+class VerifyBatchRequest(BaseModel):
+    tokens: list[str] = Field(
+        min_length=1, max_length=get_settings().VERIFY_BATCH_MAX_SIZE
+    )
+
+
+class TokenVerifyResult(BaseModel):
+    valid: bool
+    claims: AccessTokenPayload | None = None
+    # Seconds left until the token exp
+    ttl: float | None = None
+    error: str | None = None
+
+
+class VerifyBatchResponse(BaseModel):
+    results: list[TokenVerifyResult]
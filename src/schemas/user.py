@@ -22,6 +22,14 @@ class UserInDBAccess(UserInDB):
     access: list = []
 
 
+class UserCredentials(BaseModel):
+    id: UUID
+    login: str
+    hashed_password: str
+    is_active: bool
+    roles: list[str]
+
+
 class UserSaveToDB(BaseModel):
     login: str
     email: EmailStr
@@ -0,0 +1,111 @@
+"""Benchmarks Argon2 parameters on the current host.
+
+For every memory_cost/parallelism candidate the script looks for the
+biggest time_cost whose median verify latency fits the target and
+prints the strongest combination as Settings values.
+
+Usage:
+    python -m scripts.calibrate_hasher --target-ms 50 --max-memory 64
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+from argon2 import PasswordHasher
+
+from core.config import get_settings
+
+MEMORY_CANDIDATES_MIB = [19, 32, 46, 64, 128, 256]
+PARALLELISM_CANDIDATES = [1, 2, 4, 8]
+MAX_TIME_COST = 10
+PASSWORD = "calibration-password"
+
+
+def measure_verify(
+    time_cost: int, memory_cost: int, parallelism: int, samples: int
+) -> float:
+    """Returns the median verify latency in milliseconds."""
+    hasher = PasswordHasher(
+        time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism
+    )
+    hashed_password = hasher.hash(PASSWORD)
+    latencies = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hasher.verify(hashed_password, PASSWORD)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+
+def calibrate(
+    target_ms: float, max_memory_mib: int, max_parallelism: int, samples: int
+) -> list[dict]:
+    """Returns the fitting candidates, the strongest one goes first."""
+    candidates = []
+    for memory_mib in MEMORY_CANDIDATES_MIB:
+        if memory_mib > max_memory_mib:
+            continue
+        for parallelism in PARALLELISM_CANDIDATES:
+            if parallelism > max_parallelism:
+                continue
+            best = None
+            for time_cost in range(1, MAX_TIME_COST + 1):
+                latency = measure_verify(
+                    time_cost, memory_mib * 1024, parallelism, samples
+                )
+                if latency > target_ms:
+                    break
+                best = {
+                    "time_cost": time_cost,
+                    "memory_cost": memory_mib * 1024,
+                    "parallelism": parallelism,
+                    "latency_ms": round(latency, 2),
+                }
+            if best:
+                candidates.append(best)
+                print(
+                    f"m={memory_mib}MiB p={parallelism}: "
+                    f"t={best['time_cost']} {best['latency_ms']}ms"
+                )
+    # Argon2 strength grows with the amount of memory passes, fewer
+    # lanes leave more cores for the concurrent logins.
+    candidates.sort(
+        key=lambda c: (-c["time_cost"] * c["memory_cost"], c["parallelism"])
+    )
+    return candidates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target-ms", type=float, default=50.0)
+    parser.add_argument("--max-memory", type=int, default=64, help="MiB")
+    parser.add_argument(
+        "--max-parallelism", type=int, default=os.cpu_count() or 1
+    )
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    candidates = calibrate(
+        target_ms=args.target_ms,
+        max_memory_mib=args.max_memory,
+        max_parallelism=args.max_parallelism,
+        samples=args.samples,
+    )
+    if not candidates:
+        print("No parameters fit the target, increase --target-ms.")
+        return
+    best = candidates[0]
+    budget = get_settings().HASHER_MEMORY_BUDGET * 1024
+    print(f"\nMedian verify latency: {best['latency_ms']}ms")
+    print(
+        f"Concurrent hashes in memory budget: {budget // best['memory_cost']}"
+    )
+    print(f"ARGON2_TIME_COST={best['time_cost']}")
+    print(f"ARGON2_MEMORY_COST={best['memory_cost']}")
+    print(f"ARGON2_PARALLELISM={best['parallelism']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Reports the Redis memory taken by the revoked token deny list.
+
+Scans the deny list keys and samples MEMORY USAGE of them the way
+redis-cli --memkeys does.
+
+Usage:
+    python -m scripts.denylist_report --samples 1000
+"""
+
+import argparse
+import asyncio
+import statistics
+
+from redis.asyncio import Redis
+
+from core.config import get_settings
+from services.revocation_service import TOKEN_ID_SIZE
+
+
+async def collect(redis: Redis, prefix: bytes, samples: int) -> dict:
+    """Returns the amount of keys and the sampled sizes in bytes."""
+    keys = 0
+    key_lengths = []
+    memory_usages = []
+    async for key in redis.scan_iter(match=prefix + b"*", count=1000):
+        keys += 1
+        if len(memory_usages) < samples:
+            key_lengths.append(len(key))
+            memory_usages.append(await redis.memory_usage(key, samples=0))
+    return {
+        "keys": keys,
+        "tokens": keys,
+        "key_length": statistics.mean(key_lengths) if key_lengths else 0,
+        "memory_usage": statistics.mean(memory_usages) if memory_usages else 0,
+    }
+
+
+async def collect_buckets(redis: Redis, prefix: bytes) -> dict:
+    """Returns the same numbers for the bucketed layout.
+
+    Every bucket is measured, the entries are the set members."""
+    keys = 0
+    tokens = 0
+    memory_usage = 0
+    async for key in redis.scan_iter(match=prefix + b"*", count=100):
+        keys += 1
+        tokens += await redis.scard(key)
+        memory_usage += await redis.memory_usage(key, samples=0)
+    return {
+        "keys": keys,
+        "tokens": tokens,
+        "key_length": TOKEN_ID_SIZE,
+        "memory_usage": memory_usage / tokens if tokens else 0,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=1000)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    redis = Redis(host=settings.AUTH_REDIS_HOST, port=settings.AUTH_REDIS_PORT)
+    try:
+        if settings.DENYLIST_LAYOUT == "buckets":
+            stats = await collect_buckets(
+                redis, settings.DENYLIST_BUCKET_PREFIX.encode()
+            )
+        else:
+            stats = await collect(
+                redis, settings.REVOCATION_PREFIX.encode(), args.samples
+            )
+    finally:
+        await redis.aclose()
+    print(f"Layout: {settings.DENYLIST_LAYOUT}, keys: {stats['keys']}")
+    print(f"Revoked tokens: {stats['tokens']}")
+    print(f"Entry length: {stats['key_length']:.0f} bytes")
+    print(f"Memory per revoked token: {stats['memory_usage']:.0f} bytes")
+    print(
+        "Estimated deny list memory: "
+        f"{stats['tokens'] * stats['memory_usage'] / 1024 ** 2:.2f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+"""Generates a PEM private key to sign the tokens.
+
+Usage:
+    python -m scripts.generate_jwt_key --alg EdDSA --out keys/jwt.pem
+"""
+
+import argparse
+
+from Cryptodome.PublicKey import ECC, RSA
+
+
+def generate_pem(alg: str) -> str:
+    if alg == "EdDSA":
+        return ECC.generate(curve="ed25519").export_key(format="PEM")
+    return RSA.generate(2048).export_key(format="PEM").decode()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--alg", choices=["EdDSA", "RS256"], default="EdDSA")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    with open(args.out, "w") as key_file:
+        key_file.write(generate_pem(args.alg))
+    print(f"JWT_ALGORITHM={args.alg}")
+    print(f"JWT_PRIVATE_KEY_PATH={args.out}")
+
+
+if __name__ == "__main__":
+    main()
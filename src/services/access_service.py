@@ -17,6 +17,7 @@ from models.user_role import UserRoleModel
 from schemas.access import AccessDBSchema, AccessInSchema, ShowUserAccessSchema
 from schemas.role import RoleTitleSchema
 from schemas.user import UserLoginSchema
+from services.revocation_service import get_revocation_service
 
 
 class AccessService:
@@ -59,6 +60,8 @@ class AccessService:
             )
         ):
             raise AccessNotFoundException
+        # Tokens still carry the revoked role.
+        await get_revocation_service().bump_generation(access.user_login)
         return AccessDBSchema.model_validate(access_from_db)
 
     async def get(self, session: AsyncSession, access: AccessInSchema) -> bool:
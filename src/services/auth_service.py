@@ -1,35 +1,50 @@
+import asyncio
 import binascii
+import hashlib
+import hmac
+import logging
 import re
+import secrets
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
 from functools import lru_cache
-from sqlite3 import IntegrityError
 from typing import Annotated
 
 from argon2.exceptions import VerifyMismatchError
 from fastapi import Depends
 from redis.asyncio import Redis
-from sqlalchemy import delete, select
+from sqlalchemy import String, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
 from core.config import get_settings
-from core.exceptions import (FingerprintNotExists, InvalidToken,
-                             InvalidUserOrPassword, TokenNotFoundException,
+from core.exceptions import (ExpireToken, FingerprintNotExists, InvalidToken,
+                             InvalidUserOrPassword, ServiceOverloadedException,
+                             TokenNotFoundException, UserInactiveException,
                              UserNotFoundException)
 from db.postgres.postgres import PostgresStorage, get_postgers_storage
+from db.postgres.session_handler import session_handler
 from db.redis.redis_storage import get_redis_storage
 from models.fingerprint import Fingerprint
 from models.role import Role
 from models.token import RefreshToken
 from models.user import User
 from models.user_role import UserRoleModel
-from schemas.fingerprint import FingerprintInDB
 from schemas.token import (AccessTokenPayload, RefreshTokenInDB,
-                           RefreshTokenPayload, TokenHeader, UserTokenPair)
-from schemas.user import UserBase, UserInDBAccess
-from util.hash_helper import get_hasher
+                           RefreshTokenPayload, TokenCheckResponse,
+                           TokenVerifyResult, UserTokenPair)
+from schemas.user import UserBase, UserCredentials
+from services.revocation_service import TOKEN_ID_SIZE, get_revocation_service
+from services.session_service import get_session_service
+from util.hash_helper import get_hash_executor
 from util.JWT_helper import get_jwt_helper
+from util.JWT_keys import b64url_encode, token_digest
+
+logger = logging.getLogger(__name__)
 
 
 class AuthService:
@@ -41,7 +56,7 @@ class AuthService:
         self.role_table = Role
         self.user_table = User
         self.fingerprint_table = Fingerprint
-        self.token_lifetime = get_settings().ACESS_TOKEN_LIFETIME * 60
+        self.background_tasks = set()
 
     async def login(
         self, session: AsyncSession, user: UserBase, fingerprint: str
@@ -52,62 +67,46 @@ class AuthService:
         try:
             if not re.match(get_settings().LOGIN_PATTERN, user.login):
                 raise InvalidUserOrPassword
-            user_from_db = await self._get_user_with_relations_from_db(
+            current_user = await self._get_user_credentials_from_db(
                 session=session, user_login=user.login
             )
-            if not user_from_db:
+            if not current_user:
                 raise InvalidUserOrPassword
-            current_user = UserInDBAccess.model_validate(user_from_db)
-            get_hasher().verify(current_user.hashed_password, user.password)
-            current_user_roles = [
-                access.role.title for access in current_user.access
-            ]
+            await get_hash_executor().verify(
+                current_user.hashed_password, user.password
+            )
+            if not current_user.is_active:
+                raise UserInactiveException
+            if get_hash_executor().needs_rehash(current_user.hashed_password):
+                self._run_in_background(
+                    self._rehash_password(
+                        user_id=current_user.id,
+                        hashed_password=current_user.hashed_password,
+                        password=user.password,
+                    )
+                )
             tokens = await self.construct_tokens(
                 login=current_user.login,
-                roles=current_user_roles,
+                roles=current_user.roles,
                 fingerprint=fingerprint,
             )
 
-            fingerprint_in_db = (
-                await self._get_fingerprint_and_refresh_token_from_db(
-                    session=session, fingerprint=fingerprint
-                )
+            fingerprint_id = await self._save_session(
+                session=session,
+                user_id=current_user.id,
+                fingerprint=fingerprint,
+                refresh_token=tokens.refresh_token,
             )
-            if not fingerprint_in_db:
-                fingerprint_obj = FingerprintInDB(
-                    id=uuid.uuid4(),
+            if get_settings().SESSION_STORE == "redis":
+                await get_session_service().save(
+                    refresh_token=tokens.refresh_token,
                     user_id=current_user.id,
+                    fingerprint_id=fingerprint_id,
+                    login=current_user.login,
                     fingerprint=fingerprint,
+                    roles=current_user.roles,
+                    is_active=current_user.is_active,
                 )
-                fingerprint_in_db = await self.database.create(
-                    session=session,
-                    obj=fingerprint_obj,
-                    table=self.fingerprint_table,
-                )
-                refresh_token = RefreshTokenInDB(
-                    id=uuid.uuid4(),
-                    user_id=current_user.id,
-                    fingerprint_id=fingerprint_obj.id,
-                    refresh_token=tokens.refresh_token,
-                )
-                await self.database.create(
-                    session=session,
-                    obj=refresh_token,
-                    table=self.refresh_token_table,
-                )
-            else:
-                if fingerprint_in_db.refresh_token:
-                    fingerprint_in_db.refresh_token.refresh_token = (
-                        tokens.refresh_token
-                    )
-                else:
-                    fingerprint_in_db.refresh_token = RefreshToken(
-                        user_id=current_user.id,
-                        fingerprint_id=fingerprint_in_db.id,
-                        refresh_token=tokens.refresh_token,
-                    )
-                await session.commit()
-
             return tokens
         except IntegrityError:
             raise UserNotFoundException
@@ -119,33 +118,45 @@ class AuthService:
     ) -> UserTokenPair:
         """Generates the new token pair using the refresh token."""
         try:
-            get_jwt_helper().verify_token(token=refresh_token)
+            refresh_token_payload = get_jwt_helper().decode(
+                token=refresh_token, token_schema=RefreshTokenPayload
+            )
+            # Redis is asked directly, refreshes are rare.
+            if (
+                refresh_token_payload.gen
+                < await get_revocation_service().get_generation(
+                    refresh_token_payload.sub
+                )
+            ):
+                raise InvalidToken
+            if get_settings().SESSION_STORE == "redis":
+                stored_session = await get_session_service().get(refresh_token)
+                if stored_session:
+                    return await self._rotate_stored_session(
+                        refresh_token=refresh_token,
+                        stored_session=stored_session,
+                    )
             refresh_token_from_db = await self._get_refresh_token_from_db(
                 session, refresh_token=refresh_token
             )
             if not refresh_token_from_db:
                 raise TokenNotFoundException
-            refresh_token_payload = get_jwt_helper().decode_payload(
-                token=refresh_token, token_schema=RefreshTokenPayload
-            )
-            user_from_db = await self._get_user_with_relations_from_db(
+            current_user = await self._get_user_credentials_from_db(
                 session=session, user_login=refresh_token_payload.sub
             )
-            if not user_from_db:
+            if not current_user:
                 raise InvalidUserOrPassword
-            current_user = UserInDBAccess.model_validate(user_from_db)
-            current_user_roles = [
-                access.role.title for access in current_user.access
-            ]
+            if not current_user.is_active:
+                raise UserInactiveException
             tokens = await self.construct_tokens(
                 login=refresh_token_payload.sub,
                 fingerprint=refresh_token_payload.fingerprint,
-                roles=current_user_roles,
+                roles=current_user.roles,
             )
             updated_token = RefreshTokenInDB(
                 id=uuid.UUID(str(refresh_token_from_db.id)),
                 user_id=uuid.UUID(str(refresh_token_from_db.user_id)),
-                refresh_token=tokens.refresh_token,
+                token_hash=token_digest(tokens.refresh_token),
                 fingerprint_id=uuid.UUID(
                     str(refresh_token_from_db.fingerprint_id)
                 ),
@@ -154,7 +165,19 @@ class AuthService:
                 session=session,
                 obj=updated_token,
                 table=self.refresh_token_table,
+                returning=False,
             )
+            if get_settings().SESSION_STORE == "redis":
+                # The session of the token issued before the store switch.
+                await get_session_service().save(
+                    refresh_token=tokens.refresh_token,
+                    user_id=current_user.id,
+                    fingerprint_id=updated_token.fingerprint_id,
+                    login=current_user.login,
+                    fingerprint=refresh_token_payload.fingerprint,
+                    roles=current_user.roles,
+                    is_active=current_user.is_active,
+                )
             return tokens
         except (ValueError, binascii.Error):
             raise InvalidToken
@@ -167,36 +190,95 @@ class AuthService:
             access_token_payload = get_jwt_helper().decode_payload(
                 token=access_token, token_schema=AccessTokenPayload
             )
-            user = await self._get_user_with_relations_from_db(
+            user = await self._get_user_credentials_from_db(
                 session=session, user_login=access_token_payload.sub
             )
             if not user:
                 raise UserNotFoundException
+            revocation = get_revocation_service()
             if logout_everywhere:
-                stmt = (delete(self.refresh_token_table)).where(
-                    self.refresh_token_table.user_id == user.id
+                await self._delete_refresh_tokens(
+                    session=session, user_id=user.id
                 )
-                await session.execute(statement=stmt)
-                await session.commit()
+                # Revokes the access tokens of all sessions at once.
+                await revocation.bump_generation(user.login)
             else:
-                fingerprint = (
-                    await self._get_fingerprint_and_refresh_token_from_db(
-                        session=session,
-                        fingerprint=access_token_payload.fingerprint,
+                fingerprint = await self._delete_refresh_token(
+                    session=session,
+                    user_id=user.id,
+                    fingerprint=access_token_payload.fingerprint,
+                )
+                if get_settings().SESSION_STORE == "redis":
+                    await get_session_service().revoke(
+                        user_id=user.id, fingerprint_id=fingerprint.id
                     )
+                # The deny list entry lives as long as the token.
+                await revocation.revoke(
+                    revocation.token_id(
+                        access_token, access_token_payload.jti
+                    ),
+                    float(access_token_payload.exp),
                 )
-                if not fingerprint:
-                    raise FingerprintNotExists
-                if not fingerprint.refresh_token:
-                    raise TokenNotFoundException
-                await session.delete(fingerprint.refresh_token)
-                await session.commit()
-            await self.cache.put_to_cache(
-                access_token, "deleted", self.token_lifetime
-            )
         except (ValueError, binascii.Error):
             raise InvalidToken
 
+    async def verify_batch(self, tokens: list[str]) -> list[TokenVerifyResult]:
+        """Verifies the access tokens for a gateway.
+
+        Signs are checked locally, the revocation filter asks Redis with
+        a single request for the whole batch at most."""
+        results = [TokenVerifyResult(valid=False) for _ in tokens]
+        verified = {}
+        for index, token in enumerate(tokens):
+            try:
+                verified[index] = get_jwt_helper().check_access_token(token)
+            except (ValueError, binascii.Error):
+                results[index].error = "Token is incorrect."
+            except ExpireToken:
+                results[index].error = "Token is expired."
+
+        revocation = get_revocation_service()
+        token_ids = {
+            index: revocation.token_id(tokens[index], claims.jti)
+            for index, claims in verified.items()
+        }
+        revoked = await revocation.filter_revoked(
+            {
+                token_ids[index]: float(claims.exp)
+                for index, claims in verified.items()
+            }
+        )
+        now = time.time()
+        for index, claims in verified.items():
+            if token_ids[index] in revoked or revocation.is_stale(
+                claims.sub, claims.gen
+            ):
+                results[index].error = "Token has been revoked."
+                continue
+            results[index] = TokenVerifyResult(
+                valid=True,
+                claims=AccessTokenPayload(**claims.model_dump()),
+                ttl=max(float(claims.exp) - now, 0.0),
+            )
+        return results
+
+    async def introspect(
+        self, token_check_data: TokenCheckResponse
+    ) -> dict[str, str]:
+        """Returns the user headers for the nginx auth_request.
+
+        X-Accel-Expires lets nginx cache the result, but not longer than
+        the token lives."""
+        ttl = min(
+            get_settings().INTROSPECT_CACHE_TTL,
+            int(float(token_check_data.exp) - time.time()),
+        )
+        return {
+            "X-User-Sub": token_check_data.sub,
+            "X-User-Roles": ",".join(token_check_data.roles),
+            "X-Accel-Expires": str(max(ttl, 0)),
+        }
+
     async def construct_tokens(
         self,
         login: str,
@@ -205,6 +287,7 @@ class AuthService:
     ) -> UserTokenPair:
         """Constucts a new token pair for a target user."""
         current_time = datetime.now(timezone.utc)
+        generation = await get_revocation_service().get_generation(login)
 
         acess_token_exp_time = current_time + timedelta(
             hours=get_settings().ACESS_TOKEN_LIFETIME
@@ -214,8 +297,10 @@ class AuthService:
             fingerprint=fingerprint,
             roles=roles,
             exp=str(acess_token_exp_time.timestamp()),
+            gen=generation,
+            jti=self.generate_jti(),
         )
-        acess_token = get_jwt_helper().encode(TokenHeader(), payload)
+        acess_token = get_jwt_helper().encode(payload)
 
         refresh_token_exp_time = current_time + timedelta(
             days=get_settings().REFRESH_TOKEN_LIFETIME
@@ -224,45 +309,223 @@ class AuthService:
             sub=login,
             fingerprint=fingerprint,
             exp=str(refresh_token_exp_time.timestamp()),
+            gen=generation,
+            jti=self.generate_jti(),
         )
-        refresh_token = get_jwt_helper().encode(TokenHeader(), payload)
+        refresh_token = get_jwt_helper().encode(payload)
 
         return UserTokenPair(
             access_token=acess_token, refresh_token=refresh_token
         )
 
-    async def _get_user_with_relations_from_db(
+    async def _rotate_stored_session(
+        self, refresh_token: str, stored_session: dict
+    ) -> UserTokenPair:
+        """Helper rotates the token of the session stored in Redis.
+
+        The roles come from the session. Deleting or renaming a role and
+        the user changes bump the token generation, which rejects the
+        refresh token before it gets here."""
+        if stored_session.get("rotated"):
+            raise TokenNotFoundException
+        if not stored_session["is_active"]:
+            raise UserInactiveException
+        tokens = await self.construct_tokens(
+            login=stored_session["login"],
+            fingerprint=stored_session["fingerprint"],
+            roles=stored_session["roles"],
+        )
+        if not await get_session_service().rotate(
+            refresh_token=refresh_token,
+            new_refresh_token=tokens.refresh_token,
+            session=stored_session,
+        ):
+            raise TokenNotFoundException
+        return tokens
+
+    @staticmethod
+    def make_fingerprint(user_agent: str | None) -> str:
+        """Keyed digest of the device, the same on every worker."""
+        return hmac.new(
+            get_settings().FINGERPRINT_SECRET.encode(),
+            (user_agent or "").encode(),
+            hashlib.sha256,
+        ).hexdigest()[: get_settings().FINGERPRINT_LENGTH]
+
+    @staticmethod
+    def generate_jti() -> str:
+        return b64url_encode(secrets.token_bytes(TOKEN_ID_SIZE))
+
+    def _run_in_background(self, coro) -> None:
+        """Helper runs a task that outlives the request."""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def _rehash_password(
+        self, user_id: uuid.UUID, hashed_password: str, password: str
+    ) -> None:
+        """Upgrades the stored hash to the current Argon2 parameters.
+
+        The hash is replaced only if the password hasn't been changed
+        in the meantime."""
+        try:
+            new_hashed_password = await get_hash_executor().hash(password)
+        except ServiceOverloadedException:
+            # The hash will be upgraded on the next login.
+            return
+        stmt = (
+            update(self.user_table)
+            .where(
+                self.user_table.id == user_id,
+                self.user_table.hashed_password == hashed_password,
+            )
+            .values(hashed_password=new_hashed_password)
+        )
+        try:
+            async with session_handler.session_factory() as session:
+                await self.database.execute(session=session, stmt=stmt)
+                await session.commit()
+        except Exception:
+            logger.exception("Failed to rehash the password of %s", user_id)
+
+    async def _save_session(
+        self,
+        session: AsyncSession,
+        user_id: uuid.UUID,
+        fingerprint: str,
+        refresh_token: str,
+    ) -> uuid.UUID:
+        """Helper stores the fingerprint and its refresh token at once.
+
+        Both upserts go in a single statement, a known fingerprint gets
+        its refresh token replaced."""
+        now = datetime.utcnow()
+        fingerprint_stmt = pg_insert(self.fingerprint_table).values(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            fingerprint=fingerprint,
+            created_at=now,
+            modified_at=now,
+        )
+        fingerprint_cte = (
+            fingerprint_stmt.on_conflict_do_update(
+                index_elements=[
+                    self.fingerprint_table.user_id,
+                    self.fingerprint_table.fingerprint,
+                ],
+                set_={"modified_at": fingerprint_stmt.excluded.modified_at},
+            )
+            .returning(self.fingerprint_table.id)
+            .cte("upserted_fingerprint")
+        )
+        token_stmt = pg_insert(self.refresh_token_table).from_select(
+            ["id", "user_id", "fingerprint_id", "token_hash", "created_at"],
+            select(
+                literal(uuid.uuid4(), self.refresh_token_table.id.type),
+                literal(user_id, self.refresh_token_table.user_id.type),
+                fingerprint_cte.c.id,
+                literal(
+                    token_digest(refresh_token),
+                    self.refresh_token_table.token_hash.type,
+                ),
+                literal(now),
+            ),
+        )
+        stmt = token_stmt.on_conflict_do_update(
+            index_elements=[
+                self.refresh_token_table.user_id,
+                self.refresh_token_table.fingerprint_id,
+            ],
+            set_={
+                "token_hash": token_stmt.excluded.token_hash,
+                "created_at": token_stmt.excluded.created_at,
+            },
+        ).returning(self.refresh_token_table.fingerprint_id)
+        result = await self.database.execute(session=session, stmt=stmt)
+        fingerprint_id = result.scalar_one()
+        await session.commit()
+        return fingerprint_id
+
+    async def _delete_refresh_token(
+        self, session: AsyncSession, user_id: uuid.UUID, fingerprint: str
+    ) -> Fingerprint:
+        """Helper deletes the refresh token of the user device."""
+        fingerprint_from_db = (
+            await self._get_fingerprint_and_refresh_token_from_db(
+                session=session, user_id=user_id, fingerprint=fingerprint
+            )
+        )
+        if not fingerprint_from_db:
+            raise FingerprintNotExists
+        if not fingerprint_from_db.refresh_token:
+            raise TokenNotFoundException
+        await session.delete(fingerprint_from_db.refresh_token)
+        await session.commit()
+        return fingerprint_from_db
+
+    async def _delete_refresh_tokens(
+        self, session: AsyncSession, user_id: uuid.UUID
+    ) -> None:
+        """Helper deletes the refresh tokens of all user devices."""
+        stmt = delete(self.refresh_token_table).where(
+            self.refresh_token_table.user_id == user_id
+        )
+        await session.execute(statement=stmt)
+        await session.commit()
+
+    async def _get_user_credentials_from_db(
         self,
         session: AsyncSession,
         user_login: str,
-    ) -> User | None:
-        """Helper returns the user with related objects from the database."""
+    ) -> UserCredentials | None:
+        """Helper returns the user with the role titles from the database.
+
+        The roles are aggregated to an array, so the query returns a single
+        row and no ORM objects."""
         stmt = (
-            select(self.user_table)
-            .where(self.user_table.login == user_login)
-            .options(
-                joinedload(self.user_table.access).joinedload(
-                    self.access_table.role
-                ),
-                joinedload(self.user_table.fingerprints).joinedload(
-                    self.fingerprint_table.refresh_token
-                ),
+            select(
+                self.user_table.id,
+                self.user_table.login,
+                self.user_table.hashed_password,
+                self.user_table.is_active,
+                func.array_remove(
+                    func.array_agg(self.role_table.title),
+                    None,
+                    type_=ARRAY(String),
+                ).label("roles"),
+            )
+            .outerjoin(
+                self.access_table,
+                self.access_table.user_id == self.user_table.id,
             )
+            .outerjoin(
+                self.role_table,
+                self.role_table.id == self.access_table.role_id,
+            )
+            .where(self.user_table.login == user_login)
+            .group_by(self.user_table.id)
         )
         result = await self.database.execute(session=session, stmt=stmt)
-        return result.unique().scalars().one_or_none()
+        row = result.one_or_none()
+        if not row:
+            return None
+        return UserCredentials(**row._mapping)
 
     async def _get_fingerprint_and_refresh_token_from_db(
-        self, session: AsyncSession, fingerprint: str
+        self, session: AsyncSession, user_id: uuid.UUID, fingerprint: str
     ) -> Fingerprint | None:
-        """Helper returns the fingerprint from the database."""
+        """Helper returns the user fingerprint from the database."""
         stmt = (
             select(self.fingerprint_table)
-            .where(self.fingerprint_table.fingerprint == fingerprint)
+            .where(
+                self.fingerprint_table.user_id == user_id,
+                self.fingerprint_table.fingerprint == fingerprint,
+            )
             .options(joinedload(self.fingerprint_table.refresh_token))
         )
         result = await self.database.execute(session=session, stmt=stmt)
-        return result.unique().scalars().first()
+        return result.unique().scalars().one_or_none()
 
     async def _get_refresh_token_from_db(
         self,
@@ -271,7 +534,7 @@ class AuthService:
     ) -> RefreshToken | None:
         """Helper returns the token from the database."""
         stmt = select(self.refresh_token_table).where(
-            self.refresh_token_table.refresh_token == refresh_token
+            self.refresh_token_table.token_hash == token_digest(refresh_token)
         )
         results = await self.database.execute(session=session, stmt=stmt)
         return results.scalars().first()
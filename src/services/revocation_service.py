@@ -0,0 +1,406 @@
+import asyncio
+import hashlib
+import logging
+import time
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Annotated, Sequence
+
+from fastapi import Depends, Security
+from fastapi.security import SecurityScopes
+
+from core.config import get_settings
+from core.exceptions import UnAuthorizedException
+from db.redis import redis
+from db.redis.denylist import MigratingDenyList, RedisDenyList, build_denylist
+from schemas.token import TokenCheckResponse
+from util.bloom_filter import BloomFilter
+from util.JWT_helper import get_authenticate_value, token_check
+from util.JWT_keys import b64url_decode
+
+logger = logging.getLogger(__name__)
+
+# Width of the jti claim and the token ids in bytes
+TOKEN_ID_SIZE = 12
+
+# Sets the generation to the bump time in ms, above the current one. A
+# counter started over after expiring can't reach the generations of
+# the tokens issued before, so these stay stale.
+# KEYS: generation counter. ARGV: now in ms, lifetime.
+BUMP_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local generation = math.max(current + 1, tonumber(ARGV[1]))
+redis.call('SET', KEYS[1], generation, 'EX', ARGV[2])
+return generation
+"""
+
+
+@dataclass
+class RevocationMetrics:
+    checks: int = 0
+    bloom_hits: int = 0
+    false_positives: int = 0
+    revoked: int = 0
+    stale: int = 0
+    generation_bumps: int = 0
+    synced: int = 0
+    rebuilds: int = 0
+
+
+class RevocationService:
+    """RevocationService answers if an access token has been revoked.
+
+    Every worker keeps a Bloom filter of the revoked token ids, so most
+    checks don't leave the process. Redis is asked only when the filter
+    reports a possible hit. Workers learn about revocations from a pub/sub
+    channel, the filter is loaded from the deny list snapshot on startup
+    and rebuilt periodically to forget the expired ids.
+
+    All tokens of a user are revoked at once by bumping the user token
+    generation. Tokens carry the generation they have been issued in,
+    workers keep the bumped generations in memory the same way. No token
+    outlives the refresh token lifetime, so the generations expire after
+    it.
+
+    Redis is used through the client without response decoding, the
+    token ids are raw bytes."""
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float,
+        channel: str,
+        generation_channel: str,
+        denylist_layout: str,
+        prefix: str,
+        bucket_seconds: int,
+        previous_denylist_layout: str | None,
+        previous_prefix: str | None,
+        generation_prefix: str,
+        generation_lifetime: int,
+        rebuild_interval: float,
+        retry_delay: float,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.channel = channel
+        # Carries "<login>:<generation>", the revocation channel raw ids
+        self.generation_channel = generation_channel
+        self.denylist_layout = denylist_layout
+        self.prefix = prefix.encode()
+        self.bucket_seconds = bucket_seconds
+        # Layout the deny list is moved from, its revocations are still read
+        self.previous_denylist_layout = previous_denylist_layout
+        self.previous_prefix = previous_prefix and previous_prefix.encode()
+        self.generation_prefix = generation_prefix
+        self.generation_lifetime = generation_lifetime
+        self.rebuild_interval = rebuild_interval
+        self.retry_delay = retry_delay
+        self.bloom = BloomFilter(capacity, error_rate)
+        # Filter being loaded from the snapshot, gets the published ids too
+        self.pending: BloomFilter | None = None
+        # Login to the generation and its expiry time, only the bumped
+        # ones are kept
+        self.generations: dict[str, tuple[int, float]] = {}
+        self.pending_generations: dict[str, tuple[int, float]] | None = None
+        self.denylist: RedisDenyList | MigratingDenyList | None = None
+        self.pubsub = None
+        self.bump_script = None
+        self.tasks: list[asyncio.Task] = []
+        self.metrics = RevocationMetrics()
+
+    @staticmethod
+    def token_id(token: str, jti: str | None) -> bytes:
+        """Returns the jti bytes or the token digest if it has no jti."""
+        if jti:
+            return b64url_decode(jti)
+        return hashlib.blake2b(
+            token.encode(), digest_size=TOKEN_ID_SIZE
+        ).digest()
+
+    async def start(self) -> None:
+        """Subscribes to the channel first, so no id is lost while the
+        snapshot is loaded."""
+        self.denylist = build_denylist(
+            layout=self.denylist_layout,
+            redis=redis.binary_redis,
+            prefix=self.prefix,
+            bucket_seconds=self.bucket_seconds,
+            previous_layout=self.previous_denylist_layout,
+            previous_prefix=self.previous_prefix,
+        )
+        self.bump_script = redis.binary_redis.register_script(BUMP_SCRIPT)
+        await self._subscribe()
+        await self._rebuild()
+        self.tasks = [
+            asyncio.create_task(self._listen()),
+            asyncio.create_task(self._rebuild_periodically()),
+        ]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.pubsub:
+            await self.pubsub.aclose()
+            self.pubsub = None
+
+    async def revoke(self, token_id: bytes, exp: float) -> None:
+        """Revokes the token until its exp."""
+        if exp <= time.time():
+            return
+        await self.denylist.add(token_id, exp)
+        await redis.binary_redis.publish(self.channel, token_id)
+        self._add_local(token_id)
+        self.metrics.revoked += 1
+
+    async def is_revoked(self, token_id: bytes, exp: float) -> bool:
+        self.metrics.checks += 1
+        if token_id not in self.bloom:
+            return False
+        self.metrics.bloom_hits += 1
+        if await self.denylist.contains(token_id, exp):
+            return True
+        self.metrics.false_positives += 1
+        return False
+
+    async def filter_revoked(self, tokens: dict[bytes, float]) -> set[bytes]:
+        """Returns the revoked ids with a single Redis request at most.
+
+        Gets the token ids with their exp."""
+        self.metrics.checks += len(tokens)
+        candidates = {
+            token_id: exp
+            for token_id, exp in tokens.items()
+            if token_id in self.bloom
+        }
+        if not candidates:
+            return set()
+        self.metrics.bloom_hits += len(candidates)
+        revoked = await self.denylist.contains_many(candidates)
+        self.metrics.false_positives += len(candidates) - len(revoked)
+        return revoked
+
+    async def bump_generation(self, login: str) -> int:
+        """Revokes all tokens issued for the user so far."""
+        [generation] = await self.bump_generations([login])
+        return generation
+
+    async def bump_generations(self, logins: Sequence[str]) -> list[int]:
+        """Revokes all tokens of the users with a pipeline per batch."""
+        bumped = []
+        for start in range(0, len(logins), 1000):
+            batch = logins[start : start + 1000]
+            now = int(time.time() * 1000)
+            pipeline = redis.binary_redis.pipeline(transaction=False)
+            for login in batch:
+                await self.bump_script(
+                    keys=[self.generation_key(login)],
+                    args=[now, self.generation_lifetime],
+                    client=pipeline,
+                )
+            generations = await pipeline.execute()
+            pipeline = redis.binary_redis.pipeline(transaction=False)
+            for login, generation in zip(batch, generations):
+                pipeline.publish(
+                    self.generation_channel, f"{login}:{generation}".encode()
+                )
+                self._set_generation(login, generation)
+            await pipeline.execute()
+            self.metrics.generation_bumps += len(batch)
+            bumped.extend(generations)
+        return bumped
+
+    async def get_generation(self, login: str) -> int:
+        """Returns the current generation to issue tokens.
+
+        The local one is higher only if the counter has been lost, tokens
+        of the lower generation would be stale on this worker."""
+        generation = await redis.binary_redis.get(self.generation_key(login))
+        return max(int(generation or 0), self._get_local_generation(login))
+
+    def is_stale(self, login: str, generation: int) -> bool:
+        """Checks the token generation against the local map."""
+        if generation < self._get_local_generation(login):
+            self.metrics.stale += 1
+            return True
+        return False
+
+    def generation_key(self, login: str) -> str:
+        return f"{self.generation_prefix}{login}"
+
+    def get_metrics(self) -> dict:
+        metrics = asdict(self.metrics)
+        metrics["bloom_items"] = self.bloom.count
+        metrics["bloom_bytes"] = len(self.bloom.bits)
+        metrics["generations"] = len(self.generations)
+        return metrics
+
+    def _on_message(self, channel: bytes, data: bytes) -> None:
+        if channel.decode() == self.generation_channel:
+            login, _, generation = data.decode().rpartition(":")
+            self._set_generation(login, int(generation))
+        else:
+            self._add_local(data)
+
+    def _get_local_generation(self, login: str) -> int:
+        """Returns the bumped generation, the expired one is dropped."""
+        if not (entry := self.generations.get(login)):
+            return 0
+        generation, expires_at = entry
+        if expires_at <= time.time():
+            del self.generations[login]
+            return 0
+        return generation
+
+    def _set_generation(
+        self, login: str, generation: int, expires_at: float | None = None
+    ) -> None:
+        """Keeps the highest one, concurrent bumps may come unordered.
+
+        A published generation expires a lifetime after it is received."""
+        if expires_at is None:
+            expires_at = time.time() + self.generation_lifetime
+        for generations in (self.generations, self.pending_generations):
+            if generations is not None:
+                generations[login] = max(
+                    generations.get(login, (0, 0.0)), (generation, expires_at)
+                )
+
+    def _add_local(self, token_id: bytes) -> None:
+        self.bloom.add(token_id)
+        if self.pending is not None:
+            self.pending.add(token_id)
+
+    async def _subscribe(self) -> None:
+        if self.pubsub:
+            await self.pubsub.aclose()
+        self.pubsub = redis.binary_redis.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(self.channel, self.generation_channel)
+
+    async def _rebuild(self) -> None:
+        """Loads the deny list and generations snapshot.
+
+        The ids and generations published meanwhile go to both the old
+        and the new state."""
+        self.pending = BloomFilter(self.capacity, self.error_rate)
+        self.pending_generations = {}
+        try:
+            async for token_id in self.denylist.scan():
+                self.pending.add(token_id)
+            await self._load_generations()
+            self.bloom = self.pending
+            self.generations = self.pending_generations
+        finally:
+            self.pending = None
+            self.pending_generations = None
+        self.metrics.rebuilds += 1
+
+    async def _load_generations(self) -> None:
+        """Loads the generations bumped within the lifetime.
+
+        The counters made before they expired get the lifetime now."""
+        keys = [
+            key
+            async for key in redis.binary_redis.scan_iter(
+                match=f"{self.generation_prefix}*", count=1000
+            )
+        ]
+        for start in range(0, len(keys), 1000):
+            batch = keys[start : start + 1000]
+            pipeline = redis.binary_redis.pipeline(transaction=False)
+            for key in batch:
+                pipeline.get(key)
+                pipeline.pttl(key)
+            replies = await pipeline.execute()
+            now = time.time()
+            for key, generation, ttl in zip(
+                batch, replies[::2], replies[1::2]
+            ):
+                if generation is None:
+                    continue
+                if ttl < 0:
+                    await redis.binary_redis.expire(
+                        key, self.generation_lifetime, nx=True
+                    )
+                    ttl = self.generation_lifetime * 1000
+                self._set_generation(
+                    key.decode()[len(self.generation_prefix) :],
+                    int(generation),
+                    expires_at=now + ttl / 1000,
+                )
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for message in self.pubsub.listen():
+                    if message["type"] == "message":
+                        self._on_message(message["channel"], message["data"])
+                        self.metrics.synced += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Revocation channel is broken")
+            # Revocations published while offline come with the snapshot.
+            await asyncio.sleep(self.retry_delay)
+            try:
+                await self._subscribe()
+                await self._rebuild()
+            except Exception:
+                logger.exception("Failed to resubscribe to revocations")
+
+    async def _rebuild_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            try:
+                await self._rebuild()
+            except Exception:
+                logger.exception("Failed to rebuild the revocation filter")
+
+
+def get_denylist_prefix(layout: str) -> str:
+    settings = get_settings()
+    if layout == "buckets":
+        return settings.DENYLIST_BUCKET_PREFIX
+    return settings.REVOCATION_PREFIX
+
+
+@lru_cache()
+def get_revocation_service() -> RevocationService:
+    settings = get_settings()
+    return RevocationService(
+        capacity=settings.REVOCATION_CAPACITY,
+        error_rate=settings.REVOCATION_ERROR_RATE,
+        channel=settings.REVOCATION_CHANNEL,
+        generation_channel=settings.REVOCATION_GENERATION_CHANNEL,
+        denylist_layout=settings.DENYLIST_LAYOUT,
+        prefix=get_denylist_prefix(settings.DENYLIST_LAYOUT),
+        bucket_seconds=settings.DENYLIST_BUCKET_SECONDS,
+        previous_denylist_layout=settings.DENYLIST_PREVIOUS_LAYOUT,
+        previous_prefix=(
+            settings.DENYLIST_PREVIOUS_LAYOUT
+            and get_denylist_prefix(settings.DENYLIST_PREVIOUS_LAYOUT)
+        ),
+        generation_prefix=settings.TOKEN_GENERATION_PREFIX,
+        generation_lifetime=settings.REFRESH_TOKEN_LIFETIME * 24 * 60 * 60,
+        rebuild_interval=settings.REVOCATION_REBUILD_INTERVAL,
+        retry_delay=settings.REVOCATION_RETRY_DELAY,
+    )
+
+
+async def active_token_check(
+    token_check_data: Annotated[TokenCheckResponse, Security(token_check)],
+    revocation: Annotated[RevocationService, Depends(get_revocation_service)],
+    security_scopes: SecurityScopes,
+) -> TokenCheckResponse:
+    """token_check that also rejects the revoked tokens."""
+    if await revocation.is_revoked(
+        revocation.token_id(token_check_data.token, token_check_data.jti),
+        float(token_check_data.exp),
+    ) or revocation.is_stale(token_check_data.sub, token_check_data.gen):
+        raise UnAuthorizedException(
+            detail="Token has been revoked.",
+            authenticate_value=get_authenticate_value(security_scopes),
+        )
+    return token_check_data
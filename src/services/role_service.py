@@ -1,17 +1,21 @@
 from datetime import datetime
 from functools import lru_cache
-from typing import Annotated
+from typing import Annotated, AsyncIterator, Sequence
 
 from fastapi import Depends
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.exceptions import (CommonExistsException, DBException,
-                             RoleNotFoundException)
+                             InvalidCursorException, RoleNotFoundException)
 from db.postgres.postgres import PostgresStorage, get_postgers_storage
 from models.role import Role
+from models.user import User
+from models.user_role import UserRoleModel
 from schemas.role import (RoleCreateSchema, RoleDBSchema, RoleResponseSchema,
                           RoleTitleSchema, RoleUpdateSchema)
+from services.revocation_service import get_revocation_service
 
 
 class RoleService:
@@ -19,18 +23,41 @@ class RoleService:
         self.model = Role
         self.database = database
 
-    async def list(self, session: AsyncSession) -> list[RoleResponseSchema]:
-        """Get a list of the roles from the database."""
-        roles = []
-        roles_from_db = await self.database.get_list(
-            session=session, table=self.model
-        )
-        if roles_from_db:
-            roles = [
+    async def list(
+        self, session: AsyncSession, limit: int, cursor: str | None = None
+    ) -> tuple[list[RoleResponseSchema], str | None]:
+        """Get a page of the roles ordered by title and the next cursor."""
+        try:
+            roles_from_db, next_cursor = await self.database.get_list(
+                session=session,
+                table=self.model,
+                limit=limit,
+                cursor=cursor,
+                key="title",
+            )
+        except ValueError:
+            raise InvalidCursorException
+        roles = [
+            RoleResponseSchema.model_validate(role_from_db)
+            for role_from_db in roles_from_db
+        ]
+        return roles, next_cursor
+
+    async def stream(self, session: AsyncSession) -> AsyncIterator[bytes]:
+        """Stream all roles as a JSON array chunk by chunk."""
+        yield b"["
+        separator = b""
+        async for roles_from_db in self.database.stream(
+            session=session, table=self.model, key="title"
+        ):
+            yield separator + b",".join(
                 RoleResponseSchema.model_validate(role_from_db)
+                .model_dump_json()
+                .encode()
                 for role_from_db in roles_from_db
-            ]
-        return roles
+            )
+            separator = b","
+        yield b"]"
 
     async def create(
         self, session: AsyncSession, role: RoleCreateSchema
@@ -74,6 +101,14 @@ class RoleService:
             )
         ):
             raise RoleNotFoundException
+        holder_logins = []
+        if (
+            update_role_data.title
+            and update_role_data.title != role_title.title
+        ):
+            holder_logins = await self._get_holder_logins(
+                session=session, role=role_title
+            )
         try:
             role_update = RoleDBSchema.model_validate(role_from_db)
             if update_role_data.title:
@@ -91,16 +126,36 @@ class RoleService:
                 )
         except IntegrityError:
             raise CommonExistsException
+        # Tokens of the holders still carry the old title.
+        await get_revocation_service().bump_generations(holder_logins)
         return RoleDBSchema.model_validate(updated_role_from_db)
 
     async def delete(
         self, session: AsyncSession, role: RoleTitleSchema
     ) -> None:
         """Detele a role from the database."""
+        holder_logins = await self._get_holder_logins(
+            session=session, role=role
+        )
         if not await self.database.delete(
             session=session, obj=role, table=self.model
         ):
             raise RoleNotFoundException
+        # Tokens of the holders still carry the deleted role.
+        await get_revocation_service().bump_generations(holder_logins)
+
+    async def _get_holder_logins(
+        self, session: AsyncSession, role: RoleTitleSchema
+    ) -> Sequence[str]:
+        """Helper returns the logins of the users having the role."""
+        stmt = (
+            select(User.login)
+            .join(UserRoleModel, UserRoleModel.user_id == User.id)
+            .join(self.model, self.model.id == UserRoleModel.role_id)
+            .where(self.model.title == role.title)
+        )
+        result = await self.database.execute(session=session, stmt=stmt)
+        return result.scalars().all()
 
 
 @lru_cache()
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from functools import lru_cache
+
+from redis.exceptions import ResponseError
+from sqlalchemy import bindparam, update
+
+from core.config import get_settings
+from db.postgres.session_handler import session_handler
+from db.redis import redis
+from db.redis.session_store import RedisSessionStore
+from models.token import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionMetrics:
+    hits: int = 0
+    misses: int = 0
+    rotations: int = 0
+    conflicts: int = 0
+    written: int = 0
+    batches: int = 0
+    write_failures: int = 0
+    # Rotations read by a worker and not written yet
+    pending: int = 0
+    # Rotations not read by any worker yet
+    lag: int = 0
+
+
+class SessionService:
+    """SessionService keeps the active refresh sessions in Redis.
+
+    Refresh reads the session and rotates the token with a Lua script,
+    Postgres isn't touched on the request. The session keeps the roles
+    of the login, the role and user changes that would make them stale
+    bump the token generation instead. Every worker runs a consumer
+    of the rotation stream, that writes the rotations to Postgres in
+    batches and acknowledges and deletes them after the commit. The
+    stream is never trimmed, a rotation is dropped only once written.
+
+    A rotation is applied only if it's newer than the stored token of
+    the fingerprint, so batches may be written in any order and a later
+    login is never overwritten."""
+
+    def __init__(
+        self,
+        prefix: str,
+        stream: str,
+        group: str,
+        lifetime: int,
+        batch_size: int,
+        interval: float,
+        claim_timeout: float,
+        retry_delay: float,
+    ):
+        self.prefix = prefix
+        self.stream = stream
+        self.group = group
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.lifetime = lifetime
+        self.batch_size = batch_size
+        self.interval = interval
+        self.claim_timeout = claim_timeout
+        self.retry_delay = retry_delay
+        self.store: RedisSessionStore | None = None
+        self.task: asyncio.Task | None = None
+        self.metrics = SessionMetrics()
+
+    async def start(self) -> None:
+        self.store = RedisSessionStore(
+            redis=redis.redis,
+            prefix=self.prefix,
+            stream=self.stream,
+        )
+        await self._create_group()
+        self.task = asyncio.create_task(self._write_behind())
+
+    async def stop(self) -> None:
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def get(self, refresh_token: str) -> dict | None:
+        """Returns the session of the token.
+
+        None means the session isn't in Redis and should be looked up in
+        Postgres, a rotated token gets "rotated" in the session."""
+        session = await self.store.get(refresh_token)
+        if session is None:
+            self.metrics.misses += 1
+            return None
+        self.metrics.hits += 1
+        if "roles" in session:
+            session["roles"] = json.loads(session["roles"])
+            session["is_active"] = session["is_active"] == "1"
+        return session
+
+    async def save(
+        self,
+        refresh_token: str,
+        user_id: uuid.UUID,
+        fingerprint_id: uuid.UUID,
+        login: str,
+        fingerprint: str,
+        roles: list[str],
+        is_active: bool,
+    ) -> None:
+        """Stores the session written to Postgres by a login."""
+        await self.store.save(
+            token=refresh_token,
+            session={
+                "user_id": str(user_id),
+                "fingerprint_id": str(fingerprint_id),
+                "login": login,
+                "fingerprint": fingerprint,
+                "roles": json.dumps(roles),
+                "is_active": "1" if is_active else "0",
+            },
+            lifetime=self.lifetime,
+        )
+
+    async def rotate(
+        self, refresh_token: str, new_refresh_token: str, session: dict
+    ) -> bool:
+        """Returns False if the token has been used concurrently."""
+        rotated = await self.store.rotate(
+            token=refresh_token,
+            new_token=new_refresh_token,
+            session=session,
+            lifetime=self.lifetime,
+            created_at=time.time(),
+        )
+        if rotated:
+            self.metrics.rotations += 1
+        else:
+            self.metrics.conflicts += 1
+        return rotated
+
+    async def revoke(
+        self, user_id: uuid.UUID, fingerprint_id: uuid.UUID
+    ) -> None:
+        await self.store.revoke(str(user_id), str(fingerprint_id))
+
+    def get_metrics(self) -> dict:
+        return asdict(self.metrics)
+
+    async def _write_behind(self) -> None:
+        while True:
+            try:
+                entries = await self._read_batch()
+                if entries:
+                    await self._write(entries)
+                await self._update_backlog()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.metrics.write_failures += 1
+                logger.exception("Failed to write the refresh sessions")
+                # Pending rotations are read again after the claim timeout.
+                await asyncio.sleep(self.retry_delay)
+
+    async def _create_group(self) -> None:
+        try:
+            await redis.redis.xgroup_create(
+                name=self.stream, groupname=self.group, id="0", mkstream=True
+            )
+        except ResponseError as error:
+            if "BUSYGROUP" not in str(error):
+                raise
+
+    async def _update_backlog(self) -> None:
+        """Puts the rotations waiting for Postgres into the metrics.
+
+        The stream keeps only these, the written ones are deleted."""
+        pipeline = redis.redis.pipeline(transaction=False)
+        pipeline.xlen(self.stream)
+        pipeline.xpending(self.stream, self.group)
+        length, pending = await pipeline.execute()
+        self.metrics.pending = pending["pending"]
+        self.metrics.lag = length - pending["pending"]
+
+    async def _read_batch(self) -> list:
+        """Takes over the rotations of the crashed workers first."""
+        try:
+            _, entries, *_ = await redis.redis.xautoclaim(
+                name=self.stream,
+                groupname=self.group,
+                consumername=self.consumer,
+                min_idle_time=int(self.claim_timeout * 1000),
+                count=self.batch_size,
+            )
+        except ResponseError as error:
+            if "NOGROUP" not in str(error):
+                raise
+            # The stream has been lost with a Redis restart or flush.
+            await self._create_group()
+            return []
+        if entries:
+            return entries
+        response = await redis.redis.xreadgroup(
+            groupname=self.group,
+            consumername=self.consumer,
+            streams={self.stream: ">"},
+            count=self.batch_size,
+            block=int(self.interval * 1000),
+        )
+        return response[0][1] if response else []
+
+    async def _write(self, entries: list) -> None:
+        """Writes the latest rotation of every fingerprint of the batch."""
+        latest = {}
+        for _, fields in entries:
+            if not fields:
+                continue
+            fingerprint = (fields["user_id"], fields["fingerprint_id"])
+            if fingerprint not in latest or float(
+                fields["created_at"]
+            ) > float(latest[fingerprint]["created_at"]):
+                latest[fingerprint] = fields
+        if latest:
+            table = RefreshToken.__table__
+            stmt = (
+                update(table)
+                .where(
+                    table.c.user_id == bindparam("b_user_id"),
+                    table.c.fingerprint_id == bindparam("b_fingerprint_id"),
+                    table.c.created_at < bindparam("b_created_at"),
+                )
+                .values(
+                    token_hash=bindparam("b_token_hash"),
+                    created_at=bindparam("b_created_at"),
+                )
+            )
+            async with session_handler.session_factory() as session:
+                await session.execute(
+                    stmt,
+                    [
+                        {
+                            "b_user_id": uuid.UUID(fields["user_id"]),
+                            "b_fingerprint_id": uuid.UUID(
+                                fields["fingerprint_id"]
+                            ),
+                            "b_token_hash": bytes.fromhex(
+                                fields["token_hash"]
+                            ),
+                            "b_created_at": datetime.utcfromtimestamp(
+                                float(fields["created_at"])
+                            ),
+                        }
+                        for fields in latest.values()
+                    ],
+                )
+                await session.commit()
+        # The old tokens are gone from Postgres, so are the tombstones.
+        tombstones = [fields["previous"] for _, fields in entries if fields]
+        if tombstones:
+            await redis.redis.delete(*tombstones)
+        entry_ids = [entry_id for entry_id, _ in entries]
+        pipeline = redis.redis.pipeline(transaction=True)
+        pipeline.xack(self.stream, self.group, *entry_ids)
+        pipeline.xdel(self.stream, *entry_ids)
+        await pipeline.execute()
+        self.metrics.written += len(latest)
+        self.metrics.batches += 1
+
+
+@lru_cache()
+def get_session_service() -> SessionService:
+    settings = get_settings()
+    return SessionService(
+        prefix=settings.SESSION_PREFIX,
+        stream=settings.SESSION_STREAM,
+        group=settings.SESSION_WRITE_GROUP,
+        lifetime=settings.REFRESH_TOKEN_LIFETIME * 24 * 60 * 60,
+        batch_size=settings.SESSION_WRITE_BATCH_SIZE,
+        interval=settings.SESSION_WRITE_INTERVAL,
+        claim_timeout=settings.SESSION_WRITE_CLAIM_TIMEOUT,
+        retry_delay=settings.SESSION_WRITE_RETRY_DELAY,
+    )
@@ -17,7 +17,8 @@ from db.postgres.postgres import PostgresStorage, get_postgers_storage
 from models.user import User
 from schemas.user import (UserInDB, UserLoginSchema, UserSaveToDB, UserSelf,
                           UserSelfResponse)
-from util.hash_helper import get_hasher
+from services.revocation_service import get_revocation_service
+from util.hash_helper import get_hash_executor
 
 
 class UserService:
@@ -30,7 +31,7 @@ class UserService:
     ) -> UserSelfResponse:
         """Create user in the database."""
         try:
-            hashed_password = get_hasher().hash(user.password)
+            hashed_password = await get_hash_executor().hash(user.password)
             user_db_model = UserSaveToDB(
                 **user.model_dump(), hashed_password=hashed_password
             )
@@ -86,14 +87,20 @@ class UserService:
             if update_user_data.last_name:
                 updated_user_model.last_name = update_user_data.last_name
             if update_user_data.password:
-                updated_user_model.hashed_password = get_hasher().hash(
-                    update_user_data.password
+                updated_user_model.hashed_password = (
+                    await get_hash_executor().hash(update_user_data.password)
                 )
             updated_user_model.modified_at = datetime.utcnow()
 
             await self.database.update(
-                session=session, obj=updated_user_model, table=self.user_table
+                session=session,
+                obj=updated_user_model,
+                table=self.user_table,
+                returning=False,
             )
+            if update_user_data.login or update_user_data.password:
+                # Tokens issued with the old credentials are revoked.
+                await get_revocation_service().bump_generation(user.login)
         except (ValueError, binascii.Error):
             raise InvalidToken
         except IntegrityError as e:
@@ -108,7 +115,9 @@ class UserService:
             user_from_db = await self.get_user_from_db(
                 session=session, user=user
             )
-            invalid_string = get_hasher().hash(user_from_db.login)[:-20:-1]
+            invalid_string = (
+                await get_hash_executor().hash(user_from_db.login)
+            )[:-20:-1]
             text = [random.choice(string.ascii_lowercase) for i in range(30)]
             update_data = UserInDB(
                 id=user_from_db.id,
@@ -125,8 +134,12 @@ class UserService:
                 is_active=False,
             )
             await self.database.update(
-                session=session, obj=update_data, table=self.user_table
+                session=session,
+                obj=update_data,
+                table=self.user_table,
+                returning=False,
             )
+            await get_revocation_service().bump_generation(user.login)
         except (ValueError, binascii.Error):
             raise InvalidToken
 
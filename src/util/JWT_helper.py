@@ -1,11 +1,10 @@
-import base64
-import json
-from datetime import datetime, timezone
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
 from functools import lru_cache
 from typing import Annotated
 
-from argon2.exceptions import VerifyMismatchError
-from Cryptodome.Hash import HMAC, SHA256
 from fastapi import Depends
 from fastapi.security import SecurityScopes
 from pydantic import BaseModel
@@ -13,65 +12,171 @@ from pydantic import BaseModel
 from core.config import get_settings
 from core.exceptions import ExpireToken, UnAuthorizedException
 from schemas.token import (AccessTokenPayload, RefreshTokenPayload,
-                           TokenCheckResponse)
+                           TokenCheckResponse, TokenHeader)
+from util.JWT_keys import KeyRing, b64url_decode, b64url_encode
 
 
-class JWTHelper:
-    """JWTHelper provides methods to encode, decode and verify the token."""
+@dataclass
+class TokenCacheMetrics:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
 
-    def __init__(self):
-        self.encoding = get_settings().JWT_CODE
-        self.key = get_settings().JWT_SECRET.encode(self.encoding)
 
-    def encode(self, header: BaseModel, payload: BaseModel) -> str:
-        """Basic encode function.
+class VerifiedTokenCache:
+    """LRU cache of the verified access token claims.
+
+    Entries are keyed by the token digest and live until the token exp."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[bytes, tuple[float, TokenCheckResponse]] = (
+            OrderedDict()
+        )
+        self.metrics = TokenCacheMetrics()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, key: bytes) -> TokenCheckResponse | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.metrics.misses += 1
+            return None
+        exp, claims = entry
+        if exp < time.time():
+            del self.entries[key]
+            self.metrics.expirations += 1
+            self.metrics.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.metrics.hits += 1
+        return claims
+
+    def put(self, key: bytes, exp: float, claims: TokenCheckResponse) -> None:
+        if self.max_size <= 0:
+            return
+        self.entries[key] = (exp, claims)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.metrics.evictions += 1
+
+    def get_metrics(self) -> dict:
+        metrics = asdict(self.metrics)
+        metrics["size"] = len(self.entries)
+        return metrics
+
 
-        Gets the header and payload pydantic objects and returns a JWT token."""
-        hasher = HMAC.new(self.key, digestmod=SHA256)
+class JWTHelper:
+    """JWTHelper provides methods to encode, decode and verify the token.
 
-        encode_header = self.encode_basemodel(header)
-        encode_payload = self.encode_basemodel(payload)
+    Tokens are signed by the active key of the key ring and carry its
+    kid, any key of the ring verifies them. Header segments of the keys
+    are encoded once."""
 
-        combined_str = f"{encode_header.decode(self.encoding)}.{encode_payload.decode("utf-8")}"
+    def __init__(self):
+        self.keyring = KeyRing(get_settings())
+        self.cache = VerifiedTokenCache(get_settings().TOKEN_CACHE_SIZE)
+        self.cache_version = self.keyring.version
 
-        hasher.update(combined_str.encode(self.encoding))
-        digest = hasher.hexdigest()
+    def encode(self, payload: BaseModel) -> str:
+        """Basic encode function.
 
-        return f"{combined_str}.{digest}"
+        Gets the payload pydantic object and returns a JWT token."""
+        key = self.keyring.get_active()
+        signing_input = f"{key.header}.{self.encode_basemodel(payload)}"
+        signature = key.signer.sign(signing_input.encode("ascii"))
+        return f"{signing_input}.{b64url_encode(signature)}"
+
+    def decode(
+        self,
+        token: str,
+        token_schema: type[RefreshTokenPayload] | type[AccessTokenPayload],
+    ) -> RefreshTokenPayload | AccessTokenPayload:
+        """Verifies the token and returns its payload.
+
+        Raises ValueError if the token is malformed or the sign is wrong."""
+        signing_input, header, payload, signature = self.split_token(token)
+        self.verify_sign(signing_input, header, signature)
+        return self.parse_payload(payload, token_schema)
+
+    def check_access_token(self, token: str) -> TokenCheckResponse:
+        """Returns the verified access token claims.
+
+        A token is verified once, its claims are cached until exp or
+        until the key ring is reloaded."""
+        if self.cache_version != self.keyring.version:
+            self.cache.entries.clear()
+            self.cache_version = self.keyring.version
+        key = self.cache.key(token)
+        if claims := self.cache.get(key):
+            return claims
+        payload = self.decode(token, token_schema=AccessTokenPayload)
+        claims = TokenCheckResponse(token=token, **payload.model_dump())
+        self.cache.put(key, exp=float(payload.exp), claims=claims)
+        return claims
 
     def decode_payload(
         self,
         token: str,
         token_schema: type[RefreshTokenPayload] | type[AccessTokenPayload],
     ) -> RefreshTokenPayload | AccessTokenPayload:
-        """Gets a token and return string with it's payload data."""
-        token_parts = token.split(".")
-        decoded_str = base64.b64decode(token_parts[1]).decode(self.encoding)
-        payload = token_schema(**(json.loads(decoded_str.replace("'", '"'))))
-        self.verify_exp_time(payload=payload)
-        return payload
+        """Gets a verified token and returns its payload."""
+        _, _, payload, _ = self.split_token(token)
+        return self.parse_payload(payload, token_schema)
 
     def verify_token(self, token: str) -> None:
         """Gets a token string and verifies it."""
-        hasher = HMAC.new(self.key, digestmod=SHA256)
-
-        token_parts = token.split(".")
-        if len(token_parts) != 3:
-            raise ValueError
-        payload = f"{token_parts[0]}.{token_parts[1]}"
-        hasher.update(payload.encode(self.encoding))
-        hasher.hexverify(token_parts[2])
+        signing_input, header, _, signature = self.split_token(token)
+        self.verify_sign(signing_input, header, signature)
 
     def verify_exp_time(self, payload: BaseModel) -> None:
         """Helper verifies payload exp time."""
-        now = datetime.now(timezone.utc).timestamp()
-        if float(payload.exp) < now:
+        if float(payload.exp) < time.time():
             raise ExpireToken
 
-    def encode_basemodel(self, model: BaseModel) -> str:
+    def verify_sign(
+        self, signing_input: str, header: str, signature: str
+    ) -> None:
+        """Verifies the sign with the key the header refers to."""
+        key = self.keyring.resolve(header)
+        if not key.signer.verify(
+            signing_input.encode("ascii"), b64url_decode(signature)
+        ):
+            raise ValueError("Token sign is incorrect.")
+
+    def get_jwks(self) -> dict:
+        """Returns the public keys to verify the tokens."""
+        return self.keyring.get_jwks()
+
+    def parse_payload(
+        self,
+        payload: str,
+        token_schema: type[RefreshTokenPayload] | type[AccessTokenPayload],
+    ) -> RefreshTokenPayload | AccessTokenPayload:
+        """Helper validates the payload JSON straight into the schema."""
+        token_payload = token_schema.model_validate_json(
+            b64url_decode(payload)
+        )
+        self.verify_exp_time(payload=token_payload)
+        return token_payload
+
+    @staticmethod
+    def split_token(token: str) -> tuple[str, str, str, str]:
+        """Helper returns the signing input and the token segments."""
+        signing_input, _, signature = token.rpartition(".")
+        header, _, payload = signing_input.partition(".")
+        if not payload or "." in payload:
+            raise ValueError("Token must consist of 3 parts.")
+        return signing_input, header, payload, signature
+
+    @staticmethod
+    def encode_basemodel(model: BaseModel) -> str:
         """Helper incapsulates pydantic serialization logic."""
-        serialized_str = str(model.model_dump())
-        return base64.b64encode(serialized_str.encode(self.encoding))
+        return b64url_encode(model.model_dump_json().encode())
 
 
 @lru_cache()
@@ -79,34 +184,31 @@ def get_jwt_helper() -> JWTHelper:
     return JWTHelper()
 
 
-def token_check(
+def get_authenticate_value(security_scopes: SecurityScopes) -> str:
+    """Helper returns the WWW-Authenticate value of the 401 responses."""
+    if security_scopes.scopes:
+        return f'Bearer scope="{security_scopes.scope_str}"'
+    return "Bearer"
+
+
+async def token_check(
     access_token: Annotated[str, Depends(get_settings().oauth2_scheme)],
     jwthelper: Annotated[JWTHelper, Depends(get_jwt_helper)],
     security_scopes: SecurityScopes,
 ) -> TokenCheckResponse:
-    if security_scopes.scopes:
-        authenticate_value = f'Bearer scope="{security_scopes.scope_str}"'
-    else:
-        authenticate_value = "Bearer"
+    """Checks the token sign, exp and scopes, not the revocation."""
+    authenticate_value = get_authenticate_value(security_scopes)
     try:
-        jwthelper.verify_token(access_token)
-    except VerifyMismatchError:
+        token_payload = jwthelper.check_access_token(access_token)
+    except ValueError:
         raise UnAuthorizedException(
             detail="Could not validate credentials",
             authenticate_value=authenticate_value,
         )
-    token_payload = jwthelper.decode_payload(
-        access_token, token_schema=AccessTokenPayload
-    )
-    if not token_payload:
-        raise UnAuthorizedException(
-            detail="No payload in token",
-            authenticate_value=authenticate_value,
-        )
     for scope in security_scopes.scopes:
         if scope not in token_payload.roles:
             raise UnAuthorizedException(
                 detail="Not enough permissions",
                 authenticate_value=authenticate_value,
             )
-    return TokenCheckResponse(token=access_token, **token_payload.model_dump())
+    return token_payload
@@ -0,0 +1,308 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Protocol
+
+from Cryptodome.Hash import SHA256
+from Cryptodome.PublicKey import ECC, RSA
+from Cryptodome.Signature import eddsa, pkcs1_15
+
+from core.config import Settings
+from schemas.token import TokenHeader
+
+logger = logging.getLogger(__name__)
+
+
+def b64url_encode(data: bytes) -> str:
+    """Base64url encoding without padding as RFC 7515 requires."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def int_to_bytes(value: int) -> bytes:
+    return value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+
+def token_digest(token: str) -> bytes:
+    """SHA-256 digest the refresh tokens are stored by."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+class Signer(Protocol):
+    """Signer signs and verifies the token signing input."""
+
+    alg: str
+
+    def sign(self, data: bytes) -> bytes: ...
+
+    def verify(self, data: bytes, signature: bytes) -> bool: ...
+
+    def public_jwk(self) -> dict | None: ...
+
+
+class HMACSigner:
+    """HS256 signer keeps a keyed HMAC state and copies it per call."""
+
+    alg = "HS256"
+
+    def __init__(self, secret: bytes):
+        self.hasher = hmac.new(secret, digestmod=hashlib.sha256)
+
+    def sign(self, data: bytes) -> bytes:
+        hasher = self.hasher.copy()
+        hasher.update(data)
+        return hasher.digest()
+
+    def verify(self, data: bytes, signature: bytes) -> bool:
+        return hmac.compare_digest(self.sign(data), signature)
+
+    def public_jwk(self) -> dict | None:
+        """A shared secret is never published."""
+        return None
+
+
+class EdDSASigner:
+    """Ed25519 signer, the private key is optional for verification."""
+
+    alg = "EdDSA"
+
+    def __init__(self, key: ECC.EccKey):
+        self.public_key = key.public_key()
+        self.signer = eddsa.new(key, "rfc8032") if key.has_private() else None
+        self.verifier = eddsa.new(self.public_key, "rfc8032")
+
+    def sign(self, data: bytes) -> bytes:
+        if not self.signer:
+            raise ValueError("Verification only key can't sign tokens.")
+        return self.signer.sign(data)
+
+    def verify(self, data: bytes, signature: bytes) -> bool:
+        try:
+            self.verifier.verify(data, signature)
+        except ValueError:
+            return False
+        return True
+
+    def public_jwk(self) -> dict | None:
+        return {
+            "kty": "OKP",
+            "crv": "Ed25519",
+            "use": "sig",
+            "alg": self.alg,
+            "x": b64url_encode(self.public_key.export_key(format="raw")),
+        }
+
+
+class RSASigner:
+    """RS256 signer, the private key is optional for verification."""
+
+    alg = "RS256"
+
+    def __init__(self, key: RSA.RsaKey):
+        self.public_key = key.public_key()
+        self.signer = pkcs1_15.new(key) if key.has_private() else None
+        self.verifier = pkcs1_15.new(self.public_key)
+
+    def sign(self, data: bytes) -> bytes:
+        if not self.signer:
+            raise ValueError("Verification only key can't sign tokens.")
+        return self.signer.sign(SHA256.new(data))
+
+    def verify(self, data: bytes, signature: bytes) -> bool:
+        try:
+            self.verifier.verify(SHA256.new(data), signature)
+        except ValueError:
+            return False
+        return True
+
+    def public_jwk(self) -> dict | None:
+        return {
+            "kty": "RSA",
+            "use": "sig",
+            "alg": self.alg,
+            "n": b64url_encode(int_to_bytes(self.public_key.n)),
+            "e": b64url_encode(int_to_bytes(self.public_key.e)),
+        }
+
+
+def build_signer(
+    alg: str, secret: bytes | None = None, pem: str | None = None
+) -> Signer:
+    """Creates a signer from a shared secret or a PEM key."""
+    if alg == HMACSigner.alg:
+        if not secret:
+            raise ValueError("HS256 requires a secret.")
+        return HMACSigner(secret)
+    if not pem:
+        raise ValueError(f"{alg} requires a PEM key.")
+    if alg == EdDSASigner.alg:
+        return EdDSASigner(ECC.import_key(pem))
+    if alg == RSASigner.alg:
+        return RSASigner(RSA.import_key(pem))
+    raise ValueError(f"Unsupported token algorithm {alg}.")
+
+
+def read_pem(path: str | None) -> str | None:
+    if not path:
+        return None
+    with open(path) as key_file:
+        return key_file.read()
+
+
+@dataclass
+class KeyEntry:
+    kid: str
+    signer: Signer
+    # Encoded token header segment of the key
+    header: str
+    # Unix time the key stops verifying tokens
+    retire_at: float | None = None
+
+    def is_retired(self) -> bool:
+        return self.retire_at is not None and self.retire_at < time.time()
+
+
+def build_key_entry(
+    kid: str, signer: Signer, retire_at: float | None = None
+) -> KeyEntry:
+    header = TokenHeader(alg=signer.alg, kid=kid).model_dump_json()
+    return KeyEntry(
+        kid=kid,
+        signer=signer,
+        header=b64url_encode(header.encode()),
+        retire_at=retire_at,
+    )
+
+
+class KeyRing:
+    """KeyRing holds the token sign keys by kid.
+
+    The active key signs new tokens, the others only verify tokens until
+    their retire_at, so a new key can be staged before it is activated
+    and an old one stays valid while its tokens live. The ring file is
+    re-read when it changes:
+
+    {
+        "active": "2024-07",
+        "keys": [
+            {"kid": "2024-07", "alg": "EdDSA", "key_path": "keys/07.pem"},
+            {"kid": "2024-06", "alg": "HS256", "secret": "...",
+             "retire_at": 1720000000}
+        ]
+    }
+
+    Without the ring file the single key from the settings is used."""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.path = settings.JWT_KEYRING_PATH
+        self.reload_interval = settings.JWT_KEYRING_RELOAD_INTERVAL
+        self.mtime = None
+        self.next_check = 0.0
+        # Incremented on every reload
+        self.version = 0
+        self.keys: dict[str, KeyEntry] = {}
+        # Header segment to key, tokens are resolved without JSON parsing
+        self.headers: dict[str, KeyEntry] = {}
+        self.active: KeyEntry | None = None
+        self.load()
+
+    def load(self) -> None:
+        if self.path:
+            self.mtime = os.stat(self.path).st_mtime
+            with open(self.path) as ring_file:
+                ring = json.load(ring_file)
+            entries = [
+                build_key_entry(
+                    kid=key["kid"],
+                    signer=build_signer(
+                        alg=key["alg"],
+                        secret=key.get("secret", "").encode(
+                            self.settings.JWT_CODE
+                        ),
+                        pem=read_pem(key.get("key_path")),
+                    ),
+                    retire_at=key.get("retire_at"),
+                )
+                for key in ring["keys"]
+            ]
+            active_kid = ring["active"]
+        else:
+            entries = [
+                build_key_entry(
+                    kid=self.settings.JWT_KID,
+                    signer=build_signer_from_settings(self.settings),
+                )
+            ]
+            active_kid = self.settings.JWT_KID
+
+        keys = {entry.kid: entry for entry in entries}
+        if active_kid not in keys:
+            raise ValueError(f"Active key {active_kid} isn't in the ring.")
+        self.keys = keys
+        self.headers = {entry.header: entry for entry in entries}
+        self.active = keys[active_kid]
+        self.version += 1
+
+    def maybe_reload(self) -> None:
+        """Re-reads the ring file if it has been changed."""
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.reload_interval
+        try:
+            if os.stat(self.path).st_mtime != self.mtime:
+                self.load()
+        except (OSError, ValueError, KeyError):
+            logger.exception("Failed to reload the key ring, keep the old one")
+
+    def get_active(self) -> KeyEntry:
+        self.maybe_reload()
+        return self.active
+
+    def resolve(self, header: str) -> KeyEntry:
+        """Returns the key to verify a token with the header segment.
+
+        Tokens issued before kid existed are verified by the active key."""
+        self.maybe_reload()
+        if not (entry := self.headers.get(header)):
+            token_header = TokenHeader.model_validate_json(
+                b64url_decode(header)
+            )
+            if token_header.kid is None:
+                entry = self.active
+            else:
+                entry = self.keys.get(token_header.kid)
+            if not entry or entry.signer.alg != token_header.alg:
+                raise ValueError("Token sign key is unknown.")
+        if entry.is_retired():
+            raise ValueError("Token sign key has been retired.")
+        return entry
+
+    def get_jwks(self) -> dict:
+        """Returns the public keys of all verifying keys."""
+        self.maybe_reload()
+        keys = []
+        for entry in self.keys.values():
+            if entry.is_retired() or not (jwk := entry.signer.public_jwk()):
+                continue
+            keys.append({**jwk, "kid": entry.kid})
+        return {"keys": keys}
+
+
+def build_signer_from_settings(settings: Settings) -> Signer:
+    return build_signer(
+        alg=settings.JWT_ALGORITHM,
+        secret=settings.JWT_SECRET.encode(settings.JWT_CODE),
+        pem=read_pem(settings.JWT_PRIVATE_KEY_PATH),
+    )
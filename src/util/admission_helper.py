@@ -0,0 +1,131 @@
+import asyncio
+import contextlib
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+
+from core.config import get_settings
+from core.exceptions import ServiceOverloadedException
+
+
+@dataclass
+class AdmissionMetrics:
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    waited: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+class AdmissionController:
+    """AdmissionController limits the amount of concurrent hashes.
+
+    Requests over the capacity wait in a FIFO queue until a slot is
+    released. A request is rejected with 503 if the queue is full or
+    it hasn't got a slot before the deadline."""
+
+    def __init__(
+        self, capacity: int, max_queue: int, timeout: float, retry_after: int
+    ):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.in_use = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.metrics = AdmissionMetrics()
+
+    @contextlib.asynccontextmanager
+    async def admit(self):
+        """Holds a hashing slot while the context is active."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_metrics(self) -> dict:
+        metrics = asdict(self.metrics)
+        metrics["capacity"] = self.capacity
+        metrics["in_use"] = self.in_use
+        metrics["queue_depth"] = len(self.waiters)
+        return metrics
+
+    async def acquire(self) -> None:
+        if self.in_use < self.capacity and not self.waiters:
+            self.in_use += 1
+            self.metrics.admitted += 1
+            return
+        if len(self.waiters) >= self.max_queue:
+            self.metrics.rejected += 1
+            raise ServiceOverloadedException(
+                detail="Too many concurrent password checks.",
+                retry_after=self.retry_after,
+            )
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self.waiters.append(waiter)
+        timer = loop.call_later(self.timeout, self._expire, waiter)
+        started = time.perf_counter()
+        try:
+            await waiter
+        except TimeoutError:
+            self.metrics.timed_out += 1
+            raise ServiceOverloadedException(
+                detail="Password check hasn't been admitted in time.",
+                retry_after=self.retry_after,
+            )
+        except asyncio.CancelledError:
+            # The slot could have been handed over right before cancellation.
+            if waiter.done() and not waiter.cancelled():
+                if waiter.exception() is None:
+                    self.release()
+            raise
+        finally:
+            timer.cancel()
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            wait = time.perf_counter() - started
+            self.metrics.waited += 1
+            self.metrics.total_wait_seconds += wait
+            self.metrics.max_wait_seconds = max(
+                self.metrics.max_wait_seconds, wait
+            )
+        self.metrics.admitted += 1
+
+    def release(self) -> None:
+        """Hands the slot over to the first waiter or frees it."""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_use -= 1
+
+    @staticmethod
+    def _expire(waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            waiter.set_exception(TimeoutError())
+
+
+@lru_cache
+def get_admission_controller(
+    memory_cost: int, parallelism: int
+) -> AdmissionController:
+    """Sizes the controller for the hasher parameters.
+
+    Argon2 memory_cost is in KiB and every lane takes a CPU core."""
+    settings = get_settings()
+    cpu_budget = settings.HASHER_CPU_BUDGET or os.cpu_count() or 1
+    memory_slots = settings.HASHER_MEMORY_BUDGET * 1024 // memory_cost
+    cpu_slots = cpu_budget // parallelism
+    return AdmissionController(
+        capacity=max(min(memory_slots, cpu_slots), 1),
+        max_queue=settings.HASHER_ADMISSION_QUEUE,
+        timeout=settings.HASHER_ADMISSION_TIMEOUT,
+        retry_after=settings.HASHER_RETRY_AFTER,
+    )
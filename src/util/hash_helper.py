@@ -1,8 +1,166 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from dataclasses import asdict, dataclass
 from functools import lru_cache
 
 from argon2 import PasswordHasher
 
+from core.config import get_settings
+from core.exceptions import ServiceOverloadedException
+from util.admission_helper import AdmissionController, get_admission_controller
+
 
 @lru_cache
 def get_hasher():
-    return PasswordHasher()
+    settings = get_settings()
+    return PasswordHasher(
+        time_cost=settings.ARGON2_TIME_COST,
+        memory_cost=settings.ARGON2_MEMORY_COST,
+        parallelism=settings.ARGON2_PARALLELISM,
+    )
+
+
+def _hash(password: str) -> str:
+    return get_hasher().hash(password)
+
+
+def _verify(hashed_password: str, password: str) -> bool:
+    return get_hasher().verify(hashed_password, password)
+
+
+@dataclass
+class HashExecutorMetrics:
+    submitted: int = 0
+    finished: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    in_flight: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class HashExecutor:
+    """HashExecutor runs Argon2 hashing outside of the event loop.
+
+    Jobs over the queue limit are rejected at once, jobs that miss
+    the deadline are cancelled if they haven't been started yet. A job
+    keeps its admission slot and counts as in flight until it's done,
+    even if the request has given up on it."""
+
+    def __init__(
+        self,
+        executor: Executor,
+        admission: AdmissionController,
+        max_workers: int,
+        max_queue: int,
+        timeout: float,
+        retry_after: int,
+    ):
+        self.executor = executor
+        self.admission = admission
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.metrics = HashExecutorMetrics()
+
+    async def hash(self, password: str) -> str:
+        """Returns the Argon2 hash of the password."""
+        return await self._run(_hash, password)
+
+    async def verify(self, hashed_password: str, password: str) -> bool:
+        """Verifies the password. Raises VerifyMismatchError on mismatch."""
+        return await self._run(_verify, hashed_password, password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Checks the hash was made with outdated Argon2 parameters."""
+        return get_hasher().check_needs_rehash(hashed_password)
+
+    def get_metrics(self) -> dict:
+        metrics = asdict(self.metrics)
+        metrics["queued"] = max(self.metrics.in_flight - self.max_workers, 0)
+        return metrics
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func, *args):
+        """Runs the job holding an admission slot until it has finished.
+
+        A job that missed the deadline can't be stopped once started, so
+        its slot is released by the job itself, not by the caller."""
+        await self.admission.acquire()
+        if self.metrics.in_flight >= self.max_workers + self.max_queue:
+            self.admission.release()
+            self.metrics.rejected += 1
+            raise ServiceOverloadedException(
+                detail="Hashing queue is full.", retry_after=self.retry_after
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.executor.submit(func, *args)
+        except RuntimeError:
+            self.admission.release()
+            raise
+        self.metrics.submitted += 1
+        self.metrics.in_flight += 1
+        started = time.perf_counter()
+        future.add_done_callback(
+            lambda _: self._call_soon(loop, self._finish, started)
+        )
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=self.timeout
+            )
+        except TimeoutError:
+            self.metrics.timed_out += 1
+            raise ServiceOverloadedException(
+                detail="Hashing deadline exceeded.",
+                retry_after=self.retry_after,
+            )
+
+    def _finish(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        self.metrics.in_flight -= 1
+        self.metrics.finished += 1
+        self.metrics.total_seconds += elapsed
+        self.metrics.max_seconds = max(self.metrics.max_seconds, elapsed)
+        self.admission.release()
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback, *args) -> None:
+        """Done callbacks run in the executor threads."""
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # The loop is closed on shutdown, nothing to account for.
+            pass
+
+
+@lru_cache
+def get_hash_executor() -> HashExecutor:
+    settings = get_settings()
+    hasher = get_hasher()
+    if settings.HASHER_EXECUTOR == "process":
+        executor = ProcessPoolExecutor(
+            max_workers=settings.HASHER_MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    else:
+        executor = ThreadPoolExecutor(
+            max_workers=settings.HASHER_MAX_WORKERS,
+            thread_name_prefix="argon2",
+        )
+    return HashExecutor(
+        executor=executor,
+        admission=get_admission_controller(
+            memory_cost=hasher.memory_cost, parallelism=hasher.parallelism
+        ),
+        max_workers=settings.HASHER_MAX_WORKERS,
+        max_queue=settings.HASHER_MAX_QUEUE,
+        timeout=settings.HASHER_TIMEOUT,
+        retry_after=settings.HASHER_RETRY_AFTER,
+    )
@@ -1,23 +1,43 @@
 import pytest
-from Cryptodome.Hash import HMAC, SHA256
 
-from settings import get_settings
+from testdata.auth import (SUPERUSER_ACCESS_TOKEN_PAYLOAD,
+                           SUPERUSER_REFRESH_TOKEN_PAYLOAD,
+                           TOKEN_GENERATION_PREFIX)
 from testdata.common import HEADERS
+from util.token_helpers import encode_token_helper, generate_jti_helper
 
 
 @pytest.fixture(scope="function")
-async def get_acess_token():
+async def get_superuser_generation(get_redis_session):
+    """Returns the current superuser token generation."""
+    generation = await get_redis_session.get(
+        f"{TOKEN_GENERATION_PREFIX}{SUPERUSER_ACCESS_TOKEN_PAYLOAD["sub"]}"
+    )
+    return int(generation or 0)
+
+
+@pytest.fixture(scope="function")
+async def get_acess_token(get_superuser_generation):
     """Creates an acess token for the superuser. This acess token expires in 2027."""
-    hasher = HMAC.new(
-        get_settings().JWT_SECRET.encode(get_settings().JWT_CODE),
-        digestmod=SHA256,
+    return await encode_token_helper(
+        {
+            **SUPERUSER_ACCESS_TOKEN_PAYLOAD,
+            "gen": get_superuser_generation,
+            "jti": generate_jti_helper(),
+        }
     )
 
-    token_without_sign = "eyd0eXAnOiAnSldUJywgJ2FsZyc6ICdIUzI1Nid9.eydzdWInOiAnc3VwZXJ1c2VyJywgJ2ZpbmdlcnByaW50JzogJzE5Njk1OTIyMTY0ODg4MzI1MjAnLCAncm9sZXMnOiBbJ2F1dGhfYWRtaW4nXSwgJ2V4cCc6ICcxODE0MjIxODQxLjk1NTIzJ30="
-    hasher.update(token_without_sign.encode(get_settings().JWT_CODE))
-    digest = hasher.hexdigest()
 
-    return f"{token_without_sign}.{digest}"
+@pytest.fixture(scope="function")
+async def get_refresh_token(get_superuser_generation):
+    """Creates a refresh token for the superuser. This refresh token expires in 2027."""
+    return await encode_token_helper(
+        {
+            **SUPERUSER_REFRESH_TOKEN_PAYLOAD,
+            "gen": get_superuser_generation,
+            "jti": generate_jti_helper(),
+        }
+    )
 
 
 @pytest.fixture(scope="function")
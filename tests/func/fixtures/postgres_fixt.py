@@ -1,9 +1,10 @@
 import pytest
 
-from testdata.auth import (GET_REFRESH_TOKEN_REQUEST,
-                           INSERT_SUPERUSER_FINGERPRINT_REQUEST,
+from settings import get_settings
+from testdata.auth import (INSERT_SUPERUSER_FINGERPRINT_REQUEST,
                            INSERT_SUPERUSER_REFRESH_TOKEN_REQUEST)
-from testdata.db_schema import TABLES_SCHEMA, USER_CREATION
+from testdata.db_schema import INDEXES_SCHEMA, TABLES_SCHEMA, USER_CREATION
+from testdata.query_plans import SEED_QUERY_PLAN_DATA
 from testdata.roles import INSERT_ROLE_DB
 
 
@@ -12,6 +13,8 @@ async def prepare_db_tables(get_postgres_session):
     """Creates the tables in the database."""
     for table_data in TABLES_SCHEMA:
         await get_postgres_session.execute(table_data["data"])
+    for index in INDEXES_SCHEMA:
+        await get_postgres_session.execute(index)
 
 
 @pytest.fixture(scope="function")
@@ -31,19 +34,22 @@ async def empty_db_tables(prepare_db_tables, get_postgres_session):
 
 
 @pytest.fixture(scope="function")
-async def insert_superuser_refresh_token(prepare_users, get_postgres_session):
+async def insert_superuser_refresh_token(
+    prepare_users, get_refresh_token, get_postgres_session
+):
     """Inserts a superuser refresh token in the database."""
     await get_postgres_session.execute(INSERT_SUPERUSER_FINGERPRINT_REQUEST)
-    await get_postgres_session.execute(INSERT_SUPERUSER_REFRESH_TOKEN_REQUEST)
+    await get_postgres_session.execute(
+        INSERT_SUPERUSER_REFRESH_TOKEN_REQUEST, get_refresh_token
+    )
 
 
 @pytest.fixture(scope="function")
 async def get_superuser_refresh_token(
-    insert_superuser_refresh_token, get_postgres_session
+    insert_superuser_refresh_token, get_refresh_token
 ):
-    """Returns a superuser refresh token."""
-    row = await get_postgres_session.fetchrow(GET_REFRESH_TOKEN_REQUEST)
-    return row["refresh_token"]
+    """Returns the superuser refresh token stored in the database."""
+    return get_refresh_token
 
 
 @pytest.fixture(scope="function")
@@ -51,3 +57,24 @@ async def prepare_roles(empty_db_tables, get_postgres_session):
     """Inserts roles in the roles table."""
     for role in INSERT_ROLE_DB:
         await get_postgres_session.execute(role)
+
+
+@pytest.fixture(scope="module")
+async def seed_query_plan_data(prepare_db_tables, get_postgres_session):
+    """Fills the tables with the synthetic dataset and cleans them after."""
+    for table_data in TABLES_SCHEMA:
+        await get_postgres_session.execute(
+            f"TRUNCATE {table_data["table"]} CASCADE"
+        )
+    for request in SEED_QUERY_PLAN_DATA:
+        await get_postgres_session.execute(
+            request.format(
+                users=get_settings().QUERY_PLAN_USERS,
+                roles=get_settings().QUERY_PLAN_ROLES,
+            )
+        )
+    yield
+    for table_data in TABLES_SCHEMA:
+        await get_postgres_session.execute(
+            f"TRUNCATE {table_data["table"]} CASCADE"
+        )
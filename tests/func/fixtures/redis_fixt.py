@@ -1,19 +1,51 @@
 import pytest
 from redis import Redis
 
+from testdata.auth import (REVOCATION_CHANNEL, REVOKED_TOKEN_PREFIX,
+                           TOKEN_GENERATION_PREFIX)
+from util.token_helpers import revoked_token_key_helper
+
+
+# Runs in Redis, the binary deny list keys can't be decoded by the client
+FLUSH_SCRIPT = """
+for _, key in ipairs(redis.call("KEYS", "*")) do
+    if string.sub(key, 1, #ARGV[1]) ~= ARGV[1] then
+        redis.call("DEL", key)
+    end
+end
+"""
+
+
+async def flush_redis(redis: Redis) -> None:
+    """Deletes all keys but the token generations.
+
+    The service workers keep the generations in memory, a counter reset
+    would make the new superuser tokens stale."""
+    await redis.eval(FLUSH_SCRIPT, 0, TOKEN_GENERATION_PREFIX)
+
 
 @pytest.fixture(scope="function")
 async def redis_flush(get_redis_session: Redis):
-    """Flushes the redis db."""
-    await get_redis_session.flushall()
+    """Flushes the redis db before and after the test.
+
+    The superuser token revoked by a logout is shared by the other tests."""
+    await flush_redis(get_redis_session)
+    yield
+    await flush_redis(get_redis_session)
 
 
 @pytest.fixture(scope="function")
 async def redis_save_superuser_access_token(
     get_redis_session: Redis, prepare_headers_with_superuser_token: dict
 ):
-    """Saves superuser access token to the redis db."""
+    """Revokes the superuser access token like a logout does."""
     token = prepare_headers_with_superuser_token["Authorization"].replace(
         "Bearer ", ""
     )
-    await get_redis_session.set(name=str(token), value="deleted")
+    key = revoked_token_key_helper(token)
+    await get_redis_session.set(name=key, value=b"")
+    await get_redis_session.publish(
+        REVOCATION_CHANNEL, key.removeprefix(REVOKED_TOKEN_PREFIX.encode())
+    )
+    yield
+    await get_redis_session.delete(key)
@@ -4,6 +4,7 @@ import asyncpg
 import pytest
 from aiohttp import ClientSession
 from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
 from settings import get_settings
 
@@ -38,6 +39,18 @@ async def get_redis_session():
     await redis.aclose()
 
 
+@pytest.fixture(scope="session")
+async def get_binary_redis_session():
+    """Creates and closes the redis client for the binary token ids."""
+    redis = Redis(
+        host="localhost",
+        port=get_settings().AUTH_REDIS_PORT,
+        db=0,
+    )
+    yield redis
+    await redis.aclose()
+
+
 @pytest.fixture(scope="session")
 async def get_postgres_session():
     """Creates and closes the postgres client."""
@@ -50,3 +63,16 @@ async def get_postgres_session():
     )
     yield conn
     await conn.close()
+
+
+@pytest.fixture(scope="function")
+async def get_sqlalchemy_session():
+    """Creates and closes the session the service storage runs in."""
+    settings = get_settings()
+    engine = create_async_engine(
+        f"postgresql+asyncpg://{settings.PG_USER}:{settings.PG_PASSWORD}"
+        f"@localhost:{settings.PG_PORT}/{settings.PG_DB}"
+    )
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+    await engine.dispose()
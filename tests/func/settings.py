@@ -32,8 +32,14 @@ class Settings(BaseSettings):
     ADMIN_LOGIN: str = Field(default="")
     ADMIN_PASSWORD: str = Field(default="")
 
+    # Size of the synthetic dataset the query plans are checked on
+    QUERY_PLAN_USERS: int = Field(default=100_000)
+    QUERY_PLAN_ROLES: int = Field(default=1000)
+
     # Routes
     API_URL: str = "http://localhost:8000/api/v1"
+    # The service keeping the refresh sessions in Redis
+    SESSION_STORE_API_URL: str = "http://localhost:8001/api/v1"
 
     # JWT key
     JWT_SECRET: str = "Secret encode token"
@@ -1,12 +1,25 @@
+import asyncio
+import time
 from http import HTTPStatus
 
 import pytest
-
 from settings import get_settings
-from testdata.auth import GET_REFRESH_TOKEN_REQUEST, TOKENS
+from testdata.auth import (CURRENT_HASH_PREFIX, DEACTIVATE_SUPERUSER_REQUEST,
+                           GET_REFRESH_TOKEN_REQUEST,
+                           GET_SUPERUSER_FINGERPRINTS_REQUEST,
+                           GET_SUPERUSER_HASH_REQUEST, OUTDATED_SUPERUSER_HASH,
+                           REFRESH_TOKEN_LIFETIME, SET_SUPERUSER_HASH_REQUEST,
+                           SUPERUSER_ACCESS_TOKEN_PAYLOAD,
+                           SUPERUSER_REFRESH_TOKEN_PAYLOAD,
+                           TOKEN_GENERATION_PREFIX, TOKEN_HEADER, TOKENS)
 from testdata.common import AUTH_HEADERS
 from testdata.personal import SUPERUSER_DATA
-from util.token_helpers import decode_payload_helper, generate_sign_helper
+
+from util.token_helpers import (decode_payload_helper,
+                                encode_legacy_token_helper,
+                                generate_sign_helper,
+                                refresh_token_digest_helper,
+                                revoked_token_key_helper)
 
 pytestmark = pytest.mark.authorization
 
@@ -54,7 +67,7 @@ async def test_login_returns_correct_token_data(
     assert len(token_parts) == 3
 
     # Checks that token headers are valid
-    assert token_parts[0] == "eyd0eXAnOiAnSldUJywgJ2FsZyc6ICdIUzI1Nid9"
+    assert token_parts[0] == TOKEN_HEADER
 
     # Checks that token payloads are valid
     token_payload = await decode_payload_helper(token_parts[1])
@@ -106,7 +119,78 @@ async def test_login_saves_refresh_token(
     row = await get_postgres_session.fetchrow(GET_REFRESH_TOKEN_REQUEST)
 
     # Checks does a token exist in the database
-    assert body["refresh_token"] == row["refresh_token"]
+    token_hash = refresh_token_digest_helper(body["refresh_token"])
+    assert token_hash == row["token_hash"]
+
+
+@pytest.mark.asyncio
+async def test_login_reuses_device_fingerprint(
+    prepare_users, get_http_session, get_postgres_session
+):
+    """Checks that logins from the same device share the fingerprint."""
+    url = f"{ENDPOINT}/login"
+    data = f"grant_type=&username={SUPERUSER_DATA["login"]}&password={SUPERUSER_DATA["password"]}&scope=&client_id=&client_secret="
+    headers = {**AUTH_HEADERS, "User-Agent": "test-device"}
+
+    for _ in range(2):
+        response = await get_http_session.post(
+            url=url, headers=headers, data=data
+        )
+        assert response.status == HTTPStatus.OK
+
+    rows = await get_postgres_session.fetch(
+        GET_SUPERUSER_FINGERPRINTS_REQUEST
+    )
+
+    assert len(rows) == 1
+
+
+@pytest.mark.asyncio
+async def test_login_upgrades_outdated_hash(
+    prepare_users, get_http_session, get_postgres_session
+):
+    """Checks that a login rehashes the password with the current params."""
+    await get_postgres_session.execute(
+        SET_SUPERUSER_HASH_REQUEST, OUTDATED_SUPERUSER_HASH
+    )
+    url = f"{ENDPOINT}/login"
+    data = f"grant_type=&username={SUPERUSER_DATA["login"]}&password={SUPERUSER_DATA["password"]}&scope=&client_id=&client_secret="
+
+    response = await get_http_session.post(
+        url=url, headers=AUTH_HEADERS, data=data
+    )
+    assert response.status == HTTPStatus.OK
+
+    # The hash is upgraded in the background after the response.
+    for _ in range(50):
+        hashed_password = await get_postgres_session.fetchval(
+            GET_SUPERUSER_HASH_REQUEST
+        )
+        if hashed_password != OUTDATED_SUPERUSER_HASH:
+            break
+        await asyncio.sleep(0.1)
+    assert hashed_password.startswith(CURRENT_HASH_PREFIX)
+
+    # The upgraded hash still matches the password.
+    response = await get_http_session.post(
+        url=url, headers=AUTH_HEADERS, data=data
+    )
+    assert response.status == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_login_rejects_inactive_user(
+    prepare_users, get_postgres_session, get_http_session
+):
+    """Checks that a login API forbids a deactivated user to log in."""
+    await get_postgres_session.execute(DEACTIVATE_SUPERUSER_REQUEST)
+    data = f"grant_type=&username={SUPERUSER_DATA["login"]}&password={SUPERUSER_DATA["password"]}&scope=&client_id=&client_secret="
+
+    response = await get_http_session.post(
+        url=f"{ENDPOINT}/login", headers=AUTH_HEADERS, data=data
+    )
+
+    assert response.status == HTTPStatus.FORBIDDEN
 
 
 @pytest.mark.asyncio
@@ -130,6 +214,22 @@ async def test_refresh_returns_correct_json(
     assert "token_type" in body
 
 
+@pytest.mark.asyncio
+async def test_refresh_rejects_inactive_user(
+    get_superuser_refresh_token, get_postgres_session, get_http_session
+):
+    """Checks that a refresh API forbids a user deactivated after login."""
+    await get_postgres_session.execute(DEACTIVATE_SUPERUSER_REQUEST)
+
+    response = await get_http_session.post(
+        url=f"{ENDPOINT}/refresh",
+        headers=AUTH_HEADERS,
+        data=get_superuser_refresh_token,
+    )
+
+    assert response.status == HTTPStatus.FORBIDDEN
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize("token", TOKENS)
 async def test_refresh_returns_correct_token_data(
@@ -152,7 +252,7 @@ async def test_refresh_returns_correct_token_data(
     assert len(token_parts) == 3
 
     # Checks that token headers are valid
-    assert token_parts[0] == "eyd0eXAnOiAnSldUJywgJ2FsZyc6ICdIUzI1Nid9"
+    assert token_parts[0] == TOKEN_HEADER
 
     # Checks that token payloads are valid
     token_payload = await decode_payload_helper(token_parts[1])
@@ -203,7 +303,7 @@ async def test_refresh_deletes_token(
     row = await get_postgres_session.fetchrow(GET_REFRESH_TOKEN_REQUEST)
 
     # Checks does a token exist in the database
-    assert data != row["refresh_token"]
+    assert refresh_token_digest_helper(data) != row["token_hash"]
 
 
 @pytest.mark.asyncio
@@ -225,13 +325,15 @@ async def test_refresh_saves_token(
     row = await get_postgres_session.fetchrow(GET_REFRESH_TOKEN_REQUEST)
 
     # Checks does a token exist in the database
-    assert body["refresh_token"] == row["refresh_token"]
+    token_hash = refresh_token_digest_helper(body["refresh_token"])
+    assert token_hash == row["token_hash"]
 
 
 @pytest.mark.asyncio
 async def test_logout_deletes_token(
     prepare_headers_with_superuser_token,
     insert_superuser_refresh_token,
+    redis_flush,
     get_http_session,
     get_postgres_session,
 ):
@@ -256,7 +358,6 @@ async def test_logout_emplaces_invalid_token_in_redis(
     prepare_headers_with_superuser_token,
     insert_superuser_refresh_token,
     redis_flush,
-    redis_save_superuser_access_token,
     get_http_session,
     get_redis_session,
 ):
@@ -271,9 +372,196 @@ async def test_logout_emplaces_invalid_token_in_redis(
 
     assert status == HTTPStatus.OK
 
-    # Checks that an access token exists in the cache
-    assert "deleted" == await get_redis_session.get(
+    # Checks that an access token exists in the deny list until its exp
+    key = revoked_token_key_helper(
         prepare_headers_with_superuser_token["Authorization"].replace(
             "Bearer ", ""
         )
     )
+    expected_ttl = float(SUPERUSER_ACCESS_TOKEN_PAYLOAD["exp"]) - time.time()
+    assert abs(await get_redis_session.ttl(key) - expected_ttl) < 60
+
+
+@pytest.mark.asyncio
+async def test_logouted_token_is_rejected(
+    prepare_headers_with_superuser_token,
+    insert_superuser_refresh_token,
+    redis_flush,
+    get_http_session,
+):
+    """Checks that an access token doesn't work after logout."""
+    response = await get_http_session.post(
+        url=f"{ENDPOINT}/logout", headers=prepare_headers_with_superuser_token
+    )
+    assert response.status == HTTPStatus.OK
+
+    response = await get_http_session.get(
+        url=f"{ENDPOINT}/introspect",
+        headers=prepare_headers_with_superuser_token,
+    )
+
+    assert response.status == HTTPStatus.UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_logout_everywhere_rejects_all_tokens(
+    prepare_headers_with_superuser_token,
+    insert_superuser_refresh_token,
+    get_refresh_token,
+    get_http_session,
+):
+    """Checks that logout everywhere revokes the other tokens of the user."""
+    response = await get_http_session.post(
+        url=f"{ENDPOINT}/logout?logout_everywhere=true",
+        headers=prepare_headers_with_superuser_token,
+    )
+    assert response.status == HTTPStatus.OK
+
+    response = await get_http_session.get(
+        url=f"{ENDPOINT}/introspect",
+        headers=prepare_headers_with_superuser_token,
+    )
+    assert response.status == HTTPStatus.UNAUTHORIZED
+
+    response = await get_http_session.post(
+        url=f"{ENDPOINT}/refresh", headers=AUTH_HEADERS, data=get_refresh_token
+    )
+    assert response.status == HTTPStatus.UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_logout_everywhere_keeps_generation(
+    prepare_headers_with_superuser_token,
+    insert_superuser_refresh_token,
+    get_http_session,
+    get_redis_session,
+):
+    """Checks that the bumped generation expires after the refresh token
+    lifetime and new tokens work."""
+    response = await get_http_session.post(
+        url=f"{ENDPOINT}/logout?logout_everywhere=true",
+        headers=prepare_headers_with_superuser_token,
+    )
+    assert response.status == HTTPStatus.OK
+
+    key = f"{TOKEN_GENERATION_PREFIX}{SUPERUSER_DATA["login"]}"
+    assert 0 < await get_redis_session.ttl(key) <= REFRESH_TOKEN_LIFETIME
+
+    data = f"grant_type=&username={SUPERUSER_DATA["login"]}&password={SUPERUSER_DATA["password"]}&scope=&client_id=&client_secret="
+    response = await get_http_session.post(
+        url=f"{ENDPOINT}/login", headers=AUTH_HEADERS, data=data
+    )
+    body = await response.json()
+    response = await get_http_session.get(
+        url=f"{ENDPOINT}/introspect",
+        headers={"Authorization": f"Bearer {body["access_token"]}"},
+    )
+    assert response.status == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_verify_batch_returns_result_per_token(
+    prepare_headers_with_superuser_token, redis_flush, get_http_session
+):
+    """Checks that a verify_batch API verifies every token of the batch."""
+    url = f"{ENDPOINT}/verify_batch"
+    token = prepare_headers_with_superuser_token["Authorization"].replace(
+        "Bearer ", ""
+    )
+
+    response = await get_http_session.post(
+        url=url, json={"tokens": [token, "invalid.token.sign"]}
+    )
+    body = await response.json()
+
+    assert response.status == HTTPStatus.OK
+    valid, invalid = body["results"]
+    assert valid["valid"]
+    assert valid["claims"]["sub"] == "superuser"
+    assert valid["ttl"] > 0
+    assert not invalid["valid"]
+    assert invalid["error"]
+
+
+@pytest.mark.asyncio
+async def test_verify_batch_rejects_revoked_token(
+    prepare_headers_with_superuser_token,
+    redis_flush,
+    redis_save_superuser_access_token,
+    get_http_session,
+):
+    """Checks that a verify_batch API marks logouted tokens as invalid."""
+    url = f"{ENDPOINT}/verify_batch"
+    token = prepare_headers_with_superuser_token["Authorization"].replace(
+        "Bearer ", ""
+    )
+
+    response = await get_http_session.post(url=url, json={"tokens": [token]})
+    body = await response.json()
+
+    assert response.status == HTTPStatus.OK
+    assert not body["results"][0]["valid"]
+
+
+@pytest.mark.asyncio
+async def test_introspect_returns_user_headers(
+    prepare_headers_with_superuser_token, redis_flush, get_http_session
+):
+    """Checks that an introspect API returns the user in the headers."""
+    url = f"{ENDPOINT}/introspect"
+
+    response = await get_http_session.get(
+        url=url, headers=prepare_headers_with_superuser_token
+    )
+
+    assert response.status == HTTPStatus.NO_CONTENT
+    assert response.headers["X-User-Sub"] == "superuser"
+    assert "auth_admin" in response.headers["X-User-Roles"].split(",")
+    assert 0 < int(response.headers["X-Accel-Expires"]) <= 5
+
+
+@pytest.mark.asyncio
+async def test_introspect_rejects_invalid_token(get_http_session):
+    """Checks that an introspect API returns 401 for an invalid token."""
+    url = f"{ENDPOINT}/introspect"
+
+    response = await get_http_session.get(
+        url=url, headers={"Authorization": "Bearer invalid.token.sign"}
+    )
+
+    assert response.status == HTTPStatus.UNAUTHORIZED
+    assert "X-User-Sub" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_legacy_tokens_are_rejected(get_http_session):
+    """Checks that the tokens of the former codec need a new login."""
+    access_token = await encode_legacy_token_helper(
+        SUPERUSER_ACCESS_TOKEN_PAYLOAD
+    )
+    refresh_token = await encode_legacy_token_helper(
+        SUPERUSER_REFRESH_TOKEN_PAYLOAD
+    )
+
+    response = await get_http_session.get(
+        url=f"{ENDPOINT}/introspect",
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    assert response.status == HTTPStatus.UNAUTHORIZED
+
+    response = await get_http_session.post(
+        url=f"{ENDPOINT}/refresh", headers=AUTH_HEADERS, data=refresh_token
+    )
+    assert response.status == HTTPStatus.UNAUTHORIZED
+
+
+@pytest.mark.asyncio
+async def test_jwks_returns_key_set(get_http_session):
+    """Checks that a JWKS API returns the public key set."""
+    url = f"{ENDPOINT}/.well-known/jwks.json"
+
+    response = await get_http_session.get(url=url)
+    body = await response.json()
+
+    assert response.status == HTTPStatus.OK
+    assert isinstance(body["keys"], list)
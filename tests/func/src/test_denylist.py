@@ -0,0 +1,108 @@
+import math
+import time
+
+import pytest
+
+from db.redis.denylist import (
+    BucketedRedisDenyList,
+    MigratingDenyList,
+    RedisDenyList,
+)
+from testdata.auth import DENYLIST_BUCKET_PREFIX, REVOKED_TOKEN_PREFIX
+
+pytestmark = pytest.mark.denylist
+
+BUCKET_SECONDS = 60
+
+
+@pytest.fixture
+def bucket_end() -> int:
+    """Returns the end of a bucket window a minute or two ahead."""
+    return (math.ceil(time.time() / BUCKET_SECONDS) + 1) * BUCKET_SECONDS
+
+
+@pytest.fixture
+def bucketed_denylist(get_binary_redis_session) -> BucketedRedisDenyList:
+    return BucketedRedisDenyList(
+        get_binary_redis_session,
+        DENYLIST_BUCKET_PREFIX.encode(),
+        BUCKET_SECONDS,
+    )
+
+
+@pytest.mark.asyncio
+async def test_bucketed_denylist_bucket_edges(
+    redis_flush, get_binary_redis_session, bucketed_denylist, bucket_end
+):
+    """Checks that the window end belongs to the bucket it closes."""
+    await bucketed_denylist.add(b"last_in_window", bucket_end)
+    await bucketed_denylist.add(b"first_in_next", bucket_end + 0.001)
+
+    key = DENYLIST_BUCKET_PREFIX.encode() + str(bucket_end).encode()
+    next_key = (
+        DENYLIST_BUCKET_PREFIX.encode()
+        + str(bucket_end + BUCKET_SECONDS).encode()
+    )
+    assert await get_binary_redis_session.smembers(key) == {b"last_in_window"}
+    assert await get_binary_redis_session.smembers(next_key) == {
+        b"first_in_next"
+    }
+    assert 0 < await get_binary_redis_session.ttl(key) <= 2 * BUCKET_SECONDS
+
+    assert await bucketed_denylist.contains(b"last_in_window", bucket_end)
+    assert await bucketed_denylist.contains(
+        b"first_in_next", bucket_end + 0.001
+    )
+    # A token is looked up in the bucket of its own exp only
+    assert not await bucketed_denylist.contains(
+        b"last_in_window", bucket_end + 0.001
+    )
+
+
+@pytest.mark.asyncio
+async def test_bucketed_denylist_contains_many_and_scan(
+    redis_flush, bucketed_denylist, bucket_end
+):
+    """Checks the batch lookup and the snapshot across the buckets."""
+    revoked = {
+        b"first_bucket": bucket_end - BUCKET_SECONDS + 0.001,
+        b"first_bucket_end": bucket_end,
+        b"second_bucket": bucket_end + 1,
+    }
+    for token_id, exp in revoked.items():
+        await bucketed_denylist.add(token_id, exp)
+
+    tokens = revoked | {b"not_revoked": bucket_end}
+    assert await bucketed_denylist.contains_many(tokens) == set(revoked)
+    assert await bucketed_denylist.contains_many({}) == set()
+    assert {token_id async for token_id in bucketed_denylist.scan()} == set(
+        revoked
+    )
+
+
+@pytest.mark.asyncio
+async def test_migrating_denylist_reads_previous_layout(
+    redis_flush, get_binary_redis_session, bucketed_denylist, bucket_end
+):
+    """Checks that the revocations of the previous layout are still seen."""
+    previous = RedisDenyList(
+        get_binary_redis_session, REVOKED_TOKEN_PREFIX.encode()
+    )
+    denylist = MigratingDenyList(current=bucketed_denylist, previous=previous)
+    await previous.add(b"revoked_before", bucket_end)
+    await denylist.add(b"revoked_after", bucket_end)
+
+    assert await denylist.contains(b"revoked_before", bucket_end)
+    assert await denylist.contains(b"revoked_after", bucket_end)
+    assert not await previous.contains(b"revoked_after", bucket_end)
+    assert await denylist.contains_many(
+        {
+            b"revoked_before": bucket_end,
+            b"revoked_after": bucket_end,
+            b"not_revoked": bucket_end,
+        }
+    ) == {b"revoked_before", b"revoked_after"}
+    assert {token_id async for token_id in denylist.scan()} == {
+        b"revoked_before",
+        b"revoked_after",
+    }
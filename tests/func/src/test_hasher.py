@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import pytest
+
+from core.exceptions import ServiceOverloadedException
+from util.admission_helper import AdmissionController
+from util.hash_helper import HashExecutor
+
+pytestmark = pytest.mark.hasher
+
+
+@pytest.fixture
+def blocked_hash_executor():
+    """Makes an executor of a single slot and a blocking job to run."""
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    hash_executor = HashExecutor(
+        executor=executor,
+        admission=AdmissionController(
+            capacity=1, max_queue=0, timeout=0.1, retry_after=3
+        ),
+        max_workers=1,
+        max_queue=0,
+        timeout=0.1,
+        retry_after=3,
+    )
+    yield hash_executor, release
+    release.set()
+    executor.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+async def test_hasher_rejects_with_retry_after(blocked_hash_executor):
+    """Checks that a job over the capacity gets 503 with Retry-After."""
+    hash_executor, release = blocked_hash_executor
+    job = asyncio.create_task(hash_executor._run(release.wait))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(ServiceOverloadedException) as error:
+        await hash_executor._run(release.wait)
+
+    assert error.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert error.value.headers["Retry-After"] == "3"
+    assert hash_executor.admission.metrics.rejected == 1
+    release.set()
+    assert await job is True
+
+
+@pytest.mark.asyncio
+async def test_hasher_keeps_slot_of_timed_out_job(blocked_hash_executor):
+    """Checks that a timed out job holds its slot until it has finished."""
+    hash_executor, release = blocked_hash_executor
+
+    with pytest.raises(ServiceOverloadedException) as error:
+        await hash_executor._run(release.wait)
+
+    assert error.value.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert hash_executor.get_metrics()["timed_out"] == 1
+    assert hash_executor.get_metrics()["in_flight"] == 1
+    assert hash_executor.admission.in_use == 1
+    # The job is still running, so there is no room for another one.
+    with pytest.raises(ServiceOverloadedException):
+        await hash_executor._run(release.wait)
+
+    release.set()
+    for _ in range(100):
+        if hash_executor.admission.in_use == 0:
+            break
+        await asyncio.sleep(0.01)
+    assert hash_executor.get_metrics()["in_flight"] == 0
+    assert hash_executor.get_metrics()["finished"] == 1
+    assert hash_executor.admission.in_use == 0
@@ -0,0 +1,135 @@
+import json
+import os
+import time
+
+import pytest
+
+from core.config import Settings
+from util.JWT_keys import KeyRing, b64url_encode
+
+pytestmark = pytest.mark.keyring
+
+PAYLOAD = b64url_encode(b'{"sub":"superuser"}')
+
+
+def write_ring(path, active: str, keys: list[dict]) -> None:
+    """Writes the ring file and moves its mtime, so it's re-read."""
+    with open(path, "w") as ring_file:
+        json.dump({"active": active, "keys": keys}, ring_file)
+    mtime = os.stat(path).st_mtime + 1
+    os.utime(path, (mtime, mtime))
+
+
+def sign(ring: KeyRing) -> tuple[str, bytes]:
+    """Signs a token by the active key, returns its header and signature."""
+    entry = ring.get_active()
+    return entry.header, entry.signer.sign(
+        f"{entry.header}.{PAYLOAD}".encode()
+    )
+
+
+def verify(ring: KeyRing, header: str, signature: bytes) -> bool:
+    entry = ring.resolve(header)
+    return entry.signer.verify(f"{header}.{PAYLOAD}".encode(), signature)
+
+
+@pytest.fixture
+def ring_path(tmp_path):
+    path = tmp_path / "keyring.json"
+    write_ring(
+        path, "old", [{"kid": "old", "alg": "HS256", "secret": "old secret"}]
+    )
+    return path
+
+
+@pytest.fixture
+def key_ring(ring_path):
+    return KeyRing(
+        Settings(
+            JWT_KEYRING_PATH=str(ring_path), JWT_KEYRING_RELOAD_INTERVAL=0
+        )
+    )
+
+
+def test_keyring_verifies_with_previous_key(key_ring, ring_path):
+    """Checks that tokens of the previous key pass after the rotation."""
+    header, signature = sign(key_ring)
+
+    write_ring(
+        ring_path,
+        "new",
+        [
+            {"kid": "new", "alg": "HS256", "secret": "new secret"},
+            {"kid": "old", "alg": "HS256", "secret": "old secret"},
+        ],
+    )
+
+    assert key_ring.get_active().kid == "new"
+    assert verify(key_ring, header, signature)
+    new_header, new_signature = sign(key_ring)
+    assert new_header != header
+    assert verify(key_ring, new_header, new_signature)
+
+
+def test_keyring_verifies_with_staged_key(key_ring, ring_path):
+    """Checks that a staged key verifies before it's activated."""
+    write_ring(
+        ring_path,
+        "old",
+        [
+            {"kid": "old", "alg": "HS256", "secret": "old secret"},
+            {"kid": "new", "alg": "HS256", "secret": "new secret"},
+        ],
+    )
+    assert key_ring.get_active().kid == "old"
+    staged = key_ring.keys["new"]
+    signature = staged.signer.sign(f"{staged.header}.{PAYLOAD}".encode())
+
+    assert verify(key_ring, staged.header, signature)
+
+
+def test_keyring_rejects_retired_key(key_ring, ring_path):
+    """Checks that tokens of a retired key are rejected."""
+    header, signature = sign(key_ring)
+
+    write_ring(
+        ring_path,
+        "new",
+        [
+            {"kid": "new", "alg": "HS256", "secret": "new secret"},
+            {
+                "kid": "old",
+                "alg": "HS256",
+                "secret": "old secret",
+                "retire_at": time.time() - 1,
+            },
+        ],
+    )
+
+    with pytest.raises(ValueError):
+        verify(key_ring, header, signature)
+
+
+def test_keyring_rejects_unknown_kid(key_ring, ring_path):
+    """Checks that tokens of a removed key are rejected."""
+    header, signature = sign(key_ring)
+
+    write_ring(
+        ring_path, "new", [{"kid": "new", "alg": "HS256", "secret": "new"}]
+    )
+
+    with pytest.raises(ValueError):
+        verify(key_ring, header, signature)
+
+
+def test_keyring_keeps_ring_on_broken_file(key_ring, ring_path):
+    """Checks that a broken ring file doesn't drop the loaded keys."""
+    header, signature = sign(key_ring)
+
+    with open(ring_path, "w") as ring_file:
+        ring_file.write("{")
+    mtime = os.stat(ring_path).st_mtime + 2
+    os.utime(ring_path, (mtime, mtime))
+
+    assert key_ring.get_active().kid == "old"
+    assert verify(key_ring, header, signature)
@@ -0,0 +1,45 @@
+from http import HTTPStatus
+
+import pytest
+
+from settings import get_settings
+from testdata.common import HEADERS
+
+pytestmark = pytest.mark.metrics
+
+ENDPOINT = f"{get_settings().API_URL}/metrics/"
+
+HASHER_METRICS_FIELDS = [
+    "submitted",
+    "rejected",
+    "timed_out",
+    "in_flight",
+    "queued",
+]
+
+
+@pytest.mark.asyncio
+async def test_metrics_returns_hasher_stats(
+    prepare_headers_with_superuser_token, get_http_session
+):
+    """Checks that a metrics API returns the password hasher stats."""
+    response = await get_http_session.get(
+        url=ENDPOINT, headers=prepare_headers_with_superuser_token
+    )
+    body = await response.json()
+
+    assert response.status == HTTPStatus.OK
+    for field in HASHER_METRICS_FIELDS:
+        assert field in body["hasher"]
+    assert "queue_depth" in body["admission"]
+    assert "hits" in body["token_cache"]
+    assert "checked_out" in body["postgres_pool"]
+
+
+@pytest.mark.asyncio
+async def test_metrics_requires_token(get_http_session):
+    """Checks that a metrics API isn't available without a token."""
+    headers = {k: v for k, v in HEADERS.items() if k != "Authorization"}
+    response = await get_http_session.get(url=ENDPOINT, headers=headers)
+
+    assert response.status == HTTPStatus.UNAUTHORIZED
@@ -0,0 +1,110 @@
+import logging
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from db.postgres.query_logger import QueryLogger, fingerprint_statement
+
+pytestmark = pytest.mark.query_logger
+
+LOGGER = "db.postgres.query_logger"
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+
+def run_statement(engine, query_logger: QueryLogger) -> None:
+    query_logger.attach(engine)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT :password"), {"password": "secret"})
+
+
+@pytest.mark.parametrize(
+    "statements",
+    [
+        [
+            "SELECT * FROM role WHERE role.id IN ($1::UUID)",
+            "SELECT * FROM role WHERE role.id IN ($1::UUID, $2::UUID, $3::UUID)",
+            "SELECT * FROM role\n    WHERE role.id IN ( $2::UUID ,$7::UUID )",
+        ],
+        [
+            "SELECT * FROM role WHERE role.title = 'admin' LIMIT 51",
+            "SELECT * FROM role WHERE role.title = 'it''s' LIMIT 2",
+        ],
+        [
+            "UPDATE refresh_token SET created_at=$1::TIMESTAMP WITHOUT TIME ZONE",
+            "UPDATE refresh_token SET created_at=$2::TIMESTAMP WITH TIME ZONE",
+        ],
+        [
+            "SELECT * FROM role WHERE role.title = ANY($1::VARCHAR(50)[])",
+            "SELECT * FROM role WHERE role.title = ANY($9::VARCHAR(50)[])",
+        ],
+    ],
+)
+def test_statement_runs_share_fingerprint(statements):
+    """Checks that the runs of a statement get the same fingerprint."""
+    fingerprints = {
+        fingerprint_statement(statement) for statement in statements
+    }
+
+    assert len(fingerprints) == 1
+
+
+def test_statement_is_normalized():
+    """Checks that the parameters, casts and literals become placeholders."""
+    _, normalized = fingerprint_statement(
+        'SELECT * FROM "user"\n  WHERE "user".login = $1::VARCHAR AND '
+        "\"user\".id IN ($2::UUID, $3::UUID) AND age > 18 AND name = 'x'"
+    )
+
+    assert normalized == (
+        'SELECT * FROM "user" WHERE "user".login = ? AND '
+        '"user".id IN (?) AND age > ? AND name = ?'
+    )
+
+
+def test_statements_get_different_fingerprints():
+    """Checks that different statements aren't merged."""
+    first, _ = fingerprint_statement("SELECT * FROM role WHERE id = $1::UUID")
+    second, _ = fingerprint_statement("SELECT * FROM role WHERE title = $1")
+
+    assert first != second
+
+
+def test_slow_statement_is_logged(engine, caplog):
+    """Checks that a statement over the threshold is logged as slow."""
+    with caplog.at_level(logging.INFO, logger=LOGGER):
+        run_statement(engine, QueryLogger(slow_threshold=0, sample_rate=0))
+
+    [record] = caplog.records
+    assert record.levelno == logging.WARNING
+    assert record.sql_slow is True
+    assert record.sql_executemany is False
+    assert record.sql_duration_ms >= 0
+    assert record.sql_fingerprint == fingerprint_statement("SELECT ?")[0]
+    assert record.getMessage().endswith(": SELECT ?")
+    # The parameters carry secrets and are never logged
+    assert "secret" not in record.getMessage()
+
+
+def test_sampled_statement_is_logged(engine, caplog):
+    """Checks that a sampled statement is logged at the info level."""
+    with caplog.at_level(logging.INFO, logger=LOGGER):
+        run_statement(engine, QueryLogger(slow_threshold=60, sample_rate=1))
+
+    [record] = caplog.records
+    assert record.levelno == logging.INFO
+    assert record.sql_slow is False
+
+
+def test_fast_statement_is_not_logged(engine, caplog):
+    """Checks that a fast statement out of the sample isn't logged."""
+    with caplog.at_level(logging.INFO, logger=LOGGER):
+        run_statement(engine, QueryLogger(slow_threshold=60, sample_rate=0))
+        run_statement(engine, QueryLogger(slow_threshold=None, sample_rate=0))
+
+    assert caplog.records == []
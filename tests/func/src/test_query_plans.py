@@ -0,0 +1,207 @@
+import time
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from db.postgres.postgres import PostgresStorage
+from db.postgres.session_handler import session_handler
+from db.redis import redis
+from models.token import RefreshToken
+from schemas.access import AccessInSchema
+from schemas.role import RoleTitleSchema
+from schemas.token import RefreshTokenInDB
+from schemas.user import UserLoginSchema
+from services.access_service import AccessService
+from services.auth_service import AuthService
+from services.role_service import RoleService
+from services.session_service import get_session_service
+from services.user_service import UserService
+from testdata.query_plans import FOREIGN_KEY_QUERIES
+from util.query_plans import StatementRecorder, explain, seeded_id, seq_scans
+
+pytestmark = pytest.mark.query_plans
+
+STORAGE = PostgresStorage()
+AUTH_SERVICE = AuthService(cache=None, database=STORAGE)
+ACCESS_SERVICE = AccessService(database=STORAGE)
+ROLE_SERVICE = RoleService(database=STORAGE)
+USER_SERVICE = UserService(database=STORAGE)
+
+USER_ID = seeded_id("user42")
+FINGERPRINT_ID = seeded_id("fingerprint42_1")
+# Roles of user_42 are role_44 and role_45
+ACCESS = AccessInSchema(user_login="user_42", role_title="role_44")
+
+
+async def auth_user_credentials(session):
+    await AUTH_SERVICE._get_user_credentials_from_db(
+        session=session, user_login="user_42"
+    )
+
+
+async def auth_refresh_token_by_hash(session):
+    await AUTH_SERVICE._get_refresh_token_from_db(
+        session=session, refresh_token="token_42_1"
+    )
+
+
+async def auth_fingerprint_with_refresh_token(session):
+    await AUTH_SERVICE._get_fingerprint_and_refresh_token_from_db(
+        session=session, user_id=USER_ID, fingerprint="device_1"
+    )
+
+
+async def auth_refresh_token_update(session):
+    await STORAGE.update(
+        session=session,
+        obj=RefreshTokenInDB(
+            id=seeded_id("refresh_token42_1"),
+            user_id=USER_ID,
+            fingerprint_id=FINGERPRINT_ID,
+            token_hash=b"rotated",
+        ),
+        table=RefreshToken,
+        returning=False,
+    )
+
+
+async def auth_login_upsert(session):
+    await AUTH_SERVICE._save_session(
+        session=session,
+        user_id=seeded_id("user44"),
+        fingerprint="device_1",
+        refresh_token="token_44_login",
+    )
+
+
+async def auth_logout(session):
+    await AUTH_SERVICE._delete_refresh_token(
+        session=session, user_id=seeded_id("user45"), fingerprint="device_1"
+    )
+
+
+async def auth_logout_everywhere(session):
+    await AUTH_SERVICE._delete_refresh_tokens(
+        session=session, user_id=seeded_id("user43")
+    )
+
+
+async def auth_rehash_password(session):
+    await AUTH_SERVICE._rehash_password(
+        user_id=USER_ID,
+        hashed_password="hashed_password",
+        password="password",
+    )
+
+
+async def session_write_rotation(session):
+    await get_session_service()._write(
+        [
+            (
+                "0-1",
+                {
+                    "user_id": str(USER_ID),
+                    "fingerprint_id": str(FINGERPRINT_ID),
+                    "token_hash": b"rotated".hex(),
+                    "created_at": str(time.time()),
+                    "previous": "session:previous",
+                },
+            )
+        ]
+    )
+
+
+async def user_by_login(session):
+    await USER_SERVICE.get_user(
+        session=session, user_login=UserLoginSchema(login="user_42")
+    )
+
+
+async def access_user_roles(session):
+    await ACCESS_SERVICE.get_user_roles(session=session, user_login="user_42")
+
+
+async def access_by_ids(session):
+    await ACCESS_SERVICE.get(session=session, access=ACCESS)
+
+
+async def role_by_title(session):
+    await ROLE_SERVICE.get(
+        session=session, role=RoleTitleSchema(title="role_42")
+    )
+
+
+async def role_page(session):
+    _, cursor = await ROLE_SERVICE.list(session=session, limit=50)
+    await ROLE_SERVICE.list(session=session, limit=50, cursor=cursor)
+
+
+# The service calls on the request path
+HOT_PATHS = {
+    path.__name__: path
+    for path in [
+        auth_user_credentials,
+        auth_refresh_token_by_hash,
+        auth_fingerprint_with_refresh_token,
+        auth_refresh_token_update,
+        auth_login_upsert,
+        auth_logout,
+        auth_logout_everywhere,
+        auth_rehash_password,
+        session_write_rotation,
+        user_by_login,
+        access_user_roles,
+        access_by_ids,
+        role_by_title,
+        role_page,
+    ]
+}
+
+
+@pytest.fixture
+async def services_on_test_db(
+    monkeypatch, get_sqlalchemy_session, get_redis_session
+):
+    """Points the sessions and the Redis client the services open
+    themselves at the test database."""
+    monkeypatch.setattr(
+        session_handler,
+        "session_factory",
+        sessionmaker(
+            get_sqlalchemy_session.bind,
+            class_=AsyncSession,
+            expire_on_commit=False,
+        ),
+    )
+    monkeypatch.setattr(redis, "redis", get_redis_session)
+    return get_sqlalchemy_session
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", HOT_PATHS)
+async def test_hot_path_uses_indexes(
+    path, seed_query_plan_data, services_on_test_db, get_postgres_session
+):
+    """Checks that the statements of a hot path don't scan a whole table."""
+    session = services_on_test_db
+    await session.connection()
+    recorder = StatementRecorder(session.bind)
+
+    await HOT_PATHS[path](session)
+
+    assert recorder.statements
+    for statement, parameters in recorder.statements:
+        plan = await explain(get_postgres_session, statement, parameters)
+        assert seq_scans(plan) == [], statement
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("query", FOREIGN_KEY_QUERIES)
+async def test_foreign_key_query_uses_indexes(
+    query, seed_query_plan_data, get_postgres_session
+):
+    """Checks that a foreign key check doesn't scan a whole table."""
+    plan = await explain(get_postgres_session, FOREIGN_KEY_QUERIES[query], ())
+
+    assert seq_scans(plan) == []
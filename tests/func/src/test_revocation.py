@@ -0,0 +1,92 @@
+import time
+
+import pytest
+from fastapi.security import SecurityScopes
+
+from core.exceptions import UnAuthorizedException
+from schemas.token import TokenCheckResponse
+from services.revocation_service import RevocationService, active_token_check
+from testdata.auth import REVOCATION_CHANNEL, REVOCATION_GENERATION_CHANNEL
+
+pytestmark = pytest.mark.revocation
+
+
+@pytest.fixture
+def revocation_service():
+    return RevocationService(
+        capacity=1000,
+        error_rate=0.001,
+        channel=REVOCATION_CHANNEL,
+        generation_channel=REVOCATION_GENERATION_CHANNEL,
+        denylist_layout="keys",
+        prefix="revoked:",
+        bucket_seconds=3600,
+        previous_denylist_layout=None,
+        previous_prefix=None,
+        generation_prefix="token_gen:",
+        generation_lifetime=60,
+        rebuild_interval=600,
+        retry_delay=1,
+    )
+
+
+def test_revoked_id_like_generation_message(revocation_service):
+    """Checks that a token id is never taken for a generation bump."""
+    token_id = b"gen:user:123"
+
+    revocation_service._on_message(REVOCATION_CHANNEL.encode(), token_id)
+
+    assert token_id in revocation_service.bloom
+    assert revocation_service.generations == {}
+
+
+def test_generation_message_sets_highest_generation(revocation_service):
+    """Checks that the generations are taken from their own channel."""
+    channel = REVOCATION_GENERATION_CHANNEL.encode()
+
+    revocation_service._on_message(channel, b"user:with:colons:3")
+    revocation_service._on_message(channel, b"user:with:colons:2")
+
+    [(login, (generation, _))] = revocation_service.generations.items()
+    assert (login, generation) == ("user:with:colons", 3)
+    assert revocation_service.bloom.count == 0
+
+
+def test_expired_generation_is_dropped(revocation_service):
+    """Checks that a generation is forgotten after the lifetime."""
+    revocation_service._set_generation("user", 2)
+    assert revocation_service.is_stale("user", 1)
+
+    revocation_service._set_generation(
+        "expired", 2, expires_at=time.time() - 1
+    )
+
+    assert not revocation_service.is_stale("expired", 1)
+    assert "expired" not in revocation_service.generations
+
+
+@pytest.mark.asyncio
+async def test_active_token_check_rejects_stale_generation(
+    revocation_service,
+):
+    """Checks that the tokens of a bumped generation are rejected."""
+    token = TokenCheckResponse(
+        token="header.payload.sign",
+        sub="user",
+        fingerprint="device",
+        roles=[],
+        exp=str(time.time() + 60),
+        gen=1,
+    )
+    scopes = SecurityScopes(scopes=["auth_admin"])
+    assert await active_token_check(token, revocation_service, scopes) == (
+        token
+    )
+
+    revocation_service._set_generation("user", 2)
+
+    with pytest.raises(UnAuthorizedException) as error:
+        await active_token_check(token, revocation_service, scopes)
+    assert error.value.headers["WWW-Authenticate"] == (
+        'Bearer scope="auth_admin"'
+    )
@@ -97,3 +97,60 @@ async def test_update_role(
     if role["result"]["status"] == HTTPStatus.OK:
         body = await response.json()
         assert body == role["result"]["body"]
+
+
+@pytest.mark.asyncio
+async def test_list_roles_pages_with_cursor(
+    prepare_roles, prepare_headers_with_superuser_token, get_http_session
+):
+    """Checks that a role API pages the roles with the next cursor."""
+    response = await get_http_session.get(
+        url=ENDPOINT,
+        headers=prepare_headers_with_superuser_token,
+        params={"limit": 1},
+    )
+    body = await response.json()
+    cursor = response.headers.get("X-Next-Cursor")
+
+    assert response.status == HTTPStatus.OK
+    assert [role["title"] for role in body] == ["auth_admin"]
+    assert cursor
+
+    response = await get_http_session.get(
+        url=ENDPOINT,
+        headers=prepare_headers_with_superuser_token,
+        params={"limit": 1, "cursor": cursor},
+    )
+    body = await response.json()
+
+    assert response.status == HTTPStatus.OK
+    assert [role["title"] for role in body] == ["subscriber"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_list_roles_streams_all_roles(
+    prepare_roles, prepare_headers_with_superuser_token, get_http_session
+):
+    """Checks that a role API streams all roles without a limit."""
+    response = await get_http_session.get(
+        url=ENDPOINT, headers=prepare_headers_with_superuser_token
+    )
+    body = await response.json()
+
+    assert response.status == HTTPStatus.OK
+    assert [role["title"] for role in body] == ["auth_admin", "subscriber"]
+
+
+@pytest.mark.asyncio
+async def test_list_roles_with_invalid_cursor(
+    prepare_roles, prepare_headers_with_superuser_token, get_http_session
+):
+    """Checks that a role API rejects a malformed cursor."""
+    response = await get_http_session.get(
+        url=ENDPOINT,
+        headers=prepare_headers_with_superuser_token,
+        params={"limit": 1, "cursor": "!"},
+    )
+
+    assert response.status == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,160 @@
+import asyncio
+from http import HTTPStatus
+
+import pytest
+from settings import get_settings
+from testdata.auth import (GET_REFRESH_TOKEN_BY_HASH_REQUEST,
+                           GRANT_SUPERUSER_ROLE_REQUEST,
+                           REVOKE_SUPERUSER_ROLE_REQUEST, SESSION_STREAM,
+                           STORED_SESSION_ROLE_CHANGES)
+from testdata.common import AUTH_HEADERS
+from testdata.personal import SUPERUSER_DATA
+from util.token_helpers import (decode_payload_helper,
+                                refresh_token_digest_helper)
+
+pytestmark = pytest.mark.sessions
+
+# The service runs with SESSION_STORE=redis
+ENDPOINT = f"{get_settings().SESSION_STORE_API_URL}/auth"
+
+
+async def login(http_session) -> dict:
+    data = f"grant_type=&username={SUPERUSER_DATA["login"]}&password={SUPERUSER_DATA["password"]}&scope=&client_id=&client_secret="
+    response = await http_session.post(
+        url=f"{ENDPOINT}/login", headers=AUTH_HEADERS, data=data
+    )
+    assert response.status == HTTPStatus.OK
+    return await response.json()
+
+
+async def refresh(http_session, refresh_token: str):
+    return await http_session.post(
+        url=f"{ENDPOINT}/refresh", headers=AUTH_HEADERS, data=refresh_token
+    )
+
+
+async def get_roles(access_token: str) -> list[str]:
+    payload = await decode_payload_helper(access_token.split(".")[1])
+    return payload["roles"]
+
+
+@pytest.mark.asyncio
+async def test_refresh_rotates_stored_session(prepare_users, get_http_session):
+    """Checks that a rotated token can't be used again, the new one can."""
+    tokens = await login(get_http_session)
+
+    response = await refresh(get_http_session, tokens["refresh_token"])
+    assert response.status == HTTPStatus.OK
+    rotated = await response.json()
+
+    response = await refresh(get_http_session, tokens["refresh_token"])
+    assert response.status == HTTPStatus.NOT_FOUND
+
+    response = await refresh(get_http_session, rotated["refresh_token"])
+    assert response.status == HTTPStatus.OK
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refresh_rotates_once(
+    prepare_users, get_http_session
+):
+    """Checks that only one of the concurrent refreshes gets the tokens."""
+    tokens = await login(get_http_session)
+
+    responses = await asyncio.gather(
+        *[refresh(get_http_session, tokens["refresh_token"]) for _ in range(5)]
+    )
+
+    statuses = sorted(response.status for response in responses)
+    assert statuses == [HTTPStatus.OK] + [HTTPStatus.NOT_FOUND] * 4
+
+
+@pytest.mark.asyncio
+async def test_logout_revokes_stored_session(prepare_users, get_http_session):
+    """Checks that the session is dropped from Redis by a logout."""
+    tokens = await login(get_http_session)
+
+    response = await get_http_session.post(
+        url=f"{ENDPOINT}/logout",
+        headers={"Authorization": f"Bearer {tokens["access_token"]}"},
+    )
+    assert response.status == HTTPStatus.OK
+
+    response = await refresh(get_http_session, tokens["refresh_token"])
+    assert response.status == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_rotation_is_written_to_postgres(
+    prepare_users, get_http_session, get_postgres_session, get_redis_session
+):
+    """Checks that the write-behind worker stores the rotated token and
+    deletes it from the stream."""
+    tokens = await login(get_http_session)
+    response = await refresh(get_http_session, tokens["refresh_token"])
+    assert response.status == HTTPStatus.OK
+    rotated = await response.json()
+
+    token_hash = refresh_token_digest_helper(rotated["refresh_token"])
+    for _ in range(50):
+        row = await get_postgres_session.fetchrow(
+            GET_REFRESH_TOKEN_BY_HASH_REQUEST, token_hash
+        )
+        if row:
+            break
+        await asyncio.sleep(0.1)
+
+    assert row
+    assert not await get_postgres_session.fetchrow(
+        GET_REFRESH_TOKEN_BY_HASH_REQUEST,
+        refresh_token_digest_helper(tokens["refresh_token"]),
+    )
+    for _ in range(50):
+        if not await get_redis_session.xlen(SESSION_STREAM):
+            break
+        await asyncio.sleep(0.1)
+    assert await get_redis_session.xlen(SESSION_STREAM) == 0
+
+
+@pytest.mark.asyncio
+async def test_refresh_keeps_stored_roles(
+    prepare_users, prepare_roles, get_http_session, get_postgres_session
+):
+    """Checks that refresh takes the roles from the session, not Postgres."""
+    await get_postgres_session.execute(GRANT_SUPERUSER_ROLE_REQUEST)
+    tokens = await login(get_http_session)
+    # Bypasses the service, no generation is bumped
+    await get_postgres_session.execute(REVOKE_SUPERUSER_ROLE_REQUEST)
+
+    response = await refresh(get_http_session, tokens["refresh_token"])
+    assert response.status == HTTPStatus.OK
+    tokens = await response.json()
+    assert await get_roles(tokens["access_token"]) == ["auth_admin"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("change", STORED_SESSION_ROLE_CHANGES)
+async def test_role_change_revokes_stored_session(
+    change,
+    prepare_users,
+    prepare_roles,
+    get_http_session,
+    get_postgres_session,
+):
+    """Checks that the role holders log in again to get the changed roles."""
+    await get_postgres_session.execute(GRANT_SUPERUSER_ROLE_REQUEST)
+    tokens = await login(get_http_session)
+
+    response = await get_http_session.request(
+        change["method"],
+        url=f"{get_settings().SESSION_STORE_API_URL}{change["path"]}",
+        headers={"Authorization": f"Bearer {tokens["access_token"]}"},
+        json=change["body"],
+    )
+    assert response.status == HTTPStatus.OK
+
+    response = await refresh(get_http_session, tokens["refresh_token"])
+    assert response.status == HTTPStatus.UNAUTHORIZED
+
+    tokens = await login(get_http_session)
+    assert await get_roles(tokens["access_token"]) == change["roles"]
@@ -0,0 +1,110 @@
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from db.postgres.postgres import PostgresStorage
+from models.role import Role
+from schemas.role import RoleCreateSchema
+
+pytestmark = pytest.mark.storage
+
+# Inserted by the prepare_roles fixture
+ROLE_IDS = [
+    uuid.UUID("11111111-1111-1111-1111-111111111111"),
+    uuid.UUID("22222222-2222-2222-2222-222222222222"),
+]
+
+
+async def get_roles(session) -> dict[str, Role]:
+    result = await session.execute(select(Role))
+    return {role.title: role for role in result.scalars()}
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_copy_fills_defaults(
+    empty_db_tables, get_sqlalchemy_session
+):
+    """Checks that COPY computes the column defaults of the missing ones."""
+    roles = [
+        RoleCreateSchema(title=f"copied_{index}", description="copied")
+        for index in range(5)
+    ]
+
+    created = await PostgresStorage().bulk_create(
+        session=get_sqlalchemy_session,
+        objs=roles,
+        table=Role,
+        copy=True,
+        batch_size=2,
+    )
+
+    assert created == 5
+    stored = await get_roles(get_sqlalchemy_session)
+    assert sorted(stored) == [f"copied_{index}" for index in range(5)]
+    assert len({role.id for role in stored.values()}) == 5
+    for role in stored.values():
+        assert role.description == "copied"
+        assert role.created_at is not None
+        assert role.modified_at is not None
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_updates_conflicting_rows(
+    prepare_roles, get_sqlalchemy_session
+):
+    """Checks that the rows conflicting on the title are updated in place."""
+    roles = [
+        RoleCreateSchema(title="auth_admin", description="updated"),
+        RoleCreateSchema(title="new_role", description="inserted"),
+    ]
+
+    upserted = await PostgresStorage().bulk_upsert(
+        session=get_sqlalchemy_session,
+        objs=roles,
+        table=Role,
+        conflict=["title"],
+    )
+
+    assert upserted == 2
+    stored = await get_roles(get_sqlalchemy_session)
+    assert sorted(stored) == ["auth_admin", "new_role", "subscriber"]
+    assert stored["auth_admin"].id == ROLE_IDS[0]
+    assert stored["auth_admin"].description == "updated"
+    assert stored["new_role"].description == "inserted"
+    assert stored["subscriber"].description == "test subscriber description"
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_returns_deleted_amount(
+    prepare_roles, get_sqlalchemy_session
+):
+    """Checks that only the existing rows are counted as deleted."""
+    deleted = await PostgresStorage().bulk_delete(
+        session=get_sqlalchemy_session,
+        keys=[*ROLE_IDS, uuid.uuid4()],
+        table=Role,
+        batch_size=2,
+    )
+
+    assert deleted == 2
+    assert await get_roles(get_sqlalchemy_session) == {}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch_size", [1, 2, 3, 100])
+async def test_get_many_returns_each_existing_row_once(
+    batch_size, prepare_roles, get_sqlalchemy_session
+):
+    """Checks that the missing ids are skipped and the repeated ones are
+    returned once at any batch size."""
+    keys = [ROLE_IDS[0], uuid.uuid4(), ROLE_IDS[1], ROLE_IDS[0], ROLE_IDS[1]]
+
+    roles = await PostgresStorage().get_many(
+        session=get_sqlalchemy_session,
+        keys=keys,
+        table=Role,
+        batch_size=batch_size,
+    )
+
+    assert sorted(role.id for role in roles) == ROLE_IDS
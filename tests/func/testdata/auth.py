@@ -1,3 +1,31 @@
+# Base64url of the compact '{"typ":"JWT","alg":"HS256","kid":"default"}' header
+TOKEN_HEADER = "eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiIsImtpZCI6ImRlZmF1bHQifQ"
+
+# Deny list of the logouted access tokens
+REVOKED_TOKEN_PREFIX = "revoked:"
+DENYLIST_BUCKET_PREFIX = "revoked_bucket:"
+REVOCATION_CHANNEL = "revoked_tokens"
+REVOCATION_GENERATION_CHANNEL = "revoked_generations"
+TOKEN_GENERATION_PREFIX = "token_gen:"
+# Rotations of the stored sessions waiting for Postgres
+SESSION_STREAM = "session_writes"
+# REFRESH_TOKEN_LIFETIME of the service in seconds
+REFRESH_TOKEN_LIFETIME = 14 * 24 * 60 * 60
+
+# The superuser tokens expire in 2027
+SUPERUSER_ACCESS_TOKEN_PAYLOAD = {
+    "sub": "superuser",
+    "fingerprint": "1969592216488832520",
+    "roles": ["auth_admin"],
+    "exp": "1814221841.95523",
+}
+
+SUPERUSER_REFRESH_TOKEN_PAYLOAD = {
+    "sub": "superuser",
+    "fingerprint": "9120630898766073335",
+    "exp": "1815508005.65583",
+}
+
 TOKENS = [
     {
         "type": "access_token",
@@ -5,7 +33,9 @@ TOKENS = [
             "sub",
             "fingerprint",
             "roles",
-            "exp"
+            "exp",
+            "gen",
+            "jti"
         ]
     },
     {
@@ -13,11 +43,78 @@ TOKENS = [
         "payload_fields": [
             "sub",
             "fingerprint",
-            "exp"
+            "exp",
+            "gen",
+            "jti"
         ]
     }
 ]
 
+GET_SUPERUSER_FINGERPRINTS_REQUEST = """
+    SELECT fingerprint FROM public.fingerprint
+        WHERE user_id='11111111-1111-1111-1111-111111111111'
+"""
+
+# Hash of the superuser password with outdated Argon2 parameters
+OUTDATED_SUPERUSER_HASH = "$argon2id$v=19$m=8192,t=1,p=1$h7ZXMXUFrijLAIkPp+Y2rg$CKBl66Mivpvod0/vzspCYSNKtcsuJ1jxKxnif6qXLbM"
+CURRENT_HASH_PREFIX = "$argon2id$v=19$m=65536,t=3,p=4$"
+
+SET_SUPERUSER_HASH_REQUEST = """
+    UPDATE public.user SET hashed_password=$1
+        WHERE id='11111111-1111-1111-1111-111111111111'
+"""
+
+GET_SUPERUSER_HASH_REQUEST = """
+    SELECT hashed_password FROM public.user
+        WHERE id='11111111-1111-1111-1111-111111111111'
+"""
+
+DEACTIVATE_SUPERUSER_REQUEST = """
+    UPDATE public.user SET is_active=false
+        WHERE id='11111111-1111-1111-1111-111111111111'
+"""
+
+GRANT_SUPERUSER_ROLE_REQUEST = """
+    INSERT INTO public.user_role (id, user_id, role_id, created_at)
+    VALUES (
+        '11111111-1111-1111-1111-111111111111',
+        '11111111-1111-1111-1111-111111111111',
+        '11111111-1111-1111-1111-111111111111',
+        '2024-04-26 17:26:11.42932'
+    );
+"""
+
+REVOKE_SUPERUSER_ROLE_REQUEST = """
+    DELETE FROM public.user_role
+        WHERE user_id='11111111-1111-1111-1111-111111111111'
+"""
+
+# Admin requests of the superuser holding auth_admin and its roles after
+STORED_SESSION_ROLE_CHANGES = [
+    {
+        "method": "DELETE",
+        "path": "/roles/auth_admin",
+        "body": None,
+        "roles": [],
+    },
+    {
+        "method": "PATCH",
+        "path": "/roles/auth_admin",
+        "body": {"title": "auth_owner"},
+        "roles": ["auth_owner"],
+    },
+    {
+        "method": "POST",
+        "path": "/access/remove",
+        "body": {"user_login": "superuser", "role_title": "auth_admin"},
+        "roles": [],
+    },
+]
+
+GET_REFRESH_TOKEN_BY_HASH_REQUEST = """
+    SELECT * FROM public.refresh_token WHERE token_hash=$1
+"""
+
 GET_REFRESH_TOKEN_REQUEST = """
     SELECT * FROM public.user
         JOIN public.refresh_token AS token
@@ -47,14 +144,14 @@ INSERT_SUPERUSER_REFRESH_TOKEN_REQUEST = """
         id,
         user_id,
         fingerprint_id,
-        refresh_token,
+        token_hash,
         created_at
         )
     VALUES (
         '8afd98c5-a349-4904-b5a8-403e61517999',
         '11111111-1111-1111-1111-111111111111',
         '8afd98c5-a349-4904-b5a8-403e61517999',
-        'eyd0eXAnOiAnSldUJywgJ2FsZyc6ICdIUzI1Nid9.eydzdWInOiAnc3VwZXJ1c2VyJywgJ2ZpbmdlcnByaW50JzogJzkxMjA2MzA4OTg3NjYwNzMzNScsICdleHAnOiAnMTgxNTUwODAwNS42NTU4Myd9.7b6f957ab28921c15e543f79718cc08b1fe936abf8350c222e391327fba4731f',
+        sha256(convert_to($1, 'UTF8')),
         '2024-04-26 17:26:11.42932'
     );
 """
@@ -27,6 +27,7 @@ TABLES_SCHEMA = [
             modified_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
             PRIMARY KEY (id),
             UNIQUE (id),
+            CONSTRAINT unique_fingerprint_for_user UNIQUE (user_id, fingerprint),
             FOREIGN KEY(user_id) REFERENCES "user" (id)
             )""",
     },
@@ -58,20 +59,30 @@ TABLES_SCHEMA = [
             )""",
     },
     {
-        "table": "token",
-        "data": """CREATE TABLE IF NOT EXISTS token (
+        "table": "refresh_token",
+        "data": """CREATE TABLE IF NOT EXISTS refresh_token (
             id UUID NOT NULL,
             user_id UUID NOT NULL,
-            refresh_token VARCHAR(255) NOT NULL,
+            fingerprint_id UUID NOT NULL,
+            token_hash BYTEA NOT NULL,
             created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
             PRIMARY KEY (id),
             UNIQUE (id),
+            UNIQUE (token_hash),
+            CONSTRAINT unique_fing_for_user UNIQUE (user_id, fingerprint_id),
             FOREIGN KEY(user_id) REFERENCES "user" (id),
-            UNIQUE (refresh_token)
+            FOREIGN KEY(fingerprint_id) REFERENCES fingerprint (id)
             )""",
     },
 ]
 
+INDEXES_SCHEMA = [
+    """CREATE INDEX IF NOT EXISTS ix_refresh_token_fingerprint_id
+        ON refresh_token (fingerprint_id)""",
+    """CREATE INDEX IF NOT EXISTS ix_user_role_role_id
+        ON user_role (role_id)""",
+]
+
 USER_CREATION = [
     """INSERT INTO "user" (
         id,
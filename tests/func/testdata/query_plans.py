@@ -0,0 +1,65 @@
+# Synthetic dataset the query plans are checked on. Every user has two
+# roles and two devices with a refresh token each. The ids are derived
+# from the row numbers, so the tests can point at any row.
+SEED_QUERY_PLAN_DATA = [
+    """INSERT INTO role (id, title, description, created_at, modified_at)
+    SELECT md5('role' || i)::uuid, 'role_' || i, NULL, now(), now()
+    FROM generate_series(1, {roles}) AS i""",
+    """INSERT INTO "user" (
+        id,
+        login,
+        email,
+        hashed_password,
+        first_name,
+        last_name,
+        created_at,
+        modified_at,
+        is_active
+    )
+    SELECT md5('user' || i)::uuid,
+           'user_' || i,
+           'user_' || i || '@example.com',
+           'hashed_password',
+           NULL,
+           NULL,
+           now(),
+           now(),
+           true
+    FROM generate_series(1, {users}) AS i""",
+    """INSERT INTO user_role (id, user_id, role_id, created_at)
+    SELECT md5('user_role' || i || '_' || r)::uuid,
+           md5('user' || i)::uuid,
+           md5('role' || ((i + r) % {roles} + 1))::uuid,
+           now()
+    FROM generate_series(1, {users}) AS i, generate_series(1, 2) AS r""",
+    """INSERT INTO fingerprint (
+        id, user_id, fingerprint, created_at, modified_at
+    )
+    SELECT md5('fingerprint' || i || '_' || d)::uuid,
+           md5('user' || i)::uuid,
+           'device_' || d,
+           now(),
+           now()
+    FROM generate_series(1, {users}) AS i, generate_series(1, 2) AS d""",
+    """INSERT INTO refresh_token (
+        id, user_id, fingerprint_id, token_hash, created_at
+    )
+    SELECT md5('refresh_token' || i || '_' || d)::uuid,
+           md5('user' || i)::uuid,
+           md5('fingerprint' || i || '_' || d)::uuid,
+           sha256(convert_to('token_' || i || '_' || d, 'UTF8')),
+           now()
+    FROM generate_series(1, {users}) AS i, generate_series(1, 2) AS d""",
+    "ANALYZE",
+]
+
+# Postgres runs these for the foreign keys on the role and fingerprint
+# deletes, they don't pass through the service and can't be recorded
+FOREIGN_KEY_QUERIES = {
+    "role_delete_cascade": """
+        DELETE FROM user_role WHERE user_role.role_id = md5('role42')::uuid""",
+    "fingerprint_delete_check": """
+        SELECT 1 FROM refresh_token
+        WHERE refresh_token.fingerprint_id = md5('fingerprint42_1')::uuid
+        FOR KEY SHARE""",
+}
@@ -0,0 +1,45 @@
+import hashlib
+import json
+import uuid
+
+from asyncpg import Connection
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+def seeded_id(name: str) -> uuid.UUID:
+    """Returns the id the dataset derives from the name, md5(name)::uuid."""
+    return uuid.UUID(hashlib.md5(name.encode()).hexdigest())
+
+
+class StatementRecorder:
+    """Records the statements the service sends with their parameters."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.statements: list[tuple[str, tuple]] = []
+        event.listen(engine.sync_engine, "before_cursor_execute", self.record)
+
+    def record(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        if executemany:
+            parameters = parameters[0]
+        self.statements.append((statement, tuple(parameters or ())))
+
+
+async def explain(connection: Connection, statement: str, parameters: tuple):
+    """Returns the plan of the statement, it isn't executed."""
+    result = await connection.fetchval(
+        f"EXPLAIN (FORMAT JSON) {statement}", *parameters
+    )
+    return json.loads(result)[0]["Plan"]
+
+
+def seq_scans(plan: dict) -> list[str]:
+    """Returns the tables the plan reads with a sequential scan."""
+    tables = []
+    if plan["Node Type"] == "Seq Scan":
+        tables.append(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        tables.extend(seq_scans(subplan))
+    return tables
@@ -1,15 +1,24 @@
 import base64
+import hashlib
 import json
+import secrets
 
 from Cryptodome.Hash import HMAC, SHA256
 
 from settings import get_settings
+from testdata.auth import REVOKED_TOKEN_PREFIX, TOKEN_HEADER
 
 
-async def decode_payload_helper(payload: str) -> str:
-    decoded_str = base64.b64decode(payload).decode(get_settings().JWT_CODE)
-    payload = json.loads(decoded_str.replace("'", '"'))
-    return payload
+def b64url_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+async def decode_payload_helper(payload: str) -> dict:
+    return json.loads(b64url_decode(payload))
 
 
 async def generate_sign_helper(token_parts: list[str]) -> str:
@@ -17,5 +26,44 @@ async def generate_sign_helper(token_parts: list[str]) -> str:
                       digestmod=SHA256)
     token_data = f"{token_parts[0]}.{token_parts[1]}"
     hasher.update(token_data.encode(get_settings().JWT_CODE))
-    digest = hasher.hexdigest()
-    return digest
+    return b64url_encode(hasher.digest())
+
+
+async def encode_token_helper(payload: dict) -> str:
+    encoded_payload = b64url_encode(
+        json.dumps(payload, separators=(",", ":")).encode()
+    )
+    token_parts = [TOKEN_HEADER, encoded_payload]
+    sign = await generate_sign_helper(token_parts=token_parts)
+    return f"{TOKEN_HEADER}.{encoded_payload}.{sign}"
+
+
+async def encode_legacy_token_helper(payload: dict) -> str:
+    """Returns a token of the former repr/hex codec."""
+    token_parts = [
+        base64.b64encode(str(part).encode()).decode()
+        for part in [{"alg": "HS256", "typ": "JWT"}, payload]
+    ]
+    hasher = HMAC.new(get_settings().JWT_SECRET.encode(get_settings().JWT_CODE),
+                      digestmod=SHA256)
+    hasher.update(f"{token_parts[0]}.{token_parts[1]}".encode())
+    return f"{token_parts[0]}.{token_parts[1]}.{hasher.hexdigest()}"
+
+
+def generate_jti_helper() -> str:
+    return b64url_encode(secrets.token_bytes(12))
+
+
+def refresh_token_digest_helper(token: str) -> bytes:
+    """Returns the digest the refresh token is stored by."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+def revoked_token_key_helper(token: str) -> bytes:
+    """Returns the binary deny list key of the token."""
+    payload = json.loads(b64url_decode(token.split(".")[1]))
+    if jti := payload.get("jti"):
+        token_id = b64url_decode(jti)
+    else:
+        token_id = hashlib.blake2b(token.encode(), digest_size=12).digest()
+    return REVOKED_TOKEN_PREFIX.encode() + token_id